@@ -1,8 +1,26 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.hashers import check_password
+from django.contrib.auth.backends import ModelBackend
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from apps.account import hashers, hashing
+from apps.users import lookups
 
 USER = get_user_model()
 
+
+def upgrade_password_hash(user, password):
+    """
+    登录成功后，若已存储哈希的算法或成本与当前策略不一致，按当前策略重新哈希
+    """
+    if hashers.must_update(user.password):
+        user.password = hashing.make_password(password)
+        user.save(update_fields=['password'])
+
+
 class SHA256PasswordBackend:
     """
     自定义认证后端：
@@ -22,8 +40,9 @@ class SHA256PasswordBackend:
         if not user.is_active:
             return None
 
-        # 关键：使用前端传来的 SHA-256 密码作为“明文”验证
-        if check_password(password, user.password):
+        # 关键：使用前端传来的 SHA-256 密码作为“明文”验证（在密码校验工作池中执行）
+        if hashing.check_password(password, user.password):
+            upgrade_password_hash(user, password)
             return user
 
         return None
@@ -32,4 +51,62 @@ class SHA256PasswordBackend:
         try:
             return USER.objects.get(pk=user_id)
         except USER.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    与 ModelBackend 行为一致的认证后端，PBKDF2 校验在有界工作池中执行，不占用请求线程的CPU
+    工作池排队已满时抛出 hashing.PasswordHashBusy（503），各调用方（登录、令牌接口、admin 登录）都会返回 503
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(USER.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = USER._default_manager.get_by_natural_key(username)
+        except USER.DoesNotExist:
+            # 用户不存在时同样计算一次哈希，避免通过响应时间判断用户名是否存在
+            hashing.make_password(password)
+            return None
+
+        if not hashing.check_password(password, user.password) or not self.user_can_authenticate(user):
+            return None
+
+        upgrade_password_hash(user, password)
+        return user
+
+
+def get_jwt_user_id(validated_token):
+    try:
+        return validated_token[jwt_settings.USER_ID_CLAIM]
+    except KeyError as e:
+        raise InvalidToken('Token contained no recognizable user identification') from e
+
+
+def check_jwt_user(user, validated_token):
+    """与 JWTAuthentication.get_user 相同的用户校验：用户存在、已启用、令牌签发后未修改密码"""
+    if user is None:
+        raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+
+    if jwt_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise exceptions.AuthenticationFailed(
+                "The user's password has been changed.", code='password_changed'
+            )
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    与 JWTAuthentication 行为一致，用户对象从用户查询缓存中获取，命中时请求不访问用户表
+    （USER_ID_FIELD 需为主键，即 simplejwt 的默认配置）
+    """
+    def get_user(self, validated_token):
+        user = lookups.get_user(get_jwt_user_id(validated_token))
+        return check_jwt_user(user, validated_token)
@@ -0,0 +1,152 @@
+# account/hashers.py
+"""
+密码哈希策略
+
+各算法的计算成本按档位（tier）配置，当前档位由 settings.ACCOUNT_PASSWORD_HASH_TIER 决定，
+目标算法为 settings.PASSWORD_HASHERS 中的第一个哈希器。
+每个已存储的哈希本身记录了算法和成本参数（迭代次数、work factor 等），
+登录成功时若算法或成本与当前策略不一致，会按当前策略重新哈希（升级或降级）。
+
+可用 benchmark_password_hashers 命令在目标机器上测量各档位耗时，选择满足登录延迟预算的档位。
+
+内置档位都不低于 Django 5.2 的默认成本（最低的 'low' 即 Django 默认值），切换档位不会把已存储的哈希
+降到框架的安全基线以下。低于默认成本的 'reduced' 档位只在 ACCOUNT_PASSWORD_HASH_ALLOW_REDUCED_COST
+为 True 时可用（例如登录延迟预算无法满足、且已评估过风险的低配机器），否则选择它会报配置错误。
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+    get_hasher,
+    identify_hasher,
+)
+
+# 各档位的成本参数，'low' 与 Django 5.2 各哈希器的默认值相同
+DEFAULT_TIERS = {
+    'low': {
+        'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+        'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 5},
+        'pbkdf2_sha256': {'iterations': 1000000},
+    },
+    'default': {
+        'argon2': {'time_cost': 2, 'memory_cost': 102400, 'parallelism': 8},
+        'scrypt': {'work_factor': 2 ** 15, 'block_size': 8, 'parallelism': 3},
+        'pbkdf2_sha256': {'iterations': 1000000},
+    },
+    'high': {
+        'argon2': {'time_cost': 3, 'memory_cost': 131072, 'parallelism': 8},
+        'scrypt': {'work_factor': 2 ** 16, 'block_size': 8, 'parallelism': 2},
+        'pbkdf2_sha256': {'iterations': 1500000},
+    },
+}
+
+# 低于 Django 默认成本的档位，需显式设置 ACCOUNT_PASSWORD_HASH_ALLOW_REDUCED_COST = True
+REDUCED_TIERS = {
+    'reduced': {
+        'argon2': {'time_cost': 1, 'memory_cost': 65536, 'parallelism': 4},
+        'scrypt': {'work_factor': 2 ** 14, 'block_size': 8, 'parallelism': 1},
+        'pbkdf2_sha256': {'iterations': 390000},
+    },
+}
+
+
+def get_tiers():
+    tiers = getattr(settings, 'ACCOUNT_PASSWORD_HASH_TIERS', DEFAULT_TIERS)
+    if getattr(settings, 'ACCOUNT_PASSWORD_HASH_ALLOW_REDUCED_COST', False):
+        tiers = {**REDUCED_TIERS, **tiers}
+    return tiers
+
+
+def get_tier_name():
+    return getattr(settings, 'ACCOUNT_PASSWORD_HASH_TIER', 'default')
+
+
+def get_cost(algorithm, tier=None):
+    """获取指定算法在某档位（默认当前档位）下的成本参数"""
+    tier = tier or get_tier_name()
+    tiers = get_tiers()
+    if tier not in tiers:
+        if tier in REDUCED_TIERS:
+            raise ImproperlyConfigured(
+                f"密码哈希档位 '{tier}' 低于 Django 默认成本，需设置 ACCOUNT_PASSWORD_HASH_ALLOW_REDUCED_COST = True"
+            )
+        raise ImproperlyConfigured(f"未知的密码哈希档位 '{tier}'")
+    return tiers[tier][algorithm]
+
+
+class _TieredHasherMixin:
+    """成本参数从当前档位读取；tier 不为 None 时固定使用该档位（压测用）"""
+    tier = None
+
+    def _cost(self, name):
+        return get_cost(self.algorithm, self.tier)[name]
+
+
+class TieredArgon2PasswordHasher(_TieredHasherMixin, Argon2PasswordHasher):
+    """需要安装 argon2-cffi"""
+
+    @property
+    def time_cost(self):
+        return self._cost('time_cost')
+
+    @property
+    def memory_cost(self):
+        return self._cost('memory_cost')
+
+    @property
+    def parallelism(self):
+        return self._cost('parallelism')
+
+
+class TieredScryptPasswordHasher(_TieredHasherMixin, ScryptPasswordHasher):
+    # scrypt 内存占用约为 128 * n * r 字节，OpenSSL 默认上限为 32MB，这里放宽以支持高档位
+    maxmem = 512 * 1024 * 1024
+
+    @property
+    def work_factor(self):
+        return self._cost('work_factor')
+
+    @property
+    def block_size(self):
+        return self._cost('block_size')
+
+    @property
+    def parallelism(self):
+        return self._cost('parallelism')
+
+
+class TieredPBKDF2PasswordHasher(_TieredHasherMixin, PBKDF2PasswordHasher):
+
+    @property
+    def iterations(self):
+        return self._cost('iterations')
+
+
+def describe(encoded):
+    """
+    返回已存储哈希的算法和成本参数（不含盐和哈希值），无法识别时返回 None
+    """
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return None
+    decoded = hasher.decode(encoded)
+    return {
+        key: value for key, value in decoded.items()
+        if key not in ('salt', 'hash', 'params')
+    }
+
+
+def must_update(encoded):
+    """已存储哈希的算法或成本与当前策略不一致时返回 True，登录成功后应重新哈希"""
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = get_hasher('default')
+    if hasher.algorithm != preferred.algorithm:
+        return True
+    return preferred.must_update(encoded)
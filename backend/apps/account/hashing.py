@@ -0,0 +1,203 @@
+# account/hashing.py
+"""
+登录密码校验的有界工作池
+
+Django 的 PBKDF2 校验需要数十万次迭代，直接在请求线程中执行时，登录高峰会占满所有 daphne 工作线程。
+这里把密码校验/哈希放到有界的进程池中执行，并限制排队深度：
+- 排队中的任务数达到 ACCOUNT_PASSWORD_HASH_MAX_PENDING 时直接抛出 PasswordHashBusy，
+  返回 503 和 Retry-After，而不是让请求无限堆积（DRF 接口由异常处理返回，
+  admin 登录等普通视图由 PasswordHashBusyMiddleware 返回）；
+- 记录哈希耗时和排队深度，可通过 get_stats() 或统计接口查看（按进程统计）。
+
+执行方式由 settings.ACCOUNT_PASSWORD_HASH_EXECUTOR 决定：
+- 'process': 进程池（spawn 方式启动，子进程中初始化 Django）
+- 'thread': 线程池（PBKDF2 由 OpenSSL 实现，计算时会释放 GIL）
+- 'inline': 在当前线程同步执行（测试用）
+"""
+
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import exceptions
+
+# 耗时分桶上限（秒），最后一个桶为 +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class PasswordHashBusy(exceptions.APIException):
+    """密码校验队列已满，DRF 接口返回 503，wait 作为 Retry-After 响应头"""
+    status_code = 503
+    default_detail = '登录请求过多，请稍后重试'
+    default_code = 'password_hash_busy'
+
+    def __init__(self, retry_after):
+        super().__init__()
+        self.retry_after = retry_after
+        self.wait = retry_after
+
+
+class PasswordHashBusyMiddleware(MiddlewareMixin):
+    """非 DRF 视图（如 admin 登录）调用 authenticate() 时，队列已满同样返回 503"""
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, PasswordHashBusy):
+            response = HttpResponse(str(exception.detail), status=exception.status_code)
+            response['Retry-After'] = str(exception.retry_after)
+            return response
+        return None
+
+
+_executor = None
+_lock = threading.Lock()
+_stats = {
+    'pending': 0,
+    'max_pending': 0,
+    'completed': 0,
+    'rejected': 0,
+    'latency_sum': 0.0,
+    'latency_max': 0.0,
+    'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _init_worker():
+    """进程池子进程初始化：加载 Django 配置以使用 PASSWORD_HASHERS"""
+    import django
+    django.setup()
+
+
+def _check_password(password, encoded):
+    from django.contrib.auth.hashers import check_password
+    return check_password(password, encoded)
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = _setting('ACCOUNT_PASSWORD_HASH_WORKERS', 2)
+            if _setting('ACCOUNT_PASSWORD_HASH_EXECUTOR', 'process') == 'process':
+                import multiprocessing
+                # 服务进程中已有多个线程，fork 不安全，使用 spawn 启动子进程
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            else:
+                _executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='password-hash'
+                )
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _acquire():
+    max_pending = _setting('ACCOUNT_PASSWORD_HASH_MAX_PENDING', 16)
+    with _lock:
+        if _stats['pending'] >= max_pending:
+            _stats['rejected'] += 1
+            raise PasswordHashBusy(_setting('ACCOUNT_PASSWORD_HASH_RETRY_AFTER', 2))
+        _stats['pending'] += 1
+        _stats['max_pending'] = max(_stats['max_pending'], _stats['pending'])
+
+
+def _release(elapsed):
+    with _lock:
+        _stats['pending'] -= 1
+        _stats['completed'] += 1
+        _stats['latency_sum'] += elapsed
+        _stats['latency_max'] = max(_stats['latency_max'], elapsed)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                break
+        else:
+            index = len(LATENCY_BUCKETS)
+        _stats['latency_buckets'][index] += 1
+
+
+def _run_after_broken_pool(executor, error, func, args):
+    """子进程异常退出，重建进程池，本次在当前线程执行"""
+    print(f"密码校验进程池不可用，改为当前线程执行: {error}")
+    _reset_executor(executor)
+    return func(*args)
+
+
+def _run(func, *args):
+    """在工作池中执行 func，排队已满时抛出 PasswordHashBusy"""
+    _acquire()
+    started = time.monotonic()
+    if _setting('ACCOUNT_PASSWORD_HASH_EXECUTOR', 'process') == 'inline':
+        try:
+            return func(*args)
+        finally:
+            _release(time.monotonic() - started)
+
+    executor = _get_executor()
+    try:
+        future = executor.submit(func, *args)
+    except BrokenProcessPool as e:
+        _release(time.monotonic() - started)
+        return _run_after_broken_pool(executor, e, func, args)
+    except BaseException:
+        _release(time.monotonic() - started)
+        raise
+
+    # 任务结束时才减少排队数：等待超时后 cancel() 取消不了已在执行的任务，它仍占用工作池
+    future.add_done_callback(lambda _: _release(time.monotonic() - started))
+    try:
+        return future.result(timeout=_setting('ACCOUNT_PASSWORD_HASH_TIMEOUT', 10))
+    except FutureTimeoutError:
+        # 等待超时说明工作池已饱和，按队列已满处理（还未开始的任务会被取消）
+        future.cancel()
+        raise PasswordHashBusy(_setting('ACCOUNT_PASSWORD_HASH_RETRY_AFTER', 2))
+    except BrokenProcessPool as e:
+        return _run_after_broken_pool(executor, e, func, args)
+
+
+def check_password(password, encoded):
+    """在工作池中校验密码，返回是否匹配"""
+    return _run(_check_password, password, encoded)
+
+
+def make_password(password):
+    """在工作池中生成密码哈希"""
+    return _run(_make_password, password)
+
+
+def get_stats():
+    """当前进程的密码校验统计"""
+    with _lock:
+        stats = dict(_stats)
+        stats['latency_buckets'] = dict(zip(
+            [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'],
+            _stats['latency_buckets']
+        ))
+    completed = stats['completed']
+    stats['latency_avg'] = round(stats['latency_sum'] / completed, 4) if completed else 0.0
+    stats['latency_sum'] = round(stats['latency_sum'], 4)
+    stats['latency_max'] = round(stats['latency_max'], 4)
+    stats['max_pending_limit'] = _setting('ACCOUNT_PASSWORD_HASH_MAX_PENDING', 16)
+    return stats
@@ -0,0 +1,90 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.account import hashers
+from apps.users.models import USER
+
+HASHER_CLASSES = {
+    'argon2': hashers.TieredArgon2PasswordHasher,
+    'scrypt': hashers.TieredScryptPasswordHasher,
+    'pbkdf2_sha256': hashers.TieredPBKDF2PasswordHasher,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark password hasher cost tiers against a login latency budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=10, help='每个算法/档位的校验次数')
+        parser.add_argument('--budget-ms', type=float, default=250, help='单次校验的 p95 耗时预算（毫秒）')
+        parser.add_argument('--algorithm', action='append', choices=sorted(HASHER_CLASSES),
+                            help='只测试指定算法，可重复使用')
+        parser.add_argument('--report', action='store_true', help='同时统计数据库中已存储哈希的算法和成本分布')
+
+    def handle(self, *args, **options):
+        rounds = max(1, options['rounds'])
+        budget = options['budget_ms']
+        algorithms = options['algorithm'] or list(HASHER_CLASSES)
+
+        self.stdout.write(f"当前档位: {hashers.get_tier_name()}，预算 p95 <= {budget:.0f}ms，每项 {rounds} 次")
+        self.stdout.write(f"{'算法':<16}{'档位':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'max(ms)':>10}  参数")
+
+        recommended = {}
+        for algorithm in algorithms:
+            for tier in hashers.get_tiers():
+                result = self._benchmark(algorithm, tier, rounds)
+                if result is None:
+                    self.stdout.write(self.style.WARNING(f"{algorithm:<16}{tier:<10}  不可用（缺少依赖库）"))
+                    break
+                p50, p95, worst = result
+                line = (f"{algorithm:<16}{tier:<10}{p50:>10.1f}{p95:>10.1f}{worst:>10.1f}  "
+                        f"{hashers.get_cost(algorithm, tier)}")
+                if p95 <= budget:
+                    # 档位按成本从低到高排列，取预算内成本最高的档位
+                    recommended[algorithm] = tier
+                    self.stdout.write(line)
+                else:
+                    self.stdout.write(self.style.WARNING(line))
+
+        for algorithm in algorithms:
+            if algorithm in recommended:
+                self.stdout.write(self.style.SUCCESS(f"{algorithm}: 建议档位 {recommended[algorithm]}"))
+            else:
+                self.stdout.write(self.style.WARNING(f"{algorithm}: 没有满足预算的档位"))
+
+        if options['report']:
+            self._report()
+
+    def _benchmark(self, algorithm, tier, rounds):
+        hasher = HASHER_CLASSES[algorithm]()
+        hasher.tier = tier
+        try:
+            encoded = hasher.encode('benchmark-password', hasher.salt())
+        except ValueError:
+            return None
+
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            hasher.verify('benchmark-password', encoded)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(round(len(timings) * 0.95)) - 1)]
+        return statistics.median(timings), p95, timings[-1]
+
+    def _report(self):
+        # {参数摘要: [数量, 是否需要重新哈希]}
+        counts = {}
+        for encoded in USER.objects.values_list('password', flat=True).iterator():
+            summary = hashers.describe(encoded)
+            key = str(summary) if summary else '无法识别'
+            if key not in counts:
+                counts[key] = [0, summary is not None and hashers.must_update(encoded)]
+            counts[key][0] += 1
+
+        self.stdout.write('已存储哈希分布:')
+        for key, (count, stale) in sorted(counts.items(), key=lambda item: -item[1][0]):
+            note = '  （登录时将重新哈希）' if stale else ''
+            self.stdout.write(f"  {count:>6}  {key}{note}")
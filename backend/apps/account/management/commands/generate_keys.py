@@ -1,11 +1,15 @@
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 import os
+from django.conf import settings
 from django.core.management.base import BaseCommand
 
 class Command(BaseCommand):
     help = 'Generate RSA keys for the application'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--keys-dir', help='密钥保存目录，默认为 ACCOUNT_KEYS_DIR')
+
     def handle(self, *args, **options):
         # 生成私钥
         private_key = rsa.generate_private_key(
@@ -29,7 +33,7 @@ class Command(BaseCommand):
         )
 
         # 写入文件
-        keys_dir = os.path.join(os.path.dirname(__file__), '../../keys')
+        keys_dir = options['keys_dir'] or settings.ACCOUNT_KEYS_DIR
         os.makedirs(keys_dir, exist_ok=True)
 
         with open(os.path.join(keys_dir, 'private_key.pem'), 'wb') as f:
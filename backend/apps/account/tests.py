@@ -1,3 +1,87 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from apps.quiz import benchmarking
+from . import hashing
+
+
+class PasswordHashBusyTests(TestCase):
+    """密码校验队列已满时，各登录入口返回 503 和 Retry-After"""
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmarking.create_user('busy_user')
+
+    def setUp(self):
+        environment = benchmarking.fake_environment()
+        environment.__enter__()
+        self.addCleanup(environment.__exit__, None, None, None)
+
+    def assertBusy(self, response):
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    @override_settings(ACCOUNT_PASSWORD_HASH_MAX_PENDING=0, ACCOUNT_PASSWORD_HASH_RETRY_AFTER=2)
+    def test_token_endpoint(self):
+        response = self.client.post(
+            '/v1/account/token/',
+            {'username': 'busy_user', 'password': benchmarking.BENCHMARK_PASSWORD},
+            content_type='application/json'
+        )
+        self.assertBusy(response)
+
+    @override_settings(ACCOUNT_PASSWORD_HASH_MAX_PENDING=0, ACCOUNT_PASSWORD_HASH_RETRY_AFTER=2)
+    def test_login(self):
+        response = self.client.post(
+            '/v1/account/login/',
+            {'credentials': benchmarking.encrypt_credentials('busy_user')},
+            content_type='application/json'
+        )
+        self.assertBusy(response)
+
+    @override_settings(ACCOUNT_PASSWORD_HASH_MAX_PENDING=0, ACCOUNT_PASSWORD_HASH_RETRY_AFTER=2)
+    def test_admin_login(self):
+        response = self.client.post(
+            '/admin/login/', {'username': 'busy_user', 'password': benchmarking.BENCHMARK_PASSWORD}
+        )
+        self.assertBusy(response)
+
+    def test_login_succeeds_when_not_busy(self):
+        response = self.client.post(
+            '/v1/account/login/',
+            {'credentials': benchmarking.encrypt_credentials('busy_user')},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(hashing.get_stats()['pending'], 0)
+
+
+class PublicKeyTests(TestCase):
+    """登录公钥：每次重新验证，未变化时返回304，密钥轮换后返回新公钥"""
+
+    def setUp(self):
+        environment = benchmarking.fake_environment()
+        environment.__enter__()
+        self.addCleanup(environment.__exit__, None, None, None)
+
+    def test_revalidated_with_etag(self):
+        response = self.client.get('/v1/account/public-key/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('max-age', response['Cache-Control'])
+
+        response = self.client.get('/v1/account/public-key/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_rotated_key_served(self):
+        response = self.client.get('/v1/account/public-key/')
+
+        call_command('generate_keys', keys_dir=settings.ACCOUNT_KEYS_DIR, stdout=io.StringIO())
+        rotated = self.client.get('/v1/account/public-key/', headers={'If-None-Match': response['ETag']})
+
+        self.assertEqual(rotated.status_code, 200)
+        self.assertNotEqual(rotated.json()['public_key'], response.json()['public_key'])
@@ -14,6 +14,7 @@ urlpatterns = [
     path('password/reset/', views.PasswordResetView.as_view(), name='password_reset'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('password-hash/stats/', views.PasswordHashStatsView.as_view(), name='password_hash_stats'),
     path('public-key/', views.GetPublicKeyView.as_view(), name='public_key'),
     path('password/reset/validate/', views.PasswordResetValidateView.as_view(), name='password_reset_validate'),
     path('password/reset/confirm/', views.PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
@@ -1,17 +1,71 @@
 import base64
+import hashlib
+import threading
 
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 import os
 
+from django.conf import settings
+
+
+class _KeyFile:
+    """
+    进程内缓存的密钥文件
+    文件只在首次使用、修改时间/大小变化（generate_keys 轮换密钥）或 ACCOUNT_KEYS_DIR 变化时
+    重新读取和解析，其余情况每次只做一次 stat。
+    """
+
+    def __init__(self, filename, loader):
+        self.filename = filename
+        self.loader = loader
+        self._stamp = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        path = os.path.join(settings.ACCOUNT_KEYS_DIR, self.filename)
+        stat = os.stat(path)
+        stamp = (path, stat.st_mtime_ns, stat.st_size)
+        if stamp != self._stamp:
+            with self._lock:
+                if stamp != self._stamp:
+                    with open(path, 'rb') as key_file:
+                        self._value = self.loader(key_file.read())
+                    self._stamp = stamp
+        return self._value
+
+
+def _load_private_key(data):
+    return serialization.load_pem_private_key(
+        data,
+        password=None,  # 如果私钥有密码，填在这里
+    )
+
+
+def _load_public_key(data):
+    pem = data.decode('utf-8')
+    # ETag 随公钥内容变化，轮换密钥后客户端会拿到新公钥
+    etag = '"%s"' % hashlib.sha256(data).hexdigest()
+    return pem, etag
+
+
+_private_key = _KeyFile('private_key.pem', _load_private_key)
+_public_key = _KeyFile('public_key.pem', _load_public_key)
+
+
+def get_private_key():
+    """获取已解析的 RSA 私钥对象"""
+    return _private_key.get()
+
+
+def get_public_key_pem():
+    """获取公钥 PEM 文本及其 ETag"""
+    return _public_key.get()
+
+
 def decrypt_with_private_key(encrypted_data: str) -> str:
-    key_path = os.path.join(os.path.dirname(__file__), 'keys', 'private_key.pem')
-    print(key_path)
-    with open(key_path, 'rb') as key_file:
-        private_key = serialization.load_pem_private_key(
-            key_file.read(),
-            password=None,  # 如果私钥有密码，填在这里
-        )
+    private_key = get_private_key()
 
     # Base64 解码
     encrypted_bytes = base64.b64decode(encrypted_data)
@@ -21,4 +75,4 @@ def decrypt_with_private_key(encrypted_data: str) -> str:
         encrypted_bytes,
         padding.PKCS1v15()  # 或 OAEP
     )
-    return decrypted.decode('utf-8')
\ No newline at end of file
+    return decrypted.decode('utf-8')
@@ -1,9 +1,10 @@
+import json
 from datetime import timedelta
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.throttling import UserRateThrottle
 from django.contrib.auth import login, authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -14,11 +15,13 @@ from django.contrib.auth.tokens import default_token_generator
 from django.utils.encoding import force_bytes
 from django.http import JsonResponse
 from django.views import View
+from django.utils.cache import get_conditional_response, patch_cache_control
 
-import os
 from apps.users.models import USER
 from apps.account.serializers import UserDetailSerializer, PasswordResetSerializer
-from apps.account.utils import decrypt_with_private_key
+from apps.account.utils import decrypt_with_private_key, get_public_key_pem
+from apps.account import hashing
+from apps.users.permissions import IsSuperuserOrStaff
 
 
 class LoginThrottle(UserRateThrottle):
@@ -27,32 +30,42 @@ class LoginThrottle(UserRateThrottle):
 
 class GetPublicKeyView(View):
     def get(self, request):
-        key_path = os.path.join(os.path.dirname(__file__), 'keys', 'public_key.pem')
-        with open(key_path, 'r') as f:
-            public_key = f.read()
-        return JsonResponse({'public_key': public_key})
+        # 公钥从进程内缓存读取，密钥文件变化时自动重新加载
+        public_key, etag = get_public_key_pem()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = JsonResponse({'public_key': public_key})
+            response['ETag'] = etag
+        patch_cache_control(response, **settings.ACCOUNT_PUBLIC_KEY_CACHE_CONTROL)
+        return response
 
 class LoginView(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []
 
     def post(self, request):
+        encrypted_credentials = request.data.get('credentials')
         encrypted_username = request.data.get('username')
         encrypted_password = request.data.get('password')
         remember_me = request.data.get('remember_me', False)
 
-        if not encrypted_username or not encrypted_password:
+        if not encrypted_credentials and (not encrypted_username or not encrypted_password):
             return Response({'detail': '缺少参数'}, status=400)
 
         try:
             # 🔐 解密
-            username = decrypt_with_private_key(encrypted_username)
-            password = decrypt_with_private_key(encrypted_password)
+            if encrypted_credentials:
+                # 用户名和密码整体加密，只需一次RSA解密
+                username, password = self._decrypt_credentials(encrypted_credentials)
+            else:
+                # 兼容旧客户端：用户名和密码分别加密
+                username = decrypt_with_private_key(encrypted_username)
+                password = decrypt_with_private_key(encrypted_password)
         except Exception as e:
             return Response({'detail': '解密失败'}, status=400)
 
         # 此时 username 和 password 是明文
-        # 使用 Django 默认认证
+        # 使用 Django 默认认证（密码校验队列已满时抛出 PasswordHashBusy，返回 503 和 Retry-After）
         user = authenticate(username=username, password=password)
         if not user:
             return Response({'detail': '用户名或密码错误'}, status=401)
@@ -69,6 +82,25 @@ class LoginView(APIView):
             'user': UserDetailSerializer(user).data
         })
 
+    @staticmethod
+    def _decrypt_credentials(encrypted_credentials):
+        """
+        解密 JSON {"username", "password"} 整体加密的登录凭据，返回 (username, password)
+        """
+        credentials = json.loads(decrypt_with_private_key(encrypted_credentials))
+        username = credentials.get('username')
+        password = credentials.get('password')
+        if not isinstance(username, str) or not isinstance(password, str):
+            raise ValueError('登录凭据格式错误')
+        return username, password
+
+class PasswordHashStatsView(APIView):
+    """密码校验工作池统计：排队深度、拒绝次数和耗时分布（管理员，按进程统计）"""
+    permission_classes = [IsAuthenticated, IsSuperuserOrStaff]
+
+    def get(self, request):
+        return Response(hashing.get_stats())
+
 class LogoutView(APIView):
     def post(self, request):
         try:
@@ -0,0 +1,145 @@
+# quiz/ai_cache.py
+"""
+AI结果缓存
+
+相同的输入总会得到同样的提示词，对应的AI分析结果可以直接复用。
+缓存键为规范化输入的 SHA-256 摘要（内容寻址），数据存放在 Django 缓存框架的
+QUIZ_AI_CACHE_ALIAS 缓存中：
+- 过期时间由 QUIZ_AI_CACHE_TIMEOUT 控制；
+- 容量与淘汰由缓存后端负责（LocMemCache 的 MAX_ENTRIES 按最近最少使用淘汰，
+  redis 需配置 maxmemory-policy allkeys-lru）。
+命中/未命中次数按进程统计（不写入缓存，不会随缓存淘汰），可通过 get_stats() 或统计接口查看，
+所有进程的合计见 /metrics 的 algoscent_cache_requests_total。
+异步视图使用 aget()/aset()，缓存读写不阻塞事件循环。
+
+SingleFlight 用于合并同一进程内并发的相同请求：缓存未命中时，相同输入只发起一次上游调用，
+其余请求等待同一个结果。
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from backend import metrics, profiling
+
+
+def normalize(value):
+    """
+    规范化输入：去掉字符串首尾空白，多选答案与选项顺序无关，排序后比较
+    """
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(k).strip(): normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [normalize(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, ensure_ascii=False, sort_keys=True))
+    return value
+
+
+def content_hash(value):
+    """规范化输入的 SHA-256 摘要"""
+    canonical = json.dumps(
+        normalize(value), ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class AIResultCache:
+    """按规范化输入缓存AI结果"""
+
+    def __init__(self, namespace, timeout_setting='QUIZ_AI_CACHE_TIMEOUT'):
+        self.namespace = namespace
+        self.timeout_setting = timeout_setting
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'QUIZ_AI_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, self.timeout_setting, getattr(settings, 'QUIZ_AI_CACHE_TIMEOUT', 7 * 24 * 3600))
+
+    def _key(self, value):
+        return f'quiz:ai:{self.namespace}:{content_hash(value)}'
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _record(self, hit):
+        self._count('hits' if hit else 'misses')
+        profiling.record_cache(hit)
+        metrics.CACHE_REQUESTS.inc(cache=f'ai:{self.namespace}', result='hit' if hit else 'miss')
+
+    def get(self, value):
+        """查询缓存，返回 None 表示未命中"""
+        result = self.cache.get(self._key(value))
+        self._record(result is not None)
+        return result
+
+    async def aget(self, value):
+        """get 的异步版本"""
+        result = await self.cache.aget(self._key(value))
+        self._record(result is not None)
+        return result
+
+    def set(self, value, result):
+        self.cache.set(self._key(value), result, self.timeout)
+
+    async def aset(self, value, result):
+        """set 的异步版本"""
+        await self.cache.aset(self._key(value), result, self.timeout)
+
+    async def acount_coalesced(self):
+        """记录一次被合并到进行中调用的请求（SingleFlight 的 on_coalesced 回调）"""
+        self._count('coalesced')
+
+    def get_stats(self):
+        """当前进程的命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / total, 4) if total else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+class SingleFlight:
+    """合并同一进程内并发的相同异步调用"""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func, on_coalesced=None):
+        """
+        key 相同的调用进行中时等待其结果，否则执行 func()
+        on_coalesced 为协程函数，请求被合并时调用
+        单个等待方被取消不会取消共享的调用
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        elif on_coalesced is not None:
+            await on_coalesced()
+        return await asyncio.shield(task)
+
+
+# 香调分析结果：规范化的“问题→答案”映射 → AI返回的结果字典
+fragrance_cache = AIResultCache('fragrance')
+
+# AI扩写结果：规范化的模型和提示词 → 扩写后的文本
+extend_text_cache = AIResultCache('extend_text', 'QUIZ_EXTEND_TEXT_CACHE_TIMEOUT')
+extend_text_flight = SingleFlight()
@@ -0,0 +1,343 @@
+# quiz/ai_gateway.py
+"""
+AI接口网关
+
+所有对阿里云百炼（DashScope / OpenAI 兼容接口）的调用都经过这里：
+- 每个进程只创建一个客户端，复用 HTTP 连接池；
+- 每次调用设置超时（QUIZ_AI_TIMEOUT），超时、连接失败、限流和服务端错误按指数退避加随机抖动重试，
+  最多 QUIZ_AI_MAX_RETRIES 次；
+- 熔断器：连续失败达到 QUIZ_AI_BREAKER_THRESHOLD 次后熔断 QUIZ_AI_BREAKER_RESET 秒，
+  期间直接抛出 AIUnavailable，由调用方返回默认结果，不再等待故障的上游；
+  熔断时间结束后放行一次试探请求，成功则恢复。
+
+settings.QUIZ_AI_PROVIDER 为 'fake' 时使用本地假实现，不访问网络，供测试和压测使用，
+延迟和失败率由 QUIZ_AI_FAKE_LATENCY、QUIZ_AI_FAKE_FAILURE_RATE 控制。
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from backend import profiling
+
+DASHSCOPE_COMPATIBLE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+
+class AIUnavailable(Exception):
+    """AI接口不可用（重试后仍失败或已熔断）"""
+
+
+class RetryableError(Exception):
+    """可重试的上游错误：超时、连接失败、限流、服务端错误"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CircuitBreaker:
+    """进程内熔断器"""
+
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def threshold(self):
+        return _setting('QUIZ_AI_BREAKER_THRESHOLD', 5)
+
+    @property
+    def reset_timeout(self):
+        return _setting('QUIZ_AI_BREAKER_RESET', 30)
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """是否放行本次请求；半开状态只放行一个试探请求"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """请求以不可重试的错误结束（上游仍可响应），不计入失败次数"""
+        with self._lock:
+            self._probing = False
+
+    def get_stats(self):
+        return {'state': self.state, 'failures': self.failures}
+
+
+class DashScopeProvider:
+    """阿里云百炼"""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self._async_client = None
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            # 重试由网关控制，关闭SDK自带的重试
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=DASHSCOPE_COMPATIBLE_BASE_URL,
+                max_retries=0,
+            )
+        return self._async_client
+
+    async def chat(self, messages, model, timeout):
+        """调用对话模型，返回回复文本"""
+        import openai
+
+        try:
+            completion = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout,
+            )
+        except (openai.APITimeoutError, openai.APIConnectionError,
+                openai.RateLimitError, openai.InternalServerError) as e:
+            raise RetryableError(str(e)) from e
+        return completion.choices[0].message.content
+
+    async def stream_chat(self, messages, model, timeout):
+        """流式调用对话模型，逐段返回回复文本"""
+        import openai
+
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=timeout,
+                stream=True,
+            )
+        except (openai.APITimeoutError, openai.APIConnectionError,
+                openai.RateLimitError, openai.InternalServerError) as e:
+            raise RetryableError(str(e)) from e
+
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except (openai.APITimeoutError, openai.APIConnectionError) as e:
+            raise RetryableError(str(e)) from e
+        finally:
+            # 客户端断开或生成结束时关闭上游连接
+            await stream.close()
+
+    def run_app(self, app_id, prompt, timeout):
+        """调用百炼应用，返回输出文本（同步，SDK 内部复用共享连接池）"""
+        from http import HTTPStatus
+        import requests
+        from dashscope import Application
+
+        try:
+            response = Application.call(
+                api_key=self.api_key,
+                app_id=app_id,
+                prompt=prompt,
+                request_timeout=timeout,
+            )
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise RetryableError(str(e)) from e
+
+        if response.status_code != HTTPStatus.OK:
+            message = (f'request_id={response.request_id}, code={response.status_code}, '
+                       f'message={response.message}')
+            if response.status_code == HTTPStatus.TOO_MANY_REQUESTS or response.status_code >= 500:
+                raise RetryableError(message)
+            print(message)
+            print(f'请参考文档：https://help.aliyun.com/zh/model-studio/developer-reference/error-code')
+            raise AIUnavailable(message)
+        return response.output.text
+
+
+class FakeProvider:
+    """本地假实现：固定延迟、按比例失败，不访问网络"""
+
+    @property
+    def latency(self):
+        return _setting('QUIZ_AI_FAKE_LATENCY', 0.05)
+
+    @property
+    def failure_rate(self):
+        return _setting('QUIZ_AI_FAKE_FAILURE_RATE', 0.0)
+
+    def _maybe_fail(self):
+        if random.random() < self.failure_rate:
+            raise RetryableError('fake provider failure')
+
+    async def chat(self, messages, model, timeout):
+        await asyncio.sleep(self.latency)
+        self._maybe_fail()
+        return f"{messages[-1]['content']}（扩写）"
+
+    async def stream_chat(self, messages, model, timeout):
+        self._maybe_fail()
+        text = f"{messages[-1]['content']}（扩写）"
+        for char in text:
+            await asyncio.sleep(self.latency / len(text))
+            yield char
+
+    def run_app(self, app_id, prompt, timeout):
+        from .analysis import DEFAULT_FRAGRANCE_RESULT
+
+        time.sleep(self.latency)
+        self._maybe_fail()
+        return json.dumps(DEFAULT_FRAGRANCE_RESULT, ensure_ascii=False)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+_breakers = {
+    'chat': CircuitBreaker('chat'),
+    'app': CircuitBreaker('app'),
+}
+
+
+def get_provider():
+    """获取当前进程共享的AI服务实现"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            if _setting('QUIZ_AI_PROVIDER', 'dashscope') == 'fake':
+                _provider = FakeProvider()
+            else:
+                _provider = DashScopeProvider(_setting('DASHSCOPE_API_KEY', ''))
+        return _provider
+
+
+def reset():
+    """重置服务实现和熔断器状态（切换配置或测试时使用）"""
+    global _provider
+    with _provider_lock:
+        _provider = None
+    for breaker in _breakers.values():
+        breaker.record_success()
+
+
+def _retry_delay(attempt):
+    """指数退避加全抖动"""
+    backoff = _setting('QUIZ_AI_RETRY_BACKOFF', 0.5)
+    return random.uniform(0, backoff * (2 ** attempt))
+
+
+def _before_call(breaker):
+    if not breaker.allow():
+        raise AIUnavailable(f'AI接口已熔断（{breaker.name}）')
+
+
+async def achat(messages, model='qwen-plus'):
+    """调用对话模型（异步），返回回复文本；失败时抛出 AIUnavailable"""
+    breaker = _breakers['chat']
+    _before_call(breaker)
+    max_retries = _setting('QUIZ_AI_MAX_RETRIES', 2)
+    for attempt in range(max_retries + 1):
+        try:
+            with profiling.ai_call():
+                result = await get_provider().chat(messages, model, _setting('QUIZ_AI_TIMEOUT', 30))
+        except RetryableError as e:
+            print(f"AI接口调用失败（第{attempt + 1}次）: {e}")
+            if attempt == max_retries:
+                breaker.record_failure()
+                raise AIUnavailable(str(e)) from e
+            await asyncio.sleep(_retry_delay(attempt))
+        except BaseException:
+            # 不可重试的错误或请求被取消，释放半开状态的试探名额
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+async def astream_chat(messages, model='qwen-plus'):
+    """
+    流式调用对话模型（异步生成器），逐段返回回复文本；失败时抛出 AIUnavailable
+    只在收到第一段内容之前重试，已输出部分内容后出错直接失败
+    """
+    breaker = _breakers['chat']
+    _before_call(breaker)
+    max_retries = _setting('QUIZ_AI_MAX_RETRIES', 2)
+    attempt = 0
+    while True:
+        received = False
+        try:
+            async for delta in get_provider().stream_chat(messages, model, _setting('QUIZ_AI_TIMEOUT', 30)):
+                received = True
+                yield delta
+        except RetryableError as e:
+            print(f"AI接口调用失败（第{attempt + 1}次）: {e}")
+            if received or attempt == max_retries:
+                breaker.record_failure()
+                raise AIUnavailable(str(e)) from e
+            await asyncio.sleep(_retry_delay(attempt))
+            attempt += 1
+        except BaseException:
+            # 不可重试的错误或客户端断开，释放半开状态的试探名额
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return
+
+
+def run_app(app_id, prompt):
+    """调用百炼应用（同步），返回输出文本；失败时抛出 AIUnavailable"""
+    breaker = _breakers['app']
+    _before_call(breaker)
+    max_retries = _setting('QUIZ_AI_MAX_RETRIES', 2)
+    for attempt in range(max_retries + 1):
+        try:
+            with profiling.ai_call():
+                result = get_provider().run_app(app_id, prompt, _setting('QUIZ_AI_TIMEOUT', 30))
+        except RetryableError as e:
+            print(f"AI接口调用失败（第{attempt + 1}次）: {e}")
+            if attempt == max_retries:
+                breaker.record_failure()
+                raise AIUnavailable(str(e)) from e
+            time.sleep(_retry_delay(attempt))
+        except BaseException:
+            # 不可重试的错误或请求被取消，释放半开状态的试探名额
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+def get_stats():
+    """各调用类型的熔断器状态"""
+    return {name: breaker.get_stats() for name, breaker in _breakers.items()}
@@ -0,0 +1,282 @@
+# quiz/analysis.py
+"""
+Part4 香调分析
+
+提交Part3后，分析任务在后台执行（Celery 或进程内线程池），
+结果写入 UserQuizSession 的 main_fragrance / secondary_fragrance / description，
+HTTP 请求线程不再等待AI接口返回。
+
+执行方式由 settings.QUIZ_ANALYSIS_EXECUTOR 决定：
+- 'celery': 投递到 Celery（投递失败时退回到进程内线程池）
+- 'thread': 进程内线程池
+- 'inline': 在当前线程同步执行（测试用）
+
+排队或分析中超过 QUIZ_ANALYSIS_STALE_AFTER 秒仍未结束的任务（Celery 消息丢失、进程重启导致线程池中的任务丢失等）
+视为已丢失，获取Part4时会重新创建分析任务。
+"""
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from backend import metrics
+from . import ai_gateway, catalog, reports
+from .ai_cache import fragrance_cache
+from .models import UserQuizSession, UserAnswer
+
+DEFAULT_FRAGRANCE_RESULT = {
+    '主香调': '花香',
+    '次香调': '果香',
+    '描述': '您是一位热爱自然、追求内心平静的人。花香调的香气能够带给您宁静与舒适，而果香调则为您的生活增添活力与愉悦。这种香氛组合适合日常使用，既能展现您的温柔气质，又能体现您积极乐观的生活态度。'
+}
+
+# 香调分析使用的百炼应用 ID
+FRAGRANCE_APP_ID = '6e85e84a55ef4b5ea41b197077a159c6'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'QUIZ_ANALYSIS_THREAD_WORKERS', 4),
+                thread_name_prefix='fragrance-analysis'
+            )
+        return _executor
+
+
+def _run_in_thread(session_id):
+    """线程池中执行分析任务，前后清理数据库连接"""
+    close_old_connections()
+    try:
+        run_fragrance_analysis(session_id)
+    finally:
+        close_old_connections()
+
+
+def _dispatch(session_id):
+    executor = getattr(settings, 'QUIZ_ANALYSIS_EXECUTOR', 'celery')
+    if executor == 'inline':
+        run_fragrance_analysis(session_id)
+        return
+
+    if executor == 'celery':
+        try:
+            from .tasks import analyze_session_fragrance
+            analyze_session_fragrance.delay(session_id)
+            return
+        except Exception as e:
+            print(f"投递香调分析任务失败，改用进程内线程池: {e}")
+
+    _get_executor().submit(_run_in_thread, session_id)
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'QUIZ_ANALYSIS_STALE_AFTER', 300))
+
+
+def needs_analysis(session):
+    """会话是否需要（重新）创建分析任务：未分析、分析失败，或排队/分析中的任务已超时"""
+    if session.analysis_status in ('none', 'failed'):
+        return True
+    if session.analysis_status in ('pending', 'running'):
+        started_at = session.analysis_started_at
+        return started_at is None or started_at < _stale_before()
+    return False
+
+
+def enqueue_fragrance_analysis(session):
+    """
+    为会话创建香调分析任务
+    正常排队、分析中或已完成的会话不会重复创建，返回当前分析状态
+    """
+    stale = Q(analysis_status__in=['pending', 'running']) & (
+        Q(analysis_started_at__isnull=True) | Q(analysis_started_at__lt=_stale_before())
+    )
+    updated = UserQuizSession.objects.filter(
+        Q(analysis_status__in=['none', 'failed']) | stale,
+        pk=session.pk
+    ).update(analysis_status='pending', analysis_started_at=timezone.now())
+
+    if updated:
+        # 事务提交后再投递，保证后台任务能读到本次保存的答案
+        transaction.on_commit(lambda: _dispatch(session.session_id))
+
+    session.analysis_status = UserQuizSession.objects.filter(
+        pk=session.pk
+    ).values_list('analysis_status', flat=True).first()
+    return session.analysis_status
+
+
+def run_fragrance_analysis(session_id):
+    """执行香调分析并保存结果"""
+    try:
+        session = UserQuizSession.objects.get(session_id=session_id)
+    except UserQuizSession.DoesNotExist:
+        print(f"香调分析失败，会话不存在: {session_id}")
+        return
+
+    try:
+        _analyze(session)
+    except Exception as e:
+        # 标记为失败，下次获取Part4时会重新分析，不会一直停留在排队/分析中
+        print(f"香调分析失败: {e}")
+        try:
+            UserQuizSession.objects.filter(pk=session.pk).update(analysis_status='failed')
+        except Exception as e:
+            print(f"更新香调分析状态失败: {e}")
+
+
+def _analyze(session):
+    """标记为分析中，调用AI并保存结果"""
+    # 从实际开始分析时计算超时，排队时间较长的任务不会在分析中被重复创建
+    session.analysis_status = 'running'
+    session.analysis_started_at = timezone.now()
+    session.save(update_fields=['analysis_status', 'analysis_started_at'])
+
+    fragrance_result = _generate_fragrance_combinations(session)
+
+    session.main_fragrance = fragrance_result['main_fragrance'] or ''
+    session.secondary_fragrance = fragrance_result['secondary_fragrance'] or ''
+    session.description = fragrance_result['description'] or ''
+    # AI返回空结果时标记为失败，下次获取Part4时会重新分析
+    if session.main_fragrance and session.secondary_fragrance:
+        session.analysis_status = 'done'
+    else:
+        session.analysis_status = 'failed'
+    session.save(update_fields=UserQuizSession.ANALYSIS_RESULT_FIELDS)
+
+    # complete 接口不等待分析结果，会话已完成时用新的分析结果重新生成报告快照
+    completed_session = UserQuizSession.objects.filter(pk=session.pk, status='completed').first()
+    if completed_session is not None:
+        reports.refresh_snapshot(completed_session)
+
+
+def _generate_fragrance_combinations(session):
+    """
+    调用AI接口分析用户答题记录，返回主香调、次香调和描述
+    """
+    # 调用AI接口分析用户答题记录
+    try:
+        ai_result = _call_fragrance_ai(session)
+        # 解析AI返回的结果
+        main_fragrance = ai_result.get('主香调')
+        secondary_fragrance = ai_result.get('次香调')
+        description = ai_result.get('描述', '')  # 描述内容
+
+        return {
+            'main_fragrance': main_fragrance,
+            'secondary_fragrance': secondary_fragrance,
+            'description': description
+        }
+
+    except Exception as e:
+        # 如果AI接口调用失败，使用空值
+        print(f"AI接口调用失败: {e}")
+        return {
+            'main_fragrance': '',
+            'secondary_fragrance': '',
+            'description': ''
+        }
+
+
+def _call_fragrance_ai(session):
+    """
+    调用AI接口分析用户答题记录，返回主香调和次香调
+    """
+    # 获取用户前三个部分的答案，选项文本从题目目录缓存中解析
+    user_answers = UserAnswer.objects.filter(
+        session=session
+    ).select_related('question')
+    # 选项文本映射只获取一次（每次获取都要读取共享缓存中的版本号）
+    label_map = catalog.get_option_labels()
+
+    # 构建问题和答案的字典对
+    question_answer_dict = {}
+
+    for answer in user_answers:
+        question = answer.question
+        question_text = question.text
+
+        # 根据题目类型处理答案
+        if question.type in ['single', 'image-single']:  # 单选题
+            try:
+                value = json.loads(answer.value) if answer.value else None
+                # 获取选项文本
+                if value:
+                    label = catalog.get_option_label(label_map, question.id, value)
+                    answer_text = label if label is not None else value
+                else:
+                    answer_text = None
+            except json.JSONDecodeError:
+                answer_text = answer.value
+
+        elif question.type in ['multiple', 'image-multiple']:  # 多选题
+            try:
+                values = json.loads(answer.value) if answer.value else []
+                # 获取选项文本列表
+                answer_texts = []
+                if values:
+                    for value in values:
+                        label = catalog.get_option_label(label_map, question.id, value)
+                        answer_texts.append(label if label is not None else value)
+                answer_text = answer_texts
+            except json.JSONDecodeError:
+                answer_text = answer.value
+
+        elif question.type in ['text', 'single-with-text']:  # 填空题或单选加填空
+            answer_text = answer.text if answer.text else answer.value
+
+        else:  # 其他类型
+            answer_text = answer.value
+
+        # 添加到字典
+        question_answer_dict[question_text] = answer_text
+
+    # 限制为前20题
+    if len(question_answer_dict) > 20:
+        # 转换为列表，取前20个，再转回字典
+        items = list(question_answer_dict.items())[:20]
+        question_answer_dict = dict(items)
+
+    # 相同的答案组合直接复用已缓存的分析结果
+    cached_result = fragrance_cache.get(question_answer_dict)
+    if cached_result is not None:
+        return cached_result
+
+    dashscope_api_key = getattr(settings, 'DASHSCOPE_API_KEY', '')
+    if not dashscope_api_key and getattr(settings, 'QUIZ_AI_PROVIDER', 'dashscope') == 'dashscope':
+        print("阿里云百炼API密钥未配置")
+        # 返回默认值
+        return dict(DEFAULT_FRAGRANCE_RESULT)
+
+    try:
+        # 超时、重试和熔断由AI网关处理，上游故障时直接返回默认值
+        with metrics.observe_ai_call('call_fragrance_ai'):
+            output_text = ai_gateway.run_app(FRAGRANCE_APP_ID, str(question_answer_dict))
+    except ai_gateway.AIUnavailable as e:
+        print(f"AI接口不可用，使用默认香调: {e}")
+        # 返回默认值
+        return dict(DEFAULT_FRAGRANCE_RESULT)
+
+    try:
+        result_dict = json.loads(output_text)
+    except json.JSONDecodeError as e:
+        print(f"解析AI返回结果失败: {e}")
+        metrics.AI_CALL_ERRORS.inc(operation='call_fragrance_ai', error='JSONDecodeError')
+        # 返回默认值
+        return dict(DEFAULT_FRAGRANCE_RESULT)
+
+    # 只缓存有效的分析结果
+    if isinstance(result_dict, dict) and result_dict.get('主香调') and result_dict.get('次香调'):
+        fragrance_cache.set(question_answer_dict, result_dict)
+    return result_dict
@@ -5,4 +5,7 @@ from django.apps import AppConfig
 class QuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.quiz'
-    verbose_name = '测验管理'
\ No newline at end of file
+    verbose_name = '测验管理'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,153 @@
+# quiz/async_api.py
+"""
+原生异步视图支持
+
+DRF 的视图只能同步执行，在 daphne/ASGI 下每个请求都会占用一个同步线程，
+AI 接口等慢请求会很快耗尽线程池。async_api_view 把普通的 Django 异步视图包装成与 DRF 视图
+行为一致的接口，请求处理复用 DRF APIView 的各个环节，只有认证改为异步执行：
+- 按 REST_FRAMEWORK 配置认证，JWT 用户从用户查询缓存中获取（未命中时使用异步 ORM 查询），
+  其他认证方式退回到线程中执行；
+- 校验权限类（传入视图对象），执行限流类（默认为 DEFAULT_THROTTLE_CLASSES，限流存储的读写在线程中执行）；
+- 按 DEFAULT_PARSER_CLASSES 解析请求体（JSON、表单、multipart），
+  异常交给配置的 EXCEPTION_HANDLER 处理，按 DRF 的格式返回 {"detail": ...}。
+视图收到的是 DRF 的 Request：通过 request.user 获取当前用户，通过 request.data 获取请求体，
+通过 request.query_params 获取查询参数，返回 json_response() 生成的响应。
+"""
+
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from apps.account.authentication import check_jwt_user, get_jwt_user_id
+from apps.users import lookups
+
+
+def json_response(data, status=status.HTTP_200_OK, headers=None):
+    """按 DRF JSONRenderer 的格式渲染响应"""
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        status=status,
+        content_type='application/json'
+    )
+    for key, value in (headers or {}).items():
+        response[key] = value
+    return response
+
+
+async def _aget_jwt_user(validated_token):
+    """与 CachedJWTAuthentication.get_user 相同的校验逻辑，未命中缓存时使用异步 ORM 查询用户"""
+    user = await lookups.aget_user(get_jwt_user_id(validated_token))
+    return check_jwt_user(user, validated_token)
+
+
+async def _authenticate(request, authenticators):
+    """依次尝试配置的认证类，返回 (认证类, user, auth)，都未通过时认证类为 None"""
+    for authenticator in authenticators:
+        if isinstance(authenticator, JWTAuthentication):
+            header = authenticator.get_header(request)
+            raw_token = authenticator.get_raw_token(header) if header is not None else None
+            if raw_token is None:
+                continue
+            validated_token = authenticator.get_validated_token(raw_token)
+            return authenticator, await _aget_jwt_user(validated_token), validated_token
+        result = await sync_to_async(authenticator.authenticate)(request)
+        if result is not None:
+            return (authenticator, *result)
+
+    return None, AnonymousUser(), None
+
+
+def _rendered_response(response):
+    """异常处理返回的 DRF Response 渲染为与 json_response() 一致的普通响应"""
+    headers = {key: value for key, value in response.items() if key.lower() != 'content-type'}
+    return json_response(response.data, status=response.status_code, headers=headers)
+
+
+def _check_throttles(request, throttle_classes, view=None):
+    """
+    按顺序执行限流类，第一个拒绝时停止：后面的限流类（如全局AI额度）不再扣减，
+    单个用户超出自己的额度后不会继续消耗全局额度；
+    前面已放行的令牌桶限流类（有 refund 方法）退回本次扣减的令牌，如全局额度不足时不消耗用户额度
+    """
+    passed = []
+    for throttle in [throttle() for throttle in throttle_classes]:
+        if not throttle.allow_request(request, view):
+            for previous in passed:
+                if hasattr(previous, 'refund'):
+                    previous.refund()
+            raise exceptions.Throttled(throttle.wait())
+        passed.append(throttle)
+
+
+def throttle_response(request, throttle_classes):
+    """
+    在视图中按需执行限流（只有部分分支消耗额度时使用），超出时返回429响应，否则返回 None
+    """
+    try:
+        _check_throttles(request, throttle_classes)
+    except exceptions.Throttled as e:
+        headers = {'Retry-After': '%d' % e.wait} if e.wait is not None else None
+        return json_response({'detail': e.detail}, status=e.status_code, headers=headers)
+    return None
+
+
+async def athrottle_response(request, throttle_classes):
+    """throttle_response 的异步版本，限流存储（缓存、redis）的读写在线程中执行，不阻塞事件循环"""
+    return await sync_to_async(throttle_response)(request, throttle_classes)
+
+
+def async_api_view(methods, permission_classes=(IsAuthenticated,), throttle_classes=None):
+    """
+    将 async def view(request, ...) 包装为带认证、权限和限流的接口
+    throttle_classes 与 DRF 视图的同名属性一致，指定后替换默认限流类
+    """
+    allowed = [method.upper() for method in methods]
+
+    def decorator(view):
+        # 权限、限流、解析和异常处理使用的视图类，与 @api_view 生成的视图类相同，只是不经过 dispatch
+        view_class = type(view.__name__, (APIView,), {
+            'permission_classes': permission_classes,
+            'throttle_classes': api_settings.DEFAULT_THROTTLE_CLASSES if throttle_classes is None else throttle_classes,
+        })
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            api_view = view_class()
+            api_view.args, api_view.kwargs, api_view.headers = args, kwargs, {}
+            api_view.format_kwarg = None
+            request = api_view.request = api_view.initialize_request(request, *args, **kwargs)
+            try:
+                # 与 DRF 一致：响应固定使用第一个渲染器，不因 Accept 返回406
+                request.accepted_renderer, request.accepted_media_type = (
+                    api_view.perform_content_negotiation(request, force=True)
+                )
+                if request.method not in allowed:
+                    raise exceptions.MethodNotAllowed(request.method)
+                # 认证结果写入 DRF Request，之后访问 user/successful_authenticator 不会再同步认证
+                request._authenticator, request.user, request.auth = (
+                    await _authenticate(request, request.authenticators)
+                )
+                api_view.check_permissions(request)
+                await sync_to_async(_check_throttles)(request, api_view.throttle_classes, api_view)
+                # 解析请求体，格式错误时抛出 ParseError / UnsupportedMediaType
+                request.data
+                return await view(request, *args, **kwargs)
+            except Exception as e:
+                # 非 DRF 异常由 handle_exception 重新抛出，按普通的服务端错误处理
+                response = _rendered_response(api_view.handle_exception(e))
+                if isinstance(e, exceptions.MethodNotAllowed):
+                    response['Allow'] = ', '.join(allowed)
+                return response
+
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
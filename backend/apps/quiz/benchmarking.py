@@ -0,0 +1,125 @@
+# quiz/benchmarking.py
+"""
+性能测试公共工具（benchmark_endpoints、load_test 命令使用）
+
+- fake_environment()：AI 使用本地假实现，关闭 DRF 的频率限流（AI 令牌桶仍然执行，只是额度放大），
+  香调分析和密码校验的执行方式可以指定，登录使用临时目录中生成的一次性密钥，退出时恢复原配置；
+- seed_catalog()：用 import_questions、import_fragrance_categories 导入题目和香调类别；
+- create_user()、build_part_answers()、encrypt_credentials()：构造用户、各部分答案和登录凭据；
+- percentile()：计算耗时分位数。
+"""
+
+import base64
+import contextlib
+import io
+import json
+import tempfile
+
+from django.core.management import call_command
+from django.test.utils import override_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import ai_gateway, throttling
+
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# AI令牌桶的额度放大到不会耗尽，保留限流本身的开销
+_UNLIMITED_BUCKET = {'capacity': 10 ** 9, 'refill_rate': 10 ** 9}
+
+
+@contextlib.contextmanager
+def fake_environment(ai_latency=0.0, analysis_executor='inline', hash_executor='inline'):
+    """
+    测试期间的配置：AI 使用本地假实现（延迟 ai_latency 秒），不访问网络
+    analysis_executor、hash_executor 为香调分析和密码校验的执行方式，为 None 时保留原配置
+    """
+    overrides = {
+        'QUIZ_AI_PROVIDER': 'fake',
+        'QUIZ_AI_FAKE_LATENCY': ai_latency,
+        'QUIZ_AI_FAKE_FAILURE_RATE': 0.0,
+        'QUIZ_THROTTLE_REDIS_URL': '',
+        'QUIZ_AI_THROTTLE_BUCKETS': {'ai_user': _UNLIMITED_BUCKET, 'ai_global': _UNLIMITED_BUCKET},
+    }
+    if analysis_executor is not None:
+        overrides['QUIZ_ANALYSIS_EXECUTOR'] = analysis_executor
+    if hash_executor is not None:
+        overrides['ACCOUNT_PASSWORD_HASH_EXECUTOR'] = hash_executor
+    # 登录密钥生成到临时目录，不写入（也不覆盖）apps/account/keys 中的部署密钥
+    keys_dir = tempfile.TemporaryDirectory(prefix='algoscent_keys_')
+    call_command('generate_keys', keys_dir=keys_dir.name, stdout=io.StringIO())
+    overrides['ACCOUNT_KEYS_DIR'] = keys_dir.name
+    # DRF 的频率限流类在导入时就保存了限流频率，override_settings 不会更新，直接替换；频率为 None 时不限流
+    saved_rates = SimpleRateThrottle.THROTTLE_RATES
+    with override_settings(**overrides):
+        SimpleRateThrottle.THROTTLE_RATES = {scope: None for scope in ('anon', 'user', 'login')}
+        ai_gateway.reset()
+        throttling.reset()
+        try:
+            yield
+        finally:
+            SimpleRateThrottle.THROTTLE_RATES = saved_rates
+            ai_gateway.reset()
+            throttling.reset()
+            keys_dir.cleanup()
+
+
+def seed_catalog():
+    """导入题目和香调类别"""
+    call_command('import_questions', stdout=io.StringIO())
+    call_command('import_fragrance_categories', stdout=io.StringIO())
+
+
+def create_user(username, **extra):
+    """创建测试用户，密码为 BENCHMARK_PASSWORD"""
+    from apps.users.models import USER
+
+    return USER.objects.create_user(
+        username=username,
+        password=BENCHMARK_PASSWORD,
+        email=f'{username}@example.com',
+        full_name=username,
+        **extra
+    )
+
+
+def encrypt_credentials(username, password=BENCHMARK_PASSWORD, public_key_pem=None):
+    """与前端相同的方式整体加密登录凭据，未提供公钥时读取服务端当前的公钥"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import padding
+    from apps.account.utils import get_public_key_pem
+
+    if public_key_pem is None:
+        public_key_pem = get_public_key_pem()[0]
+    public_key = serialization.load_pem_public_key(public_key_pem.encode('utf-8'))
+    payload = json.dumps({'username': username, 'password': password}).encode('utf-8')
+    return base64.b64encode(public_key.encrypt(payload, padding.PKCS1v15())).decode('ascii')
+
+
+def build_part_answers(part, fragrance='花香调'):
+    """按题型为指定部分的每道题构造一个答案，格式与 submit-part 接口一致"""
+    from .models import QuizQuestion
+
+    answers = {}
+    questions = QuizQuestion.objects.filter(group_id=f'part{part}').prefetch_related('options')
+    for question in questions:
+        values = [option.value for option in question.options.all()]
+        if question.type == 'single':
+            answers[question.id] = values[0] if values else 'A'
+        elif question.type == 'single-with-text':
+            answers[question.id] = {'value': values[0] if values else 'A', 'text': '性能测试'}
+        elif question.type == 'image-multiple':
+            # Part4图片题的选项由香调分析结果动态生成
+            answers[question.id] = [fragrance]
+        elif question.type == 'multiple':
+            answers[question.id] = values[:2]
+        else:
+            answers[question.id] = '清晨的森林里有一点薄雾，空气里是湿润的泥土和青草的味道。'
+    return answers
+
+
+def percentile(values, fraction):
+    """已排序列表的分位数（最近秩）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(len(values) * fraction)) - 1))
+    return values[index]
@@ -0,0 +1,145 @@
+# quiz/catalog.py
+"""
+题目目录缓存
+
+题目组、题目和选项属于静态内容，几乎每个请求拿到的都是同一份数据。
+这里按“内容版本”缓存序列化后的 JSON 字节（backend.caching 的 quiz:catalog 命名空间）：
+- 版本号保存在共享缓存中，所有进程共享；
+- 渲染后的字节保存在进程内，版本号变化后自动失效重建；
+- 题目组、题目、选项的保存/删除信号以及 import_questions 命令会刷新版本号。
+命中缓存时请求不会访问数据库。版本号同时用于生成 ETag，支持条件请求。
+"""
+
+import hashlib
+
+from rest_framework.renderers import JSONRenderer
+
+from backend.caching import Namespace
+
+_namespace = Namespace('quiz:catalog')
+
+
+def get_version():
+    """获取当前题目目录版本号，不存在时初始化"""
+    return _namespace.get_version()
+
+
+def get_etag(name):
+    """根据目录版本号生成指定资源的强 ETag"""
+    digest = hashlib.sha1(f'{get_version()}:{name}'.encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+async def aget_etag(name):
+    """get_etag 的异步版本，版本号使用异步缓存接口读取"""
+    digest = hashlib.sha1(f'{await _namespace.aget_version()}:{name}'.encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def invalidate():
+    """题目数据变更后刷新版本号，使所有进程的缓存失效"""
+    _namespace.bump()
+
+
+def _render(data):
+    return JSONRenderer().render(data)
+
+
+def _build_groups():
+    from .models import QuizQuestionGroup
+    from .serializers import QuizQuestionGroupSerializer
+
+    groups = QuizQuestionGroup.objects.prefetch_related(
+        'questions__group', 'questions__options'
+    ).order_by('id')
+    return _render(QuizQuestionGroupSerializer(groups, many=True).data)
+
+
+def _build_questions():
+    from .models import QuizQuestion
+    from .serializers import QuizQuestionSerializer
+
+    questions = QuizQuestion.objects.select_related('group').prefetch_related(
+        'options'
+    ).order_by('id')
+    return _render(QuizQuestionSerializer(questions, many=True).data)
+
+
+def _build_part(part):
+    from .models import QuizQuestionGroup
+    from .serializers import QuizQuestionGroupSerializer
+
+    group = QuizQuestionGroup.objects.prefetch_related(
+        'questions__group', 'questions__options'
+    ).filter(id=f'part{part}').first()
+    if group is None:
+        return None
+    return _render(QuizQuestionGroupSerializer(group).data)
+
+
+def _build_question_index():
+    from .models import QuizQuestion
+
+    return {
+        question_id: {'group_id': group_id, 'type': question_type}
+        for question_id, group_id, question_type in QuizQuestion.objects.values_list(
+            'id', 'group_id', 'type'
+        )
+    }
+
+
+def get_question_index():
+    """题目ID → {'group_id', 'type'} 映射，用于校验题目ID"""
+    return _namespace.memoize('question_index', _build_question_index)
+
+
+def _build_option_labels():
+    from .models import QuizQuestionOption
+
+    labels = {}
+    options = QuizQuestionOption.objects.order_by('sort_order', 'id').values_list(
+        'question_id', 'value', 'label'
+    )
+    for question_id, value, label in options:
+        # 同一题目下选项值重复时取排序靠前的选项
+        labels.setdefault((question_id, value), label)
+    return labels
+
+
+def get_option_labels():
+    """全部选项的 (题目ID, 选项值) → 选项文本 映射"""
+    return _namespace.memoize('option_labels', _build_option_labels)
+
+
+def get_option_label(labels, question_id, value):
+    """
+    在 get_option_labels() 返回的映射中查找选项文本，找不到时返回 None
+    每次获取映射都要读取一次共享缓存中的版本号，逐题查找前先获取一次映射
+    """
+    return labels.get((question_id, str(value)))
+
+
+def get_groups_bytes():
+    """全部题目组（含题目与选项）的 JSON 字节"""
+    return _namespace.memoize('groups', _build_groups)
+
+
+def get_questions_bytes():
+    """全部题目（不分组）的 JSON 字节"""
+    return _namespace.memoize('questions', _build_questions)
+
+
+def get_part_bytes(part):
+    """指定部分题目组的 JSON 字节，题目组不存在时返回 None"""
+    return _namespace.memoize(f'part{part}', lambda: _build_part(part))
+
+
+async def aget_part_bytes(part):
+    """get_part_bytes 的异步版本"""
+    return await _namespace.amemoize(f'part{part}', lambda: _build_part(part))
+
+
+def render_envelope(msg, data_bytes, code=200):
+    """将已渲染的数据嵌入 {"code", "msg", "data"} 响应结构"""
+    head = _render({'code': code, 'msg': msg})
+    return head[:-1] + b',"data":' + data_bytes + b'}'
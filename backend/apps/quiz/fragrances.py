@@ -0,0 +1,71 @@
+# quiz/fragrances.py
+"""
+香调图片索引
+
+FragranceCategory 为静态数据（约330条，来自 fragrance_category.csv），
+这里在进程内维护 category_type → [{label, value, image}, ...] 的索引，只在首次使用时构建一次。
+索引保存在进程内，版本号保存在共享缓存中（backend.caching 的 quiz:fragrance 命名空间），香调类别保存/删除信号和 import_fragrance_categories 命令会刷新版本号，
+各进程在下一次查询时重建索引。
+"""
+
+from backend.caching import Namespace
+
+_namespace = Namespace('quiz:fragrance')
+
+
+def get_version():
+    """获取当前香调索引版本号，不存在时初始化"""
+    return _namespace.get_version()
+
+
+def invalidate():
+    """香调数据变更后刷新版本号，使所有进程的索引失效"""
+    _namespace.bump()
+
+
+def _index_rows(rows):
+    index = {}
+    for category_type, image_path in rows:
+        if not image_path:
+            continue
+        # 获取图片文件名作为标签（去掉扩展名）
+        image_name = image_path.split('/')[-1].split('.')[0]
+        index.setdefault(category_type, []).append({
+            'label': image_name,
+            'value': image_path,
+            'image': image_path
+        })
+    return index
+
+
+def _queryset():
+    from .models import FragranceCategory
+    return FragranceCategory.objects.order_by('id').values_list('category_type', 'image_url')
+
+
+def _build_index():
+    return _index_rows(_queryset())
+
+
+async def _abuild_index():
+    return _index_rows([row async for row in _queryset()])
+
+
+def get_index():
+    """获取 category_type → 图片列表 的索引"""
+    return _namespace.memoize('index', _build_index)
+
+
+async def aget_index():
+    """get_index 的异步版本，重建索引时使用异步 ORM 查询"""
+    return await _namespace.amemoize('index', _abuild_index)
+
+
+def get_images(category_type):
+    """根据香调类别获取图片列表，类别不存在时返回空列表"""
+    return list(get_index().get(category_type, []))
+
+
+async def aget_images(category_type):
+    """get_images 的异步版本"""
+    return list((await aget_index()).get(category_type, []))
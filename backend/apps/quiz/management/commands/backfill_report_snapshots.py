@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from apps.quiz.models import UserQuizSession
+from apps.quiz import reports
+
+
+class Command(BaseCommand):
+    help = '为已完成的测验会话生成报告快照'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='每批处理的会话数')
+        parser.add_argument('--force', action='store_true', help='重新生成已有的快照（如报告格式变更后）')
+
+    def handle(self, *args, **options):
+        """按主键分批处理，避免一次加载所有会话"""
+        sessions = UserQuizSession.objects.filter(status='completed').order_by('pk')
+        if not options['force']:
+            sessions = sessions.filter(report_snapshot__isnull=True)
+
+        batch_size = max(1, options['batch_size'])
+        created_count = 0
+        failed_count = 0
+        last_pk = 0
+        while True:
+            batch = list(sessions.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for session in batch:
+                try:
+                    reports.save_snapshot(session)
+                    created_count += 1
+                except Exception as e:
+                    failed_count += 1
+                    self.stdout.write(self.style.ERROR(f"会话 {session.session_id} 生成报告快照失败: {e}"))
+            last_pk = batch[-1].pk
+            self.stdout.write(f"已处理 {created_count + failed_count} 个会话")
+
+        self.stdout.write(self.style.SUCCESS(f"报告快照生成完成！成功: {created_count}，失败: {failed_count}"))
@@ -0,0 +1,429 @@
+import itertools
+import json
+import logging
+import os
+import platform
+import time
+import tracemalloc
+import warnings
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, resolve
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.quiz import benchmarking
+
+BASELINE_DIR = os.path.dirname(__file__)
+
+# 需要覆盖的接口（backend/urls.py 中的前缀）
+URL_PREFIXES = ('v1/quiz/', 'v1/account/', 'v1/users/')
+
+
+def _default_baseline():
+    """基线按数据库分别保存：不同数据库的查询次数和耗时不能互相比较"""
+    return os.path.join(BASELINE_DIR, f'endpoint_baseline.{connection.vendor}.json')
+
+
+class Scenario:
+    """
+    一个被测接口：build(fixtures) 返回 (路径, 请求体)，在计时之外执行，
+    需要新会话、新用户等一次性数据的接口在这里准备
+    """
+
+    def __init__(self, name, method, path=None, data=None, build=None, auth='user', expect=(200,)):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self._build = build
+        self.auth = auth
+        self.expect = expect
+
+    def build(self, fixtures):
+        if self._build is not None:
+            return self._build(fixtures)
+        return self.path, self.data
+
+
+class Fixtures:
+    """测试数据：题目目录、香调类别、普通用户、管理员和各阶段的会话"""
+
+    def __init__(self):
+        from apps.quiz.models import FragranceCategory
+
+        benchmarking.seed_catalog()
+        self._counter = itertools.count(1)
+        self.user = benchmarking.create_user('bench_user')
+        self.admin = benchmarking.create_user('bench_admin', is_staff=True, is_superuser=True)
+        self.tokens = {
+            'user': str(RefreshToken.for_user(self.user).access_token),
+            'admin': str(RefreshToken.for_user(self.admin).access_token),
+        }
+        self.category = FragranceCategory.objects.values_list('category_type', flat=True).first()
+        self.answers = {
+            part: benchmarking.build_part_answers(part, self.category) for part in range(1, 5)
+        }
+        self.ready_session = self.new_session(part=4, ready=True)
+        self.completed_session = self.new_session(part=4, ready=True, completed=True)
+
+    def unique(self, prefix):
+        return f'{prefix}_{next(self._counter)}'
+
+    def new_user(self):
+        return benchmarking.create_user(self.unique('bench'))
+
+    def new_session(self, part=1, ready=False, completed=False):
+        """创建停留在第 part 部分的会话，之前各部分的答案已保存"""
+        from apps.quiz.models import UserAnswer, UserQuizSession
+
+        session = UserQuizSession.objects.create(
+            user=self.user,
+            session_id=self.unique('BENCH'),
+            current_part=part,
+        )
+        answers = []
+        for previous in range(1, part + (1 if completed else 0)):
+            for question_id, value in self.answers[previous].items():
+                answers.append(UserAnswer(
+                    session=session,
+                    question_id=question_id,
+                    value=json.dumps(value) if isinstance(value, (list, dict)) else value
+                ))
+        UserAnswer.objects.bulk_create(answers)
+        if ready:
+            session.main_fragrance = self.category
+            session.secondary_fragrance = self.category
+            session.analysis_status = 'done'
+        if completed:
+            session.status = 'completed'
+            session.end_time = timezone.now()
+            session.duration_ms = 60000
+        session.save()
+        return session
+
+    def submit_part(self, part):
+        session = self.new_session(part=part, ready=part == 4)
+        return (
+            f'/v1/quiz/sessions/{session.session_id}/submit-part/',
+            {'session_id': session.session_id, 'current_part': part, 'answers': self.answers[part]}
+        )
+
+    def reset_token(self, user=None):
+        from django.contrib.auth.tokens import default_token_generator
+
+        user = user or self.user
+        user.refresh_from_db()
+        return urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user)
+
+
+def _scenarios():
+    q = '/v1/quiz'
+    a = '/v1/account'
+    u = '/v1/users'
+    return [
+        # ---- quiz ----
+        Scenario('quiz.api_root', 'GET', f'{q}/'),
+        Scenario('quiz.question_groups.list', 'GET', f'{q}/question-groups/'),
+        Scenario('quiz.question_groups.detail', 'GET', f'{q}/question-groups/part1/'),
+        Scenario('quiz.question_groups.all_questions', 'GET', f'{q}/question-groups/all-questions/'),
+        Scenario('quiz.question_groups.part1', 'GET', f'{q}/question-groups/part/1/'),
+        Scenario('quiz.question_groups.part4', 'GET', build=lambda fx: (
+            f'{q}/question-groups/part/4/?session_id={fx.ready_session.session_id}', None)),
+        Scenario('quiz.sessions.list', 'GET', f'{q}/sessions/'),
+        Scenario('quiz.sessions.list_summary', 'GET', f'{q}/sessions/?summary=1'),
+        Scenario('quiz.sessions.create', 'POST', f'{q}/sessions/', {}, expect=(201,)),
+        Scenario('quiz.sessions.detail', 'GET', build=lambda fx: (
+            f'{q}/sessions/{fx.completed_session.session_id}/', None)),
+        Scenario('quiz.sessions.update', 'PATCH', build=lambda fx: (
+            f'{q}/sessions/{fx.ready_session.session_id}/', {})),
+        Scenario('quiz.sessions.delete', 'DELETE', build=lambda fx: (
+            f'{q}/sessions/{fx.new_session().session_id}/', None), expect=(204,)),
+        Scenario('quiz.sessions.complete', 'POST', build=lambda fx: (
+            f'{q}/sessions/{fx.new_session(part=4, ready=True).session_id}/complete/', {})),
+        Scenario('quiz.sessions.check_incomplete', 'GET', f'{q}/sessions/check-incomplete/'),
+        Scenario('quiz.sessions.history', 'GET', f'{q}/sessions/history/'),
+        Scenario('quiz.sessions.report', 'GET', build=lambda fx: (
+            f'{q}/sessions/{fx.completed_session.session_id}/report/', None)),
+        Scenario('quiz.sessions.analysis', 'GET', build=lambda fx: (
+            f'{q}/sessions/{fx.ready_session.session_id}/analysis/', None)),
+        Scenario('quiz.sessions.analysis_stream', 'GET', build=lambda fx: (
+            f'{q}/sessions/{fx.ready_session.session_id}/analysis/stream/', None)),
+        Scenario('quiz.submit_part.part1', 'POST', build=lambda fx: fx.submit_part(1)),
+        Scenario('quiz.submit_part.part3', 'POST', build=lambda fx: fx.submit_part(3), expect=(202,)),
+        Scenario('quiz.submit_part.part4', 'POST', build=lambda fx: fx.submit_part(4)),
+        Scenario('quiz.answers.single', 'POST', build=lambda fx: (
+            f'{q}/sessions/{fx.ready_session.session_id}/answers/',
+            {'question_id': 'q1-1', 'value': fx.answers[1]['q1-1']}), expect=(201,)),
+        Scenario('quiz.answers.batch', 'POST', build=lambda fx: (
+            f'{q}/sessions/{fx.ready_session.session_id}/answers/',
+            [{'question_id': key, 'value': value} for key, value in fx.answers[1].items()]), expect=(201,)),
+        Scenario('quiz.all_questions', 'GET', f'{q}/all-questions/'),
+        Scenario('quiz.phased_questions.part1', 'GET', f'{q}/phased-questions/?part=1'),
+        Scenario('quiz.phased_questions.part4', 'GET', build=lambda fx: (
+            f'{q}/phased-questions/?part=4&session_id={fx.ready_session.session_id}', None)),
+        # 每次使用不同的文本，测量未命中缓存时的开销
+        Scenario('quiz.extend_text', 'POST', build=lambda fx: (
+            f'{q}/extend-text/', {'text': fx.unique('清晨的森林')})),
+        Scenario('quiz.extend_text_stream', 'POST', build=lambda fx: (
+            f'{q}/extend-text/stream/', {'text': fx.unique('海边的傍晚')})),
+        Scenario('quiz.fragrance_images', 'GET', build=lambda fx: (
+            f'{q}/fragrance-images/?category_type={fx.category}', None)),
+        Scenario('quiz.ai_cache_stats', 'GET', f'{q}/ai-cache/stats/', auth='admin'),
+        # ---- account ----
+        Scenario('account.public_key', 'GET', f'{a}/public-key/', auth=None),
+        Scenario('account.login', 'POST', build=lambda fx: (
+            f'{a}/login/', {'credentials': benchmarking.encrypt_credentials(fx.user.username)}), auth=None),
+        Scenario('account.token', 'POST', build=lambda fx: (
+            f'{a}/token/', {'username': fx.user.username, 'password': benchmarking.BENCHMARK_PASSWORD}),
+            auth=None),
+        Scenario('account.token_refresh', 'POST', build=lambda fx: (
+            f'{a}/token/refresh/', {'refresh': str(RefreshToken.for_user(fx.user))}), auth=None),
+        # 未安装 token_blacklist 时注销接口返回400
+        Scenario('account.logout', 'POST', build=lambda fx: (
+            f'{a}/logout/', {'refresh': str(RefreshToken.for_user(fx.user))}), expect=(204, 400)),
+        Scenario('account.password_reset.check_username', 'POST', build=lambda fx: (
+            f'{a}/password/reset/check-username/', {'username': fx.user.username}), auth=None),
+        Scenario('account.password_reset.check_email', 'POST', build=lambda fx: (
+            f'{a}/password/reset/check-email/', {'username': fx.user.username, 'email': fx.user.email}),
+            auth=None),
+        Scenario('account.password_reset.request', 'POST', build=lambda fx: (
+            f'{a}/password/reset/', {'email': fx.user.email}), auth=None),
+        Scenario('account.password_reset.validate', 'POST', build=lambda fx: (
+            f'{a}/password/reset/validate/', dict(zip(('uid', 'token'), fx.reset_token()))), auth=None),
+        Scenario('account.password_reset.confirm', 'POST', build=lambda fx: (
+            f'{a}/password/reset/confirm/',
+            dict(zip(('uid', 'token'), fx.reset_token(fx.new_user())), new_password=fx.unique('new-password'))),
+            auth=None),
+        Scenario('account.password_hash_stats', 'GET', f'{a}/password-hash/stats/', auth='admin'),
+        # ---- users ----
+        Scenario('users.profile', 'GET', f'{u}/profile/'),
+        Scenario('users.profile_update', 'PATCH', f'{u}/profile/', {'full_name': 'bench_user'}),
+        Scenario('users.list', 'GET', f'{u}/', auth='admin'),
+        Scenario('users.create', 'POST', build=lambda fx: (
+            f'{u}/', {'username': fx.unique('bench_created'), 'password': benchmarking.BENCHMARK_PASSWORD,
+                      'full_name': 'bench'}), auth='admin', expect=(201,)),
+        Scenario('users.detail', 'GET', build=lambda fx: (f'{u}/{fx.user.pk}/', None), auth='admin'),
+        Scenario('users.update', 'PATCH', build=lambda fx: (
+            f'{u}/{fx.user.pk}/', {'full_name': 'bench_user'}), auth='admin'),
+        Scenario('users.delete', 'DELETE', build=lambda fx: (
+            f'{u}/{fx.new_user().pk}/', None), auth='admin', expect=(204,)),
+        Scenario('users.check_username', 'GET', build=lambda fx: (
+            f'{u}/check-username/?username={fx.user.username}', None)),
+        Scenario('users.check_email', 'GET', build=lambda fx: (
+            f'{u}/check-email/?email={fx.user.email}', None)),
+    ]
+
+
+async def _aconsume(iterator):
+    async for _ in iterator:
+        pass
+
+
+def _route_names(patterns, namespace='', prefix=''):
+    """递归列出 URL 配置中的路由名称"""
+    names = set()
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            child_namespace = ':'.join(filter(None, [namespace, pattern.namespace]))
+            names |= _route_names(pattern.url_patterns, child_namespace, route)
+        elif isinstance(pattern, URLPattern) and pattern.name and route.startswith(URL_PREFIXES):
+            names.add(':'.join(filter(None, [namespace, pattern.name])))
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Benchmark query counts, latency and allocations of every quiz/account/users endpoint against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20, help='每个接口计时的请求次数')
+        parser.add_argument('--warmup', type=int, default=2, help='计时前的预热请求次数')
+        parser.add_argument('--only', action='append', help='只测试名称包含该字符串的接口，可重复使用')
+        parser.add_argument('--baseline', help='基线文件路径，默认为当前数据库的 endpoint_baseline.<数据库>.json')
+        parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线文件')
+        parser.add_argument('--query-tolerance', type=int, default=0, help='允许比基线多出的查询次数')
+        parser.add_argument('--latency-threshold', type=float, default=0.5,
+                            help='p50 耗时超过基线的比例（0.5 即 50%%）视为退化')
+        parser.add_argument('--latency-floor-ms', type=float, default=5.0,
+                            help='p50 耗时比基线多出不足该毫秒数时不视为退化（排除计时噪声）')
+        parser.add_argument('--alloc-threshold', type=float, default=0.25,
+                            help='内存分配峰值超过基线的比例视为退化')
+
+    def handle(self, *args, **options):
+        options['baseline'] = options['baseline'] or _default_baseline()
+        scenarios = _scenarios()
+        if options['only']:
+            scenarios = [s for s in scenarios if any(key in s.name for key in options['only'])]
+            if not scenarios:
+                raise CommandError('没有匹配的接口')
+
+        # 在独立的测试库中执行（SQLite 或本地 MySQL，取决于 DATABASES 配置），不影响现有数据
+        setup_test_environment()
+        # 注销等接口按预期返回4xx，不输出 django.request 的警告日志
+        logging.disable(logging.WARNING)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with benchmarking.fake_environment(), warnings.catch_warnings():
+                # 同步客户端读取异步流式响应时会给出警告，这里只关心耗时
+                warnings.simplefilter('ignore')
+                fixtures = Fixtures()
+                results, errors, visited = self._run(scenarios, fixtures, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            logging.disable(logging.NOTSET)
+            teardown_test_environment()
+
+        self._report(results, options)
+        if not options['only']:
+            self._check_coverage(visited)
+        if errors:
+            raise CommandError('以下接口返回了非预期的状态码:\n' + '\n'.join(errors))
+
+        if options['update_baseline']:
+            self._write_baseline(results, options)
+            return
+
+        regressions = self._compare(results, options)
+        if regressions:
+            raise CommandError('性能退化:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('未发现性能退化'))
+
+    def _request(self, client, scenario, fixtures):
+        path, data = scenario.build(fixtures)
+        headers = {}
+        if scenario.auth:
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {fixtures.tokens[scenario.auth]}'
+        body = json.dumps(data) if data is not None else ''
+        return path, lambda: self._send(client, scenario.method, path, body, headers)
+
+    @staticmethod
+    def _send(client, method, path, body, headers):
+        response = client.generic(method, path, body, content_type='application/json', **headers)
+        if response.streaming:
+            # 流式响应计时到最后一个事件
+            if response.is_async:
+                async_to_sync(_aconsume)(response.streaming_content)
+            else:
+                b''.join(response.streaming_content)
+        return response
+
+    def _run(self, scenarios, fixtures, options):
+        client = Client()
+        results = {}
+        errors = []
+        visited = set()
+        for scenario in scenarios:
+            for _ in range(max(0, options['warmup'])):
+                self._request(client, scenario, fixtures)[1]()
+
+            timings = []
+            queries = []
+            statuses = set()
+            for _ in range(max(1, options['rounds'])):
+                path, send = self._request(client, scenario, fixtures)
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = send()
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(context.captured_queries))
+                statuses.add(response.status_code)
+
+            # 内存分配单独测量，避免 tracemalloc 影响计时
+            path, send = self._request(client, scenario, fixtures)
+            tracemalloc.start()
+            try:
+                send()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            match = resolve(path.split('?')[0])
+            visited.add(':'.join(filter(None, [match.namespace, match.url_name])))
+            unexpected = statuses - set(scenario.expect)
+            if unexpected:
+                errors.append(f'  {scenario.name}: {sorted(statuses)}，预期 {list(scenario.expect)}')
+
+            timings.sort()
+            results[scenario.name] = {
+                'status': sorted(statuses),
+                'queries': max(queries),
+                'p50_ms': round(benchmarking.percentile(timings, 0.5), 2),
+                'p95_ms': round(benchmarking.percentile(timings, 0.95), 2),
+                'alloc_kb': round(peak / 1024, 1),
+            }
+        return results, errors, visited
+
+    def _report(self, results, options):
+        self.stdout.write(
+            f"数据库: {connection.vendor}，每个接口 {options['rounds']} 次（预热 {options['warmup']} 次）"
+        )
+        self.stdout.write(f"{'接口':<42}{'状态':>8}{'查询':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'分配(KB)':>10}")
+        for name, result in results.items():
+            status = '/'.join(str(code) for code in result['status'])
+            self.stdout.write(
+                f"{name:<42}{status:>8}{result['queries']:>6}{result['p50_ms']:>10.2f}"
+                f"{result['p95_ms']:>10.2f}{result['alloc_kb']:>10.1f}"
+            )
+
+    def _check_coverage(self, visited):
+        missing = sorted(_route_names(get_resolver().url_patterns) - visited)
+        if missing:
+            self.stdout.write(self.style.WARNING('以下路由没有对应的测试: ' + ', '.join(missing)))
+
+    def _compare(self, results, options):
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(self.style.WARNING(f"基线文件不存在: {options['baseline']}，使用 --update-baseline 生成"))
+            return []
+        with open(options['baseline'], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        vendor = data.get('meta', {}).get('database')
+        if vendor != connection.vendor:
+            raise CommandError(
+                f"基线在 {vendor} 上生成，当前数据库为 {connection.vendor}，不能比较；"
+                f"使用 --update-baseline 为当前数据库生成基线"
+            )
+        baseline = data['endpoints']
+
+        regressions = []
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                self.stdout.write(self.style.WARNING(f'{name}: 基线中没有该接口'))
+                continue
+            if result['queries'] > base['queries'] + options['query_tolerance']:
+                regressions.append(f"  {name}: 查询次数 {base['queries']} -> {result['queries']}")
+            # p95 受偶发停顿影响较大，用 p50 判断
+            latency_limit = max(
+                base['p50_ms'] * (1 + options['latency_threshold']),
+                base['p50_ms'] + options['latency_floor_ms']
+            )
+            if result['p50_ms'] > latency_limit:
+                regressions.append(f"  {name}: p50 {base['p50_ms']}ms -> {result['p50_ms']}ms")
+            if result['alloc_kb'] > base['alloc_kb'] * (1 + options['alloc_threshold']):
+                regressions.append(f"  {name}: 内存分配 {base['alloc_kb']}KB -> {result['alloc_kb']}KB")
+        return regressions
+
+    def _write_baseline(self, results, options):
+        data = {
+            'meta': {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'rounds': options['rounds'],
+                'created_at': timezone.now().isoformat(timespec='seconds'),
+            },
+            'endpoints': {
+                name: {key: value for key, value in result.items() if key != 'status'}
+                for name, result in results.items()
+            },
+        }
+        with open(options['baseline'], 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        self.stdout.write(self.style.SUCCESS(f"基线已写入: {options['baseline']}"))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from apps.quiz.models import FragranceCategory
+from apps.quiz import fragrances
 import csv
 import os
 from django.utils.dateparse import parse_datetime
@@ -66,6 +67,8 @@ class Command(BaseCommand):
                     FragranceCategory.objects.create(**data)
                     created_count += 1
         
+        # 刷新香调图片索引
+        fragrances.invalidate()
         self.stdout.write(self.style.SUCCESS(f"香调数据导入完成！"))
         self.stdout.write(self.style.SUCCESS(f"创建记录数: {created_count}"))
         self.stdout.write(self.style.SUCCESS(f"更新记录数: {updated_count}"))
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 from django.core.management.base import BaseCommand
 from apps.quiz.models import QuizQuestionGroup, QuizQuestion, QuizQuestionOption
+from apps.quiz import catalog
 
 class Command(BaseCommand):
     help = 'Import quiz questions from predefined data structure'
@@ -339,4 +340,6 @@ class Command(BaseCommand):
                         if created:
                             self.stdout.write(self.style.SUCCESS(f'    Created option: {option.value} - {option.label}'))
 
+        # 刷新题目目录缓存
+        catalog.invalidate()
         self.stdout.write(self.style.SUCCESS('All questions imported successfully!'))
\ No newline at end of file
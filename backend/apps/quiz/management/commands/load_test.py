@@ -0,0 +1,395 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from apps.quiz import benchmarking
+
+# 旅程中的步骤，按执行顺序
+STEPS = (
+    'public_key', 'login', 'create_session', 'part1_questions',
+    'submit_part1', 'submit_part2', 'submit_part3', 'part4_questions',
+    'submit_part4', 'report',
+)
+
+# 耗时直方图的分桶上限（毫秒），最后一个桶为 +Inf
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# 后台线程（香调分析等）中执行的查询不属于任何请求
+BACKGROUND = '(background)'
+
+_current_step = contextvars.ContextVar('load_test_step', default=None)
+
+
+class JourneyError(Exception):
+    """旅程中某一步返回了非预期的状态码"""
+
+
+class AsgiClient:
+    """直接调用 ASGI 应用（不经过网络），返回 (状态码, 响应体)"""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method, path, data=None, token=None):
+        path, _, query = path.partition('?')
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        headers = [
+            (b'host', b'testserver'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ]
+        if token:
+            headers.append((b'authorization', f'Bearer {token}'.encode('ascii')))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode('utf-8'),
+            'query_string': query.encode('utf-8'),
+            'root_path': '',
+            'headers': headers,
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        finished = asyncio.Event()
+        response = {'status': None, 'body': []}
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # 与真实客户端一样，响应结束前保持连接
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    finished.set()
+
+        await self.application(scope, receive, send)
+        finished.set()
+        return response['status'], b''.join(response['body'])
+
+
+class QueryCounter:
+    """
+    按旅程步骤统计数据库查询次数
+    请求在 sync_to_async 的线程中访问数据库，线程会复制调用方的 contextvars，
+    因此通过 _current_step 可以把查询归到发起请求的步骤
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.counts[_current_step.get() or BACKGROUND] += 1
+        return execute(sql, params, many, context)
+
+    def _install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        # 每个线程使用各自的数据库连接，在连接创建时挂上计数器
+        connection_created.connect(self._install, weak=False, dispatch_uid='load_test_query_counter')
+        for conn in connections.all():
+            self._install(None, conn)
+
+    def uninstall(self):
+        connection_created.disconnect(dispatch_uid='load_test_query_counter')
+        for conn in connections.all():
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+
+class Recorder:
+    """记录每个步骤的耗时、请求数和失败次数"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.error_samples = {}
+
+    def record(self, step, elapsed_ms, requests):
+        self.latencies[step].append(elapsed_ms)
+        self.requests[step] += requests
+
+    def fail(self, step, message):
+        self.errors[step] += 1
+        self.error_samples.setdefault(step, message)
+
+
+class Journey:
+    """一个用户完整答题的过程：登录、创建会话、提交 Part1-3、获取 Part4、提交并查看报告"""
+
+    def __init__(self, client, recorder, username, answers, index, options):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.answers = answers
+        self.index = index
+        self.poll_interval = options['poll_interval']
+        self.poll_timeout = options['poll_timeout']
+        self.token = None
+
+    async def call(self, step, method, path, data=None, expect=(200,)):
+        """执行一个步骤的一次请求，记录耗时"""
+        token = _current_step.set(step)
+        try:
+            started = time.perf_counter()
+            status, body = await self.client.request(method, path, data, self.token)
+            self.recorder.record(step, (time.perf_counter() - started) * 1000, 1)
+        finally:
+            _current_step.reset(token)
+        if status not in expect:
+            raise JourneyError(step, f'{method} {path} -> {status} {body[:200].decode("utf-8", "replace")}')
+        return json.loads(body) if body else None
+
+    async def run(self):
+        data = await self.call('public_key', 'GET', '/v1/account/public-key/')
+        # RSA 加密在客户端完成，不计入耗时
+        credentials = benchmarking.encrypt_credentials(self.username, public_key_pem=data['public_key'])
+        data = await self.call('login', 'POST', '/v1/account/login/', {'credentials': credentials})
+        self.token = data['access']
+
+        data = await self.call('create_session', 'POST', '/v1/quiz/sessions/', {}, expect=(201,))
+        session_id = data['session_id']
+        await self.call('part1_questions', 'GET', '/v1/quiz/phased-questions/?part=1')
+
+        submit_path = f'/v1/quiz/sessions/{session_id}/submit-part/'
+        for part in (1, 2, 3):
+            answers = dict(self.answers[part])
+            if part == 3:
+                # 每个旅程的文本不同，香调分析不会命中AI结果缓存
+                answers = {key: f'{value}（{self.index}）' for key, value in answers.items()}
+            await self.call(
+                f'submit_part{part}', 'POST', submit_path,
+                {'session_id': session_id, 'current_part': part, 'answers': answers},
+                expect=(202,) if part == 3 else (200,)
+            )
+
+        data = await self.poll_part4(session_id)
+        answers = dict(self.answers[4])
+        for key, value in answers.items():
+            if isinstance(value, list):
+                answers[key] = [data['data']['mainFragrance']]
+        await self.call(
+            'submit_part4', 'POST', submit_path,
+            {'session_id': session_id, 'current_part': 4, 'answers': answers}
+        )
+        await self.call('report', 'GET', f'/v1/quiz/sessions/{session_id}/report/')
+
+    async def poll_part4(self, session_id):
+        """
+        获取 Part4 题目，香调分析未完成时（202）按间隔轮询
+        步骤耗时为第一次请求到拿到题目的总时间，轮询的每次请求都计入请求数
+        """
+        step = 'part4_questions'
+        path = f'/v1/quiz/phased-questions/?part=4&session_id={session_id}'
+        token = _current_step.set(step)
+        started = time.perf_counter()
+        requests = 0
+        try:
+            while True:
+                status, body = await self.client.request('GET', path, token=self.token)
+                requests += 1
+                if status == 200:
+                    break
+                if status != 202:
+                    raise JourneyError(step, f'GET {path} -> {status} {body[:200].decode("utf-8", "replace")}')
+                if time.perf_counter() - started > self.poll_timeout:
+                    raise JourneyError(step, f'香调分析超过 {self.poll_timeout} 秒未完成')
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            _current_step.reset(token)
+        self.recorder.record(step, (time.perf_counter() - started) * 1000, requests)
+        return json.loads(body)
+
+
+def _histogram(values):
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for value in values:
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if value <= bound:
+                break
+        else:
+            index = len(HISTOGRAM_BUCKETS_MS)
+        counts[index] += 1
+    return counts
+
+
+class Command(BaseCommand):
+    help = 'Load test full quiz journeys against backend.asgi:application in-process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journeys', type=int, default=50, help='旅程总数')
+        parser.add_argument('--concurrency', type=int, default=10, help='同时进行的旅程数')
+        parser.add_argument('--users', type=int, default=None, help='测试用户数（默认与并发数相同）')
+        parser.add_argument('--ai-latency', type=float, default=0.5, help='AI 假实现的延迟（秒）')
+        parser.add_argument('--analysis-executor', choices=['thread', 'inline'], default='thread',
+                            help='香调分析的执行方式（压测中没有 Celery worker，默认用进程内线程池代替）')
+        parser.add_argument('--poll-interval', type=float, default=0.2, help='轮询 Part4 的间隔（秒）')
+        parser.add_argument('--poll-timeout', type=float, default=60, help='等待香调分析的最长时间（秒）')
+        parser.add_argument('--json', dest='json_path', help='将结果另外写入 JSON 文件')
+
+    def handle(self, *args, **options):
+        if options['journeys'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--journeys 和 --concurrency 必须大于0')
+        users = options['users'] or options['concurrency']
+
+        from backend.asgi import application
+
+        # 在独立的测试库中执行，不影响现有数据
+        setup_test_environment()
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            # SQLite 内存库在多个线程同时写入时会报 table is locked，改用临时文件
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'algoscent_load_test.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # 密码校验保留部署时的执行方式，与线上一致
+            with benchmarking.fake_environment(
+                ai_latency=options['ai_latency'],
+                analysis_executor=options['analysis_executor'],
+                hash_executor=None
+            ), warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                cache.clear()
+                benchmarking.seed_catalog()
+                usernames = [benchmarking.create_user(f'load_{i}').username for i in range(users)]
+                answers = {part: benchmarking.build_part_answers(part) for part in range(1, 5)}
+
+                counter = QueryCounter()
+                counter.install()
+                try:
+                    recorder, elapsed, completed = asyncio.run(
+                        self._run(AsgiClient(application), usernames, answers, options)
+                    )
+                finally:
+                    counter.uninstall()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self._report(recorder, counter.counts, elapsed, completed, options)
+
+    async def _run(self, client, usernames, answers, options):
+        recorder = Recorder()
+        indexes = itertools.count()
+        completed = 0
+
+        async def worker():
+            nonlocal completed
+            while True:
+                index = next(indexes)
+                if index >= options['journeys']:
+                    return
+                journey = Journey(client, recorder, usernames[index % len(usernames)], answers, index, options)
+                try:
+                    await journey.run()
+                    completed += 1
+                except JourneyError as e:
+                    recorder.fail(*e.args)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+        # 关闭请求线程中的数据库连接，之后才能删除测试库
+        await sync_to_async(connections.close_all)()
+        return recorder, elapsed, completed
+
+    def _report(self, recorder, queries, elapsed, completed, options):
+        total_requests = sum(recorder.requests.values())
+        self.stdout.write(
+            f"数据库: {connection.vendor}，旅程 {options['journeys']} 个，并发 {options['concurrency']}，"
+            f"AI 延迟 {options['ai_latency']}s，香调分析: {options['analysis_executor']}"
+        )
+        self.stdout.write(
+            f"耗时 {elapsed:.2f}s，完成 {completed}，失败 {options['journeys'] - completed}，"
+            f"吞吐 {completed / elapsed:.2f} 旅程/s，{total_requests / elapsed:.1f} 请求/s"
+        )
+
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'步骤':<18}{'次数':>6}{'请求':>7}{'失败':>6}{'p50(ms)':>10}{'p95(ms)':>10}"
+            f"{'p99(ms)':>10}{'max(ms)':>10}{'查询':>8}{'查询/次':>9}"
+        )
+        results = {}
+        for step in STEPS:
+            values = sorted(recorder.latencies.get(step, []))
+            result = {
+                'count': len(values),
+                'requests': recorder.requests[step],
+                'errors': recorder.errors[step],
+                'p50_ms': round(benchmarking.percentile(values, 0.5), 2),
+                'p95_ms': round(benchmarking.percentile(values, 0.95), 2),
+                'p99_ms': round(benchmarking.percentile(values, 0.99), 2),
+                'max_ms': round(values[-1], 2) if values else 0.0,
+                'queries': queries[step],
+                'histogram': _histogram(values),
+            }
+            results[step] = result
+            per_call = result['queries'] / result['count'] if result['count'] else 0
+            self.stdout.write(
+                f"{step:<18}{result['count']:>6}{result['requests']:>7}{result['errors']:>6}"
+                f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['max_ms']:>10.2f}{result['queries']:>8}{per_call:>9.1f}"
+            )
+        self.stdout.write(
+            f"数据库查询合计 {sum(queries.values())}（请求 {sum(queries[step] for step in STEPS)}，"
+            f"后台任务 {queries[BACKGROUND]}）"
+        )
+
+        self.stdout.write('')
+        self.stdout.write('耗时分布（毫秒）')
+        labels = [f'<={bound}' for bound in HISTOGRAM_BUCKETS_MS] + [f'>{HISTOGRAM_BUCKETS_MS[-1]}']
+        self.stdout.write(f"{'步骤':<18}" + ''.join(f'{label:>8}' for label in labels))
+        for step in STEPS:
+            self.stdout.write(f'{step:<18}' + ''.join(f'{count:>8}' for count in results[step]['histogram']))
+
+        for step, message in recorder.error_samples.items():
+            self.stdout.write(self.style.ERROR(f'{step} 失败示例: {message}'))
+
+        if options['json_path']:
+            data = {
+                'options': {key: options[key] for key in ('journeys', 'concurrency', 'ai_latency', 'analysis_executor')},
+                'database': connection.vendor,
+                'elapsed_s': round(elapsed, 3),
+                'completed': completed,
+                'journeys_per_s': round(completed / elapsed, 3),
+                'requests_per_s': round(total_requests / elapsed, 3),
+                'histogram_buckets_ms': list(HISTOGRAM_BUCKETS_MS),
+                'steps': results,
+                'queries': dict(queries),
+            }
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"结果已写入: {options['json_path']}"))
+
+        if completed < options['journeys']:
+            raise CommandError(f"{options['journeys'] - completed} 个旅程失败")
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def mark_analyzed_sessions(apps, schema_editor):
+    """已有香调结果的会话标记为分析完成"""
+    UserQuizSession = apps.get_model("quiz", "UserQuizSession")
+    UserQuizSession.objects.exclude(main_fragrance="").exclude(
+        secondary_fragrance=""
+    ).update(analysis_status="done")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0005_userquizsession_description"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userquizsession",
+            name="analysis_status",
+            field=models.CharField(
+                choices=[
+                    ("none", "未开始"),
+                    ("pending", "排队中"),
+                    ("running", "分析中"),
+                    ("done", "已完成"),
+                    ("failed", "失败"),
+                ],
+                default="none",
+                max_length=20,
+                verbose_name="香调分析状态",
+            ),
+        ),
+        migrations.RunPython(mark_analyzed_sessions, migrations.RunPython.noop),
+    ]
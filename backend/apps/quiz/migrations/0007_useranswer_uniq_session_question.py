@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    """同一会话同一题目存在多条答案时，只保留最近更新的一条"""
+    UserAnswer = apps.get_model("quiz", "UserAnswer")
+    seen = set()
+    duplicate_ids = []
+    answers = UserAnswer.objects.order_by("-updated_at", "-id").values_list(
+        "id", "session_id", "question_id"
+    )
+    for answer_id, session_id, question_id in answers.iterator():
+        key = (session_id, question_id)
+        if key in seen:
+            duplicate_ids.append(answer_id)
+        else:
+            seen.add(key)
+    UserAnswer.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0006_userquizsession_analysis_status"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="useranswer",
+            constraint=models.UniqueConstraint(
+                fields=("session", "question"), name="uniq_user_answer_session_question"
+            ),
+        ),
+    ]
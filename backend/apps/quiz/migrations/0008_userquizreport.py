@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_useranswer_uniq_session_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserQuizReport',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='report_snapshot', serialize=False, to='quiz.userquizsession', verbose_name='所属会话')),
+                ('data', models.BinaryField(verbose_name='报告数据（zlib 压缩的 JSON）')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='生成时间')),
+            ],
+            options={
+                'verbose_name': '测验报告快照',
+                'verbose_name_plural': '测验报告快照',
+                'db_table': 'user_quiz_report',
+            },
+        ),
+    ]
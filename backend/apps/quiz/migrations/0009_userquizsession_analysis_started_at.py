@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_userquizreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userquizsession',
+            name='analysis_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='香调分析开始时间'),
+        ),
+    ]
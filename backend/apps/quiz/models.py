@@ -89,6 +89,15 @@ class UserQuizSession(models.Model):
         ('completed', '已完成'),
         ('abandoned', '已放弃')
     ]
+    ANALYSIS_STATUS_CHOICES = [
+        ('none', '未开始'),
+        ('pending', '排队中'),
+        ('running', '分析中'),
+        ('done', '已完成'),
+        ('failed', '失败')
+    ]
+    # 后台香调分析写入的字段，其他地方保存会话时不应覆盖
+    ANALYSIS_RESULT_FIELDS = ['main_fragrance', 'secondary_fragrance', 'description', 'analysis_status']
     user = models.ForeignKey(
         USER,
         on_delete=models.CASCADE,
@@ -104,6 +113,8 @@ class UserQuizSession(models.Model):
     main_fragrance = models.CharField(max_length=50, default="", blank=True, verbose_name="主香调")
     secondary_fragrance = models.CharField(max_length=50, default="", blank=True, verbose_name="次香调")
     description = models.TextField(default="", blank=True, verbose_name="用户情况分析描述")
+    analysis_status = models.CharField(max_length=20, choices=ANALYSIS_STATUS_CHOICES, default='none', verbose_name="香调分析状态")
+    analysis_started_at = models.DateTimeField(null=True, blank=True, verbose_name="香调分析开始时间")
 
     class Meta:
         db_table = 'user_quiz_session'
@@ -137,11 +148,38 @@ class UserAnswer(models.Model):
         db_table = 'user_answer'
         verbose_name = '用户答题记录'
         verbose_name_plural = '用户答题记录'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'question'],
+                name='uniq_user_answer_session_question'
+            )
+        ]
 
     def __str__(self):
         return f"{self.session.session_id} - {self.question.id}"
 
 
+class UserQuizReport(models.Model):
+    """测验报告快照：会话完成时生成，报告接口直接返回，不再逐题重新计算"""
+    session = models.OneToOneField(
+        UserQuizSession,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='report_snapshot',
+        verbose_name="所属会话"
+    )
+    data = models.BinaryField(verbose_name="报告数据（zlib 压缩的 JSON）")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="生成时间")
+
+    class Meta:
+        db_table = 'user_quiz_report'
+        verbose_name = '测验报告快照'
+        verbose_name_plural = '测验报告快照'
+
+    def __str__(self):
+        return f"{self.session_id}"
+
+
 class FragranceCategory(models.Model):
     """香调类别模型"""
     name = models.CharField(max_length=100, verbose_name="中文名称")
@@ -0,0 +1,22 @@
+# quiz/renderers.py
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    server-sent events 渲染器
+    仅用于内容协商（EventSource 请求 Accept: text/event-stream），
+    实际内容由 StreamingHttpResponse 直接输出
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        payload = json.dumps(data, ensure_ascii=False)
+        return f"event: error\ndata: {payload}\n\n".encode(self.charset)
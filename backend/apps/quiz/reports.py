@@ -0,0 +1,132 @@
+# quiz/reports.py
+"""
+测验报告快照
+
+已完成的会话不能再修改答案，报告内容不会变化。会话完成时（submit-part 提交 Part4 或 complete 接口）
+生成一次完整的报告，渲染为 JSON 后用 zlib 压缩保存到 UserQuizReport，报告接口直接返回，
+不再查询答案、解析答案值和选项标签。
+- 完成后香调分析才结束（complete 接口不等待分析）时，分析结果保存后重新生成快照；
+- 没有快照的已完成会话（如历史数据）在第一次请求报告时生成，也可以用 backfill_report_snapshots 命令批量生成。
+"""
+
+import json
+import zlib
+
+from django.db import IntegrityError, transaction
+from rest_framework.renderers import JSONRenderer
+
+from . import catalog
+from .models import UserAnswer, UserQuizReport, UserQuizSession
+
+
+def build_report(session):
+    """根据答题记录计算报告数据"""
+    # 获取用户答案（一次查询），选项文本从题目目录缓存中解析
+    user_answers = list(
+        UserAnswer.objects.filter(session=session).select_related('question').order_by('question__sort_order')
+    )
+    # 选项文本映射只获取一次（每次获取都要读取共享缓存中的版本号）
+    label_map = catalog.get_option_labels()
+
+    # 构建答案数据
+    answers_data = {}
+    for answer in user_answers:
+        # 获取问题信息
+        question = answer.question
+        question_type = question.type
+
+        # 获取选项信息（如果是选择题）
+        option_labels = []
+        option_label = None
+
+        if question_type in ['single', 'multiple', 'single-with-text']:
+            try:
+                # 处理答案值
+                answer_value = answer.value
+                if isinstance(answer_value, str):
+                    try:
+                        # 尝试解析JSON字符串
+                        answer_value = json.loads(answer_value)
+                    except json.JSONDecodeError:
+                        # 如果不是JSON字符串，保持原值
+                        pass
+
+                # 根据问题类型处理答案
+                if question_type == 'multiple' and isinstance(answer_value, list):
+                    # 多选题
+                    for option_value in answer_value:
+                        # 根据选项值获取选项标签，找不到时使用选项值作为标签
+                        label = catalog.get_option_label(label_map, question.id, option_value)
+                        option_labels.append(label if label is not None else f"选项 {option_value}")
+                elif question_type in ['single', 'single-with-text'] and isinstance(answer_value, (str, int, dict)):
+                    # 单选题或单选填空题
+                    if isinstance(answer_value, dict):
+                        option_value = answer_value.get('value')
+                    else:
+                        option_value = answer_value
+
+                    if option_value:
+                        # 根据选项值获取选项标签，找不到时使用选项值作为标签
+                        label = catalog.get_option_label(label_map, question.id, option_value)
+                        option_label = label if label is not None else f"选项 {option_value}"
+            except Exception as e:
+                print(f"处理选项信息时出错: {str(e)}")
+
+        answers_data[question.id] = {
+            'question_id': question.id,
+            'question_text': question.text,
+            'question_type': question_type,
+            'value': answer.value,
+            'option_label': option_label,
+            'option_labels': option_labels if option_labels else None,
+            'text': answer.text
+        }
+
+    return {
+        'session_id': session.session_id,
+        'started_at': session.start_time.isoformat() if session.start_time else None,
+        'completed_at': session.end_time.isoformat() if session.end_time else None,
+        # 直接使用模型中存储的持续时间
+        'time_spent': session.duration_ms,
+        'total_questions': len(user_answers),
+        'main_fragrance': session.main_fragrance,
+        'secondary_fragrance': session.secondary_fragrance,
+        'description': session.description,
+        'answers': answers_data
+    }
+
+
+def save_snapshot(session):
+    """生成并保存会话的报告快照，返回报告的 JSON 字节"""
+    report_bytes = JSONRenderer().render(build_report(session))
+    # 快照通常在会话完成时第一次生成，先直接 INSERT；主键（会话）已存在时改为 UPDATE
+    snapshot = UserQuizReport(session=session, data=zlib.compress(report_bytes))
+    try:
+        with transaction.atomic():
+            snapshot.save(force_insert=True)
+    except IntegrityError:
+        # 完成后分析结果变化，或分析任务和完成请求同时生成快照
+        snapshot.save(force_update=True)
+    return report_bytes
+
+
+def get_report_bytes(session):
+    """
+    已完成会话的报告 JSON 字节，没有快照时生成
+    会话通过 select_related('report_snapshot') 查询时不需要额外查询
+    """
+    try:
+        snapshot = session.report_snapshot
+    except UserQuizReport.DoesNotExist:
+        return save_snapshot(session)
+    return zlib.decompress(bytes(snapshot.data))
+
+
+def refresh_snapshot(session):
+    """会话完成（或完成后分析结果变化）时生成快照；失败时只打印错误，请求报告时会重新生成"""
+    try:
+        # 后台香调分析可能在会话加载后才写入结果，先重新读取分析字段
+        session.refresh_from_db(fields=UserQuizSession.ANALYSIS_RESULT_FIELDS)
+        save_snapshot(session)
+    except Exception as e:
+        print(f"生成报告快照失败: {e}")
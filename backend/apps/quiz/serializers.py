@@ -9,8 +9,16 @@ from .models import (
     UserAnswer
 )
 from apps.users.models import USER
+from . import catalog
 import json
 
+def _get_answer_count(session):
+    """优先使用查询集中注解的答案数量，没有注解时再查询"""
+    answer_count = getattr(session, 'answer_count', None)
+    if answer_count is None:
+        answer_count = session.answers.count()
+    return answer_count
+
 class QuizQuestionOptionSerializer(serializers.ModelSerializer):
     """题目选项序列化器"""
     class Meta:
@@ -62,7 +70,8 @@ class QuizQuestionGroupSerializer(serializers.ModelSerializer):
 
 class UserAnswerSerializer(serializers.ModelSerializer):
     """用户答题记录序列化器"""
-    question_id = serializers.CharField(source='question.id', read_only=True)
+    # 直接使用外键值，避免逐条查询题目
+    question_id = serializers.CharField(read_only=True)
 
     class Meta:
         model = UserAnswer
@@ -77,7 +86,7 @@ class UserQuizSessionSerializer(serializers.ModelSerializer):
     total_questions = serializers.SerializerMethodField(read_only=True)
     
     def get_total_questions(self, obj):
-        return obj.answers.count()
+        return _get_answer_count(obj)
 
     class Meta:
         model = UserQuizSession
@@ -88,6 +97,25 @@ class UserQuizSessionSerializer(serializers.ModelSerializer):
             'secondary_fragrance', 'description'
         ]
 
+class UserQuizSessionSummarySerializer(serializers.ModelSerializer):
+    """用户测验会话摘要序列化器（不含答案明细，用于列表）"""
+    user = serializers.CharField(source='user.username', read_only=True)
+    completed_at = serializers.DateTimeField(source='end_time', read_only=True)
+    time_spent = serializers.IntegerField(source='duration_ms', read_only=True)
+    total_questions = serializers.SerializerMethodField(read_only=True)
+
+    def get_total_questions(self, obj):
+        return _get_answer_count(obj)
+
+    class Meta:
+        model = UserQuizSession
+        fields = [
+            'session_id', 'status', 'start_time', 'end_time',
+            'duration_ms', 'user', 'completed_at', 'time_spent',
+            'total_questions', 'current_part', 'main_fragrance',
+            'secondary_fragrance'
+        ]
+
 class UserQuizSessionCreateSerializer(serializers.Serializer):
     """创建用户测验会话序列化器"""
     def create(self, validated_data):
@@ -107,35 +135,21 @@ class UserAnswerCreateSerializer(serializers.Serializer):
     text = serializers.CharField(required=False, allow_null=True, allow_blank=True)
 
     def validate_question_id(self, value):
-        try:
-            QuizQuestion.objects.get(id=value)
-            return value
-        except QuizQuestion.DoesNotExist:
+        # 使用缓存的题目索引校验，不查询数据库
+        if value not in catalog.get_question_index():
             raise serializers.ValidationError("题目不存在")
+        return value
 
-    def create(self, validated_data):
-        session_id = self.context['session_id']
-        question_id = validated_data['question_id']
-        value = validated_data.get('value')
-        text = validated_data.get('text')
-        
-        try:
-            session = UserQuizSession.objects.get(session_id=session_id)
-            question = QuizQuestion.objects.get(id=question_id)
-            
+    def build_answer(self, session):
+        """根据校验后的数据构建（未保存的）答案对象"""
+        value = self.validated_data.get('value')
+        return UserAnswer(
+            session=session,
+            question_id=self.validated_data['question_id'],
             # 将value转为JSON字符串存储
-            value_str = json.dumps(value) if value is not None else None
-            
-            # 检查是否已有该题的答案，如果有则更新
-            user_answer, created = UserAnswer.objects.update_or_create(
-                session=session,
-                question=question,
-                defaults={'value': value_str, 'text': text}
-            )
-            
-            return user_answer
-        except UserQuizSession.DoesNotExist:
-            raise serializers.ValidationError("会话不存在")
+            value=json.dumps(value) if value is not None else None,
+            text=self.validated_data.get('text')
+        )
 
 
 class SubmitPartSerializer(serializers.Serializer):
@@ -145,11 +159,16 @@ class SubmitPartSerializer(serializers.Serializer):
     answers = serializers.DictField()  # 格式：{questionId: answer, ...}
 
     def validate_answers(self, value):
-        """校验answers中的题目ID是否存在"""
-        question_ids = value.keys()
-        if not QuizQuestion.objects.filter(id__in=question_ids).exists():
+        """校验answers中的题目ID是否存在（使用缓存的题目索引），并跳过不存在的题目"""
+        question_index = catalog.get_question_index()
+        valid_answers = {
+            question_id: answer
+            for question_id, answer in value.items()
+            if question_id in question_index
+        }
+        if not valid_answers:
             raise serializers.ValidationError("存在无效的题目ID")
-        return value
+        return valid_answers
 
 class UserQuizSessionCompleteSerializer(serializers.Serializer):
     """完成用户测验会话序列化器"""
@@ -158,7 +177,8 @@ class UserQuizSessionCompleteSerializer(serializers.Serializer):
         instance.status = 'completed'
         instance.end_time = timezone.now()
         instance.duration_ms = int((instance.end_time - instance.start_time).total_seconds() * 1000)
-        instance.save()
+        # 只保存完成相关的字段，不覆盖后台香调分析在会话加载后写入的结果
+        instance.save(update_fields=['status', 'end_time', 'duration_ms'])
         return instance
 
 class UserQuizHistorySerializer(serializers.ModelSerializer):
@@ -174,4 +194,4 @@ class UserQuizHistorySerializer(serializers.ModelSerializer):
         read_only_fields = fields
     
     def get_answer_count(self, obj):
-        return obj.answers.count()
\ No newline at end of file
+        return _get_answer_count(obj)
\ No newline at end of file
@@ -0,0 +1,26 @@
+# quiz/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import catalog, fragrances
+from .models import QuizQuestionGroup, QuizQuestion, QuizQuestionOption, FragranceCategory
+
+
+@receiver([post_save, post_delete], sender=QuizQuestionGroup)
+@receiver([post_save, post_delete], sender=QuizQuestion)
+@receiver([post_save, post_delete], sender=QuizQuestionOption)
+def invalidate_question_catalog(sender, using=None, **kwargs):
+    """
+    题目数据变更时刷新题目目录缓存
+    事务提交后再刷新版本号：提交前刷新时，其他进程可能用未提交前的数据以新版本号重建缓存，
+    进程内缓存没有过期时间，会一直使用旧数据直到下一次修改
+    """
+    transaction.on_commit(catalog.invalidate, using=using)
+
+
+@receiver([post_save, post_delete], sender=FragranceCategory)
+def invalidate_fragrance_index(sender, using=None, **kwargs):
+    """香调类别变更时刷新香调图片索引（事务提交后刷新版本号，原因同上）"""
+    transaction.on_commit(fragrances.invalidate, using=using)
@@ -0,0 +1,11 @@
+# quiz/tasks.py
+
+from celery import shared_task
+
+from .analysis import run_fragrance_analysis
+
+
+@shared_task(ignore_result=True)
+def analyze_session_fragrance(session_id):
+    """后台执行Part4香调分析"""
+    run_fragrance_analysis(session_id)
@@ -0,0 +1,440 @@
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import analysis, benchmarking, catalog, fragrances, reports, throttling, views
+from .ai_cache import AIResultCache
+from .async_api import throttle_response
+from .models import FragranceCategory, QuizQuestion, UserAnswer, UserQuizSession
+
+
+class QuizTestCase(TestCase):
+    """题目目录、假AI和测试用户"""
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmarking.seed_catalog()
+        cls.user = benchmarking.create_user('quiz_user')
+        cls.other_user = benchmarking.create_user('quiz_other')
+
+    def setUp(self):
+        environment = benchmarking.fake_environment()
+        environment.__enter__()
+        self.addCleanup(environment.__exit__, None, None, None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_session(self, user=None, **fields):
+        user = user or self.user
+        return UserQuizSession.objects.create(
+            user=user, session_id=f'{user.username}-{UserQuizSession.objects.count()}', **fields
+        )
+
+
+class SubmitPartTests(QuizTestCase):
+    """提交阶段：答案批量写入，重复提交时更新已有答案"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.create_session()
+        self.url = f'/v1/quiz/sessions/{self.session.session_id}/submit-part/'
+
+    def submit(self, answers, current_part=1):
+        data = {'session_id': self.session.session_id, 'current_part': current_part, 'answers': answers}
+        return self.client.post(self.url, data, format='json')
+
+    def test_answers_saved(self):
+        answers = benchmarking.build_part_answers(1)
+
+        response = self.submit(answers)
+
+        self.assertEqual(response.status_code, 200)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.current_part, 2)
+        saved = set(UserAnswer.objects.filter(session=self.session).values_list('question_id', flat=True))
+        self.assertEqual(saved, set(answers))
+
+    def test_resubmit_updates_answers(self):
+        answers = benchmarking.build_part_answers(1)
+        self.submit(answers)
+        question_id = next(
+            question_id for question_id, answer in answers.items() if isinstance(answer, str)
+        )
+        answers[question_id] = 'changed'
+
+        response = self.submit(answers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserAnswer.objects.filter(session=self.session).count(), len(answers))
+        self.assertEqual(UserAnswer.objects.get(session=self.session, question_id=question_id).value, 'changed')
+
+    def test_unknown_questions_skipped(self):
+        question_id = next(iter(benchmarking.build_part_answers(1)))
+
+        response = self.submit({question_id: 'A', 'missing-question': 'A'})
+
+        self.assertEqual(response.status_code, 200)
+        saved = list(UserAnswer.objects.filter(session=self.session).values_list('question_id', flat=True))
+        self.assertEqual(saved, [question_id])
+
+    def test_invalid_answers_not_saved(self):
+        response = self.submit({'missing-question': 'A'})
+
+        self.assertEqual(response.status_code, 400)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.current_part, 1)
+        self.assertFalse(UserAnswer.objects.filter(session=self.session).exists())
+
+
+class UserAnswerCreateTests(QuizTestCase):
+    """保存答案：单个答案、批量保存和部分失败时的状态码"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.create_session()
+        self.url = f'/v1/quiz/sessions/{self.session.session_id}/answers/'
+        self.question_ids = list(benchmarking.build_part_answers(1))[:3]
+
+    def test_single_answer_is_upserted(self):
+        question_id = self.question_ids[0]
+        response = self.client.post(self.url, {'question_id': question_id, 'value': 'A'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(self.url, {'question_id': question_id, 'value': 'B'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        answer = UserAnswer.objects.get(session=self.session, question_id=question_id)
+        self.assertEqual(answer.value, '"B"')
+
+    def test_batch_saves_all_answers(self):
+        UserAnswer.objects.create(session=self.session, question_id=self.question_ids[0], value='"A"')
+        items = [{'question_id': question_id, 'value': 'B'} for question_id in self.question_ids]
+        # 同一批次内重复的题目以最后一次为准
+        items.append({'question_id': self.question_ids[1], 'value': 'C'})
+
+        response = self.client.post(self.url, {'answers': items}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['saved'], len(items))
+        values = dict(UserAnswer.objects.filter(session=self.session).values_list('question_id', 'value'))
+        self.assertEqual(values, {
+            self.question_ids[0]: '"B"',
+            self.question_ids[1]: '"C"',
+            self.question_ids[2]: '"B"',
+        })
+
+    def test_batch_partial_success(self):
+        items = [
+            {'question_id': self.question_ids[0], 'value': 'A'},
+            {'question_id': 'missing-question', 'value': 'A'},
+        ]
+
+        response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['saved'], 1)
+        self.assertEqual([result['saved'] for result in response.data['results']], [True, False])
+        self.assertIn('errors', response.data['results'][1])
+        self.assertEqual(UserAnswer.objects.filter(session=self.session).count(), 1)
+
+    def test_batch_all_invalid(self):
+        response = self.client.post(self.url, [{'question_id': 'missing-question'}], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['saved'], 0)
+        self.assertFalse(UserAnswer.objects.filter(session=self.session).exists())
+
+    def test_batch_size_limits(self):
+        self.assertEqual(self.client.post(self.url, [], format='json').status_code, 400)
+        items = [{'question_id': self.question_ids[0], 'value': 'A'}] * 101
+        self.assertEqual(self.client.post(self.url, items, format='json').status_code, 400)
+
+    def test_completed_session_rejected(self):
+        self.session.status = 'completed'
+        self.session.save(update_fields=['status'])
+
+        response = self.client.post(self.url, {'question_id': self.question_ids[0], 'value': 'A'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_users_session_not_found(self):
+        session = self.create_session(self.other_user)
+        url = f'/v1/quiz/sessions/{session.session_id}/answers/'
+
+        response = self.client.post(url, {'question_id': self.question_ids[0], 'value': 'A'}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class FragranceAnalysisTests(QuizTestCase):
+    """香调分析状态：inline 执行方式下 none -> pending -> running -> done/failed"""
+
+    def enqueue(self, session):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            status = analysis.enqueue_fragrance_analysis(session)
+        session.refresh_from_db()
+        return status, callbacks
+
+    def test_analysis_done(self):
+        session = self.create_session()
+
+        status, callbacks = self.enqueue(session)
+
+        self.assertEqual(status, 'pending')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(session.analysis_status, 'done')
+        self.assertEqual(session.main_fragrance, analysis.DEFAULT_FRAGRANCE_RESULT['主香调'])
+        self.assertEqual(session.secondary_fragrance, analysis.DEFAULT_FRAGRANCE_RESULT['次香调'])
+        self.assertIsNotNone(session.analysis_started_at)
+
+    def test_done_session_not_enqueued_again(self):
+        session = self.create_session(analysis_status='done')
+
+        status, callbacks = self.enqueue(session)
+
+        self.assertEqual(status, 'done')
+        self.assertEqual(callbacks, [])
+
+    def test_analysis_error_marks_failed(self):
+        session = self.create_session()
+
+        with mock.patch.object(analysis, '_generate_fragrance_combinations', side_effect=RuntimeError('boom')):
+            self.enqueue(session)
+
+        self.assertEqual(session.analysis_status, 'failed')
+        self.assertTrue(analysis.needs_analysis(session))
+
+    def test_empty_result_marks_failed(self):
+        session = self.create_session()
+        empty = {'main_fragrance': '', 'secondary_fragrance': '', 'description': ''}
+
+        with mock.patch.object(analysis, '_generate_fragrance_combinations', return_value=empty):
+            self.enqueue(session)
+
+        self.assertEqual(session.analysis_status, 'failed')
+
+    def test_failed_analysis_retried(self):
+        session = self.create_session(analysis_status='failed')
+
+        self.enqueue(session)
+
+        self.assertEqual(session.analysis_status, 'done')
+
+    def test_running_analysis_not_duplicated(self):
+        session = self.create_session(analysis_status='running', analysis_started_at=timezone.now())
+
+        status, callbacks = self.enqueue(session)
+
+        self.assertEqual(status, 'running')
+        self.assertEqual(callbacks, [])
+        self.assertFalse(analysis.needs_analysis(session))
+
+    def test_stale_analysis_requeued(self):
+        started_at = timezone.now() - timedelta(seconds=analysis.settings.QUIZ_ANALYSIS_STALE_AFTER + 1)
+        session = self.create_session(analysis_status='pending', analysis_started_at=started_at)
+        self.assertTrue(analysis.needs_analysis(session))
+
+        status, callbacks = self.enqueue(session)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(session.analysis_status, 'done')
+
+
+class OptionLabelTests(QuizTestCase):
+    """报告和分析提示词中的选项文本：每次只获取一次选项文本映射"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.create_session()
+        answers = benchmarking.build_part_answers(1)
+        self.client.post(
+            f'/v1/quiz/sessions/{self.session.session_id}/submit-part/',
+            {'session_id': self.session.session_id, 'current_part': 1, 'answers': answers},
+            format='json'
+        )
+
+    def test_report_labels(self):
+        with mock.patch.object(catalog, 'get_option_labels', wraps=catalog.get_option_labels) as get_labels:
+            report = reports.build_report(self.session)
+
+        self.assertEqual(get_labels.call_count, 1)
+        labels = [answer['option_label'] for answer in report['answers'].values() if answer['option_label']]
+        self.assertTrue(labels)
+        self.assertFalse([label for label in labels if label.startswith('选项 ')])
+
+    def test_analysis_prompt_labels(self):
+        with mock.patch.object(catalog, 'get_option_labels', wraps=catalog.get_option_labels) as get_labels:
+            analysis._call_fragrance_ai(self.session)
+
+        self.assertEqual(get_labels.call_count, 1)
+
+
+class CatalogInvalidationTests(QuizTestCase):
+    """题目和香调数据变更时，事务提交后才刷新版本号"""
+
+    def test_question_change_invalidates_on_commit(self):
+        version = catalog.get_version()
+        question = QuizQuestion.objects.first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            question.text = '修改后的题目'
+            question.save()
+            self.assertEqual(catalog.get_version(), version)
+
+        self.assertNotEqual(catalog.get_version(), version)
+        self.assertIn('修改后的题目', catalog.get_questions_bytes().decode())
+
+    def test_fragrance_change_invalidates_on_commit(self):
+        version = fragrances.get_version()
+        category = FragranceCategory.objects.first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+            self.assertEqual(fragrances.get_version(), version)
+
+        self.assertNotEqual(fragrances.get_version(), version)
+
+
+class AIResultCacheTests(TestCase):
+    """AI结果缓存：命中统计按进程记录，不写入结果缓存"""
+
+    def test_stats(self):
+        cache = AIResultCache('tests')
+        value = {'问题': ['B', 'A']}
+
+        self.assertIsNone(cache.get(value))
+        cache.set(value, {'主香调': '花香'})
+        # 多选答案与顺序无关
+        self.assertEqual(cache.get({'问题': ['A', 'B']}), {'主香调': '花香'})
+        async_to_sync(cache.acount_coalesced)()
+
+        self.assertEqual(cache.get_stats(), {'hits': 1, 'misses': 1, 'coalesced': 1, 'hit_ratio': 0.5})
+        self.assertIsNone(cache.cache.get('quiz:ai:tests:stats:hits'))
+        cache.reset_stats()
+        self.assertEqual(cache.get_stats()['hits'], 0)
+
+
+class StreamConnectionTests(QuizTestCase):
+    """流式响应返回前归还数据库连接，推送期间每次查询后也立即归还"""
+
+    def consume(self, response):
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+        return async_to_sync(read)()
+
+    def test_analysis_stream(self):
+        session = self.create_session(analysis_status='done', main_fragrance='花香', secondary_fragrance='果香')
+
+        with mock.patch.object(views, 'release_connections') as release:
+            response = self.client.get(f'/v1/quiz/sessions/{session.session_id}/analysis/stream/')
+            self.assertEqual(release.call_count, 1)
+            body = self.consume(response)
+
+        self.assertIn('event: status', body)
+        self.assertEqual(release.call_count, 2)
+
+    def test_extend_text_stream(self):
+        with mock.patch.object(views, 'release_connections') as release:
+            response = self.client.post('/v1/quiz/extend-text/stream/', {'text': '清晨'}, format='json')
+            self.assertEqual(release.call_count, 1)
+            body = self.consume(response)
+
+        self.assertIn('event: done', body)
+
+
+class LocalBucketStoreTests(TestCase):
+    """进程内令牌桶：扣减、拒绝时的等待时间和按时间补充"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(throttling.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = throttling.LocalBucketStore()
+
+    def test_denied_when_empty(self):
+        self.assertEqual(self.store.consume('key', 2, 1), (True, 0.0))
+        self.assertEqual(self.store.consume('key', 2, 1), (True, 0.0))
+        self.assertEqual(self.store.consume('key', 2, 1), (False, 1.0))
+
+    def test_refill(self):
+        self.store.consume('key', 2, 2)
+        self.store.consume('key', 2, 2)
+
+        self.now += 0.25
+        allowed, wait = self.store.consume('key', 2, 2)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 0.25)
+
+        self.now += 0.25
+        self.assertEqual(self.store.consume('key', 2, 2), (True, 0.0))
+
+    def test_refill_capped_at_capacity(self):
+        self.store.consume('key', 2, 1)
+        self.now += 100
+
+        self.assertTrue(self.store.consume('key', 2, 1)[0])
+        self.assertTrue(self.store.consume('key', 2, 1)[0])
+        self.assertFalse(self.store.consume('key', 2, 1)[0])
+
+    def test_cost_and_keys(self):
+        self.assertEqual(self.store.consume('key', 3, 1, cost=3), (True, 0.0))
+        self.assertEqual(self.store.consume('key', 3, 1, cost=2), (False, 2.0))
+        # 不同的键各自计数
+        self.assertEqual(self.store.consume('other', 3, 1, cost=3), (True, 0.0))
+
+    def test_refund(self):
+        self.store.consume('key', 2, 1)
+        self.store.consume('key', 2, 1)
+        self.store.refund('key', 2)
+
+        self.assertEqual(self.store.consume('key', 2, 1), (True, 0.0))
+        self.assertFalse(self.store.consume('key', 2, 1)[0])
+
+    def test_refund_capped_at_capacity(self):
+        self.store.consume('key', 2, 1)
+        self.store.refund('key', 2)
+        self.store.refund('key', 2)
+
+        self.assertTrue(self.store.consume('key', 2, 1)[0])
+        self.assertTrue(self.store.consume('key', 2, 1)[0])
+        self.assertFalse(self.store.consume('key', 2, 1)[0])
+
+
+@override_settings(QUIZ_THROTTLE_REDIS_URL='', QUIZ_AI_THROTTLE_BUCKETS={
+    'ai_user': {'capacity': 2, 'refill_rate': 0.001},
+    'ai_global': {'capacity': 1, 'refill_rate': 0.001},
+})
+class AIThrottleTests(TestCase):
+    """AI限流：用户额度先于全局额度检查，全局额度不足时退回用户令牌"""
+
+    def setUp(self):
+        throttling.reset()
+        self.addCleanup(throttling.reset)
+        self.request = mock.Mock(user=mock.Mock(pk=1, is_authenticated=True))
+
+    def user_tokens(self):
+        return throttling.get_store()._buckets[f'{throttling.KEY_PREFIX}ai_user:1'][0]
+
+    def test_global_denial_refunds_user_token(self):
+        self.assertIsNone(throttle_response(self.request, throttling.AI_THROTTLE_CLASSES))
+        self.assertAlmostEqual(self.user_tokens(), 1, places=2)
+
+        response = throttle_response(self.request, throttling.AI_THROTTLE_CLASSES)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertAlmostEqual(self.user_tokens(), 1, places=2)
+
+    def test_user_denial_keeps_global_tokens(self):
+        other = mock.Mock(user=mock.Mock(pk=2, is_authenticated=True))
+        store = throttling.get_store()
+        store.consume(f'{throttling.KEY_PREFIX}ai_user:1', 2, 0.001, cost=2)
+
+        self.assertEqual(throttle_response(self.request, throttling.AI_THROTTLE_CLASSES).status_code, 429)
+        # 全局额度未被扣减，其他用户仍可使用
+        self.assertIsNone(throttle_response(other, throttling.AI_THROTTLE_CLASSES))
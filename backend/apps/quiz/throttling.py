@@ -0,0 +1,202 @@
+# quiz/throttling.py
+"""
+AI接口的令牌桶限流
+
+DRF 默认的限流类把计数保存在本地内存缓存中，每个 daphne 进程各算各的，重启后清零。
+AI扩写和 Part4 香调分析会消耗上游的调用额度，这里用令牌桶单独限流，桶状态保存在共享存储中，
+所有进程和节点共用同一份额度：
+- ai_user：每个用户（未登录时按IP）一个桶，限制单个用户的突发和持续调用；
+- ai_global：全站共用一个桶，保护上游额度。
+每个桶的容量（允许的突发次数）和每秒补充的令牌数由 settings.QUIZ_AI_THROTTLE_BUCKETS 配置。
+
+存储由 settings.QUIZ_THROTTLE_REDIS_URL 决定：
+- redis 地址：扣减令牌由 Lua 脚本在 redis 中原子执行，时间取 redis 服务器时间，不受各节点时钟偏差影响；
+- 为空：使用进程内存储，只在当前进程内生效，供开发和测试使用。
+共享存储不可用时放行请求（打印错误），不因限流故障影响正常使用。
+后面的限流类拒绝请求时，前面已扣减的令牌桶退回令牌（见 async_api._check_throttles）。
+"""
+
+import math
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+KEY_PREFIX = 'quiz:throttle:'
+
+# KEYS[1]: 桶的键；ARGV: 容量、每秒补充令牌数、本次消耗的令牌数
+# 返回 {是否放行, 需要等待的秒数}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+# 退回令牌（不超过容量）；KEYS[1]: 桶的键；ARGV: 容量、退回的令牌数
+REFUND_SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+if tokens then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(math.min(tonumber(ARGV[1]), tokens + tonumber(ARGV[2]))))
+end
+return 1
+"""
+
+
+class LocalBucketStore:
+    """进程内令牌桶存储（开发和测试用）"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, cost=1):
+        """扣减令牌，返回 (是否放行, 需要等待的秒数)"""
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - ts) * rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0.0
+            self._buckets[key] = (tokens, now)
+            return False, (cost - tokens) / rate
+
+    def refund(self, key, capacity, cost=1):
+        """退回已扣减的令牌，不超过容量"""
+        with self._lock:
+            if key in self._buckets:
+                tokens, ts = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + cost), ts)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisBucketStore:
+    """redis 令牌桶存储，所有进程和节点共享"""
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        self._refund_script = self._client.register_script(REFUND_SCRIPT)
+
+    def consume(self, key, capacity, rate, cost=1):
+        allowed, wait = self._script(keys=[key], args=[capacity, rate, cost])
+        return bool(allowed), float(wait)
+
+    def refund(self, key, capacity, cost=1):
+        self._refund_script(keys=[key], args=[capacity, cost])
+
+    def clear(self):
+        for key in self._client.scan_iter(match=f'{KEY_PREFIX}*'):
+            self._client.delete(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """获取当前进程共享的令牌桶存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            url = getattr(settings, 'QUIZ_THROTTLE_REDIS_URL', '')
+            _store = RedisBucketStore(url) if url else LocalBucketStore()
+        return _store
+
+
+def reset():
+    """重置存储（切换配置或测试时使用）"""
+    global _store
+    with _store_lock:
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    令牌桶限流基类，子类指定 bucket（QUIZ_AI_THROTTLE_BUCKETS 中的名称）并实现 get_cache_key
+    """
+    bucket = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        self.consumed = None
+        config = getattr(settings, 'QUIZ_AI_THROTTLE_BUCKETS', {}).get(self.bucket)
+        if not config:
+            return True
+
+        key = f'{KEY_PREFIX}{self.get_cache_key(request, view)}'
+        try:
+            allowed, wait = get_store().consume(key, config['capacity'], config['refill_rate'])
+        except Exception as e:
+            print(f"限流存储不可用，放行请求: {e}")
+            return True
+        if not allowed:
+            self.wait_seconds = math.ceil(wait)
+        else:
+            self.consumed = (key, config['capacity'])
+        return allowed
+
+    def refund(self):
+        """退回 allow_request 扣减的令牌（后面的限流类拒绝了请求，请求没有调用AI）"""
+        if self.consumed is None:
+            return
+        key, capacity = self.consumed
+        self.consumed = None
+        try:
+            get_store().refund(key, capacity)
+        except Exception as e:
+            print(f"限流存储不可用，退回令牌失败: {e}")
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AIUserThrottle(TokenBucketThrottle):
+    """每个用户的AI调用额度"""
+    bucket = 'ai_user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return f'{self.bucket}:{ident}'
+
+
+class AIGlobalThrottle(TokenBucketThrottle):
+    """全站共享的AI调用额度"""
+    bucket = 'ai_global'
+
+    def get_cache_key(self, request, view):
+        return self.bucket
+
+
+# 顺序有意义：限流在第一个拒绝处停止，先检查用户额度，用户超出时不扣减全局额度；
+# 全局额度不足时退回已扣减的用户令牌，全站繁忙时用户额度不会被白白消耗
+AI_THROTTLE_CLASSES = [AIUserThrottle, AIGlobalThrottle]
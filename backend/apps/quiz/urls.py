@@ -14,6 +14,9 @@ urlpatterns = [
     # 包含路由器生成的URL
     path('', include(router.urls)),
     
+    # 提交阶段答案（异步视图）
+    path('sessions/<str:session_id>/submit-part/', views.submit_part, name='submit-part'),
+    
     # 嵌套路由：会话下的答案
     path('sessions/<str:session_id>/answers/', views.UserAnswerViewSet.as_view({'post': 'create'}), name='user-answer-create'),
     
@@ -21,5 +24,7 @@ urlpatterns = [
     path('all-questions/', views.get_all_questions, name='all-questions'),
     path('phased-questions/', views.get_phased_questions, name='phased-questions'),
     path('extend-text/', views.extend_text_with_ai, name='extend-text'),
+    path('extend-text/stream/', views.extend_text_with_ai_stream, name='extend-text-stream'),
     path('fragrance-images/', views.get_fragrance_images, name='fragrance-images'),
+    path('ai-cache/stats/', views.get_ai_cache_stats, name='ai-cache-stats'),
 ]
\ No newline at end of file
@@ -1,48 +1,127 @@
 # quiz/views.py
 
-from rest_framework import viewsets, mixins, status
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, viewsets, mixins, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
 from django.utils.crypto import get_random_string
 from django.utils import timezone
 
-from backend import settings
+from backend import caching, metrics
+from backend.db import release_connections
+from apps.users.permissions import IsSuperuserOrStaff
 from .models import (
     QuizQuestionGroup,
     QuizQuestion,
-    QuizQuestionOption,
     UserQuizSession,
-    UserAnswer,
-    FragranceCategory
+    UserAnswer
 )
 from .serializers import (
     QuizQuestionGroupSerializer,
     QuizQuestionSerializer,
     UserQuizSessionSerializer,
+    UserQuizSessionSummarySerializer,
     UserQuizSessionCreateSerializer,
     UserAnswerCreateSerializer,
     UserQuizSessionCompleteSerializer,
     UserQuizHistorySerializer,
     SubmitPartSerializer
 )
+from .renderers import EventStreamRenderer
+from .async_api import async_api_view, athrottle_response, json_response, throttle_response
+from .ai_cache import content_hash, extend_text_cache, extend_text_flight, fragrance_cache
+from .throttling import AI_THROTTLE_CLASSES
+from . import ai_gateway, analysis, catalog, fragrances, reports
+import asyncio
 import json
 
+# 调用AI的接口在默认限流之外，还要扣减用户和全站的AI调用额度
+AI_ENDPOINT_THROTTLE_CLASSES = list(api_settings.DEFAULT_THROTTLE_CLASSES) + AI_THROTTLE_CLASSES
+
+
+def _json_bytes_response(content):
+    """直接返回已渲染的 JSON 字节"""
+    return HttpResponse(content, content_type='application/json')
+
+
+def _catalog_response(request, name, render):
+    """
+    返回题目目录响应，支持 ETag 条件请求
+    If-None-Match 命中时直接返回 304，不调用 render
+    """
+    etag = catalog.get_etag(name)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    return _patch_catalog_headers(response, etag)
+
+
+def _patch_catalog_headers(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, **getattr(settings, 'QUIZ_CATALOG_CACHE_CONTROL', {}))
+    # 按认证信息区分缓存，避免代理把响应返回给未认证的请求
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _part_response(request, part):
+    """Part1-3题目组响应"""
+    def render():
+        group_bytes = catalog.get_part_bytes(part)
+        if group_bytes is None:
+            return Response(
+                {"code": 404, "msg": f"第{part}部分题目组不存在"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return _json_bytes_response(catalog.render_envelope("获取成功", group_bytes))
+
+    return _catalog_response(request, f'part{part}', render)
+
+
+async def _apart_response(request, part):
+    """_part_response 的异步版本"""
+    etag = await catalog.aget_etag(f'part{part}')
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        group_bytes = await catalog.aget_part_bytes(part)
+        if group_bytes is None:
+            return json_response(
+                {"code": 404, "msg": f"第{part}部分题目组不存在"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        response = _json_bytes_response(catalog.render_envelope("获取成功", group_bytes))
+    return _patch_catalog_headers(response, etag)
+
+
 class QuizQuestionGroupViewSet(viewsets.ReadOnlyModelViewSet):
     """题目组视图集"""
-    queryset = QuizQuestionGroup.objects.all()
+    queryset = QuizQuestionGroup.objects.prefetch_related('questions__group', 'questions__options').order_by('id')
     serializer_class = QuizQuestionGroupSerializer
     
+    def list(self, request, *args, **kwargs):
+        """题目组列表（支持 ETag 条件请求）"""
+        name = f'question-groups?{request.META.get("QUERY_STRING", "")}'
+        return _catalog_response(
+            request, name, lambda: super(QuizQuestionGroupViewSet, self).list(request, *args, **kwargs)
+        )
+    
     @action(detail=False, methods=['get'], url_path='all-questions')
     def all_questions(self, request):
         """获取所有题目组和题目"""
-        # 获取所有题目组，并预加载相关题目和选项，优化查询性能
-        groups = QuizQuestionGroup.objects.prefetch_related(
-            'questions__options'
-        ).order_by('id')
-        
-        serializer = self.get_serializer(groups, many=True)
-        return Response(serializer.data)
+        # 题目目录已缓存，命中时不访问数据库
+        return _catalog_response(
+            request, 'groups', lambda: _json_bytes_response(catalog.get_groups_bytes())
+        )
     
     @action(detail=False, methods=['get'], url_path='part/(?P<part>[0-9]+)')
     def get_part_questions(self, request, part=None):
@@ -55,18 +134,17 @@ class QuizQuestionGroupViewSet(viewsets.ReadOnlyModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # 获取指定部分的题目组
-            group_id = f"part{part}"
-            try:
-                group = QuizQuestionGroup.objects.get(id=group_id)
-            except QuizQuestionGroup.DoesNotExist:
-                return Response(
-                    {"code": 404, "msg": f"第{part}部分题目组不存在"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
             # 如果是Part4，需要根据用户会话动态生成选项
             if part == 4:
+                # 获取指定部分的题目组
+                try:
+                    group = QuizQuestionGroup.objects.get(id='part4')
+                except QuizQuestionGroup.DoesNotExist:
+                    return Response(
+                        {"code": 404, "msg": f"第{part}部分题目组不存在"},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                
                 # 获取用户会话ID
                 session_id = request.query_params.get('session_id')
                 if not session_id:
@@ -75,35 +153,27 @@ class QuizQuestionGroupViewSet(viewsets.ReadOnlyModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                try:
-                    session = UserQuizSession.objects.get(session_id=session_id)
-                except UserQuizSession.DoesNotExist:
+                # 只能获取自己的会话
+                session = _user_sessions(request.user).filter(session_id=session_id).first()
+                if session is None:
                     return Response(
                         {"code": 404, "msg": "会话不存在"},
                         status=status.HTTP_404_NOT_FOUND
                     )
                 
-                # 生成动态Part4题目
-                questions = self._generate_part4_questions(session)
+                # 香调分析未完成时不等待AI结果，交给后台任务
+                if not _fragrance_ready(session):
+                    # 与 phased-questions 相同：需要重新分析时才扣减AI调用额度
+                    if analysis.needs_analysis(session):
+                        throttled = throttle_response(request, AI_THROTTLE_CLASSES)
+                        if throttled is not None:
+                            return throttled
+                    return _analysis_pending_response(session)
                 
-                # 序列化题目数据
+                # 生成动态Part4题目（动态选项由序列化器处理）
+                questions = _generate_part4_questions(session)
                 serializer = QuizQuestionSerializer(questions, many=True)
                 
-                # 为动态生成的选项添加特殊处理
-                for i, question_data in enumerate(serializer.data):
-                    question = questions[i]
-                    if hasattr(question, '_dynamic_options'):
-                        # 序列化动态选项
-                        dynamic_options = []
-                        for option in question._dynamic_options:
-                            option_data = {
-                                'label': option.label,
-                                'value': option.value,
-                                'image': option.image
-                            }
-                            dynamic_options.append(option_data)
-                        question_data['options'] = dynamic_options
-                
                 return Response({
                     "code": 200,
                     "msg": "获取成功",
@@ -115,13 +185,8 @@ class QuizQuestionGroupViewSet(viewsets.ReadOnlyModelViewSet):
                     }
                 })
             else:
-                # 其他部分直接返回题目组数据
-                serializer = QuizQuestionGroupSerializer(group)
-                return Response({
-                    "code": 200,
-                    "msg": "获取成功",
-                    "data": serializer.data
-                })
+                # 其他部分直接返回缓存的题目组数据
+                return _part_response(request, part)
         except ValueError:
             return Response(
                 {"code": 400, "msg": "部分参数必须是整数"},
@@ -145,8 +210,31 @@ class UserQuizSessionViewSet(
         """确保用户只能看到自己的会话"""
         user = self.request.user
         if user.is_superuser:
-            return UserQuizSession.objects.all()
-        return UserQuizSession.objects.filter(user=user)
+            queryset = UserQuizSession.objects.all()
+        else:
+            queryset = UserQuizSession.objects.filter(user=user)
+        
+        # 列表和详情：注解答案数量，按需预加载答案
+        if self.action in ('list', 'retrieve'):
+            # 聚合查询不会应用 Meta.ordering，需显式排序
+            queryset = queryset.select_related('user').annotate(
+                answer_count=Count('answers')
+            ).order_by('-start_time')
+            if not self._is_summary():
+                queryset = queryset.prefetch_related(Prefetch(
+                    'answers',
+                    queryset=UserAnswer.objects.only(
+                        'session_id', 'question_id', 'value', 'text', 'created_at'
+                    )
+                ))
+        elif self.action == 'report':
+            # 报告快照与会话一起查询
+            queryset = queryset.select_related('report_snapshot')
+        return queryset
+    
+    def _is_summary(self):
+        """列表请求带 ?summary=1 时返回不含答案明细的摘要"""
+        return self.action == 'list' and self.request.query_params.get('summary') in ('1', 'true')
     
     def destroy(self, request, *args, **kwargs):
         """删除测验会话（只能删除未完成的会话）"""
@@ -170,6 +258,8 @@ class UserQuizSessionViewSet(
             return UserQuizSessionCompleteSerializer
         elif self.action == 'history':
             return UserQuizHistorySerializer
+        elif self._is_summary():
+            return UserQuizSessionSummarySerializer
         return self.serializer_class
     
     def create(self, request, *args, **kwargs):
@@ -201,6 +291,7 @@ class UserQuizSessionViewSet(
             serializer = self.get_serializer(instance, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
             instance = serializer.save()
+            reports.refresh_snapshot(instance)
             
             return Response(
                 UserQuizSessionSerializer(instance).data,
@@ -217,16 +308,15 @@ class UserQuizSessionViewSet(
         """检查用户是否有未完成的测验会话"""
         user = request.user
         
-        # 查找最近的未完成会话
+        # 查找最近的未完成会话，同时注解答案数量用于显示进度
         incomplete_session = UserQuizSession.objects.filter(
             user=user,
             status='in_progress'
-        ).order_by('-start_time').first()
+        ).annotate(answer_count=Count('answers')).order_by('-start_time').first()
         
         if incomplete_session:
-            # 获取会话中的答案数量，用于显示进度
-            answers_count = incomplete_session.answers.count()
-            total_questions = QuizQuestion.objects.count()
+            answers_count = incomplete_session.answer_count
+            total_questions = len(catalog.get_question_index())
             
             return Response({
                 'has_incomplete': True,
@@ -252,7 +342,7 @@ class UserQuizSessionViewSet(
         # 获取所有会话（包括已完成和未完成的）
         sessions = UserQuizSession.objects.filter(
             user=user
-        ).order_by('-start_time')[:limit]
+        ).annotate(answer_count=Count('answers')).order_by('-start_time')[:limit]
         
         serializer = self.get_serializer(sessions, many=True)
         return Response(serializer.data)
@@ -274,107 +364,10 @@ class UserQuizSessionViewSet(
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # 获取用户答案
-            user_answers = UserAnswer.objects.filter(session=session).select_related('question').order_by('question__sort_order')
-            
-            # 构建答案数据
-            answers_data = {}
-            for answer in user_answers:
-                # 获取问题信息
-                question = answer.question
-                question_text = question.text
-                question_type = question.type
-                
-                # 获取选项信息（如果是选择题）
-                option_labels = []
-                option_label = None
-                
-                if question_type in ['single', 'multiple', 'single-with-text']:
-                    try:
-                        # 处理答案值
-                        answer_value = answer.value
-                        if isinstance(answer_value, str):
-                            try:
-                                # 尝试解析JSON字符串
-                                parsed_value = json.loads(answer_value)
-                                answer_value = parsed_value
-                            except json.JSONDecodeError:
-                                # 如果不是JSON字符串，保持原值
-                                pass
-                        
-                        # 根据问题类型处理答案
-                        if question_type == 'multiple' and isinstance(answer_value, list):
-                            # 多选题
-                            for option_value in answer_value:
-                                try:
-                                    # 根据选项值获取选项标签
-                                    option = QuizQuestionOption.objects.get(
-                                        question=question,
-                                        value=option_value
-                                    )
-                                    option_labels.append(option.label)
-                                except QuizQuestionOption.DoesNotExist:
-                                    # 如果找不到选项，使用选项值作为标签
-                                    option_labels.append(f"选项 {option_value}")
-                        elif question_type in ['single', 'single-with-text'] and isinstance(answer_value, (str, int, dict)):
-                            # 单选题或单选填空题
-                            option_value = None
-                            text_value = None
-                            
-                            if isinstance(answer_value, dict):
-                                option_value = answer_value.get('value')
-                                text_value = answer_value.get('text')
-                            else:
-                                option_value = answer_value
-                            
-                            if option_value:
-                                try:
-                                    # 根据选项值获取选项标签
-                                    option = QuizQuestionOption.objects.get(
-                                        question=question,
-                                        value=option_value
-                                    )
-                                    option_label = option.label
-                                except QuizQuestionOption.DoesNotExist:
-                                    # 如果找不到选项，使用选项值作为标签
-                                    option_label = f"选项 {option_value}"
-                    except Exception as e:
-                        print(f"处理选项信息时出错: {str(e)}")
-                
-                # 构建答案数据
-                answer_data = {
-                    'question_id': question.id,
-                    'question_text': question_text,
-                    'question_type': question_type,
-                    'value': answer.value,
-                    'option_label': option_label,
-                    'option_labels': option_labels if option_labels else None,
-                    'text': answer.text
-                }
-                
-                answers_data[question.id] = answer_data
-            
-            # 计算测验用时
-            time_spent = session.duration_ms  # 直接使用模型中存储的持续时间
-            
-            # 构建报告数据
-            report_data = {
-                'session_id': session.session_id,
-                'started_at': session.start_time.isoformat() if session.start_time else None,
-                'completed_at': session.end_time.isoformat() if session.end_time else None,
-                'time_spent': time_spent,
-                'total_questions': user_answers.count(),
-                'main_fragrance': session.main_fragrance,
-                'secondary_fragrance': session.secondary_fragrance,
-                'description': session.description,
-                'answers': answers_data
-            }
-            
-            return Response({
-                "code": 200,
-                "msg": "获取报告成功",
-                "data": report_data
-            })
+            # 报告在会话完成时已生成，直接返回快照
+            return _json_bytes_response(
+                catalog.render_envelope("获取报告成功", reports.get_report_bytes(session))
+            )
             
         except Exception as e:
             print(f"获取测验报告失败: {str(e)}")
@@ -387,398 +380,49 @@ class UserQuizSessionViewSet(
 
 
 
-    @action(detail=True, methods=['post'], url_path='submit-part')
-    def submit_part(self, request, session_id=None, current_part=None):
-        """提交当前阶段，进入下一阶段"""
-        try:
-            # 从URL参数中获取current_part
-            current_part = int(request.data.get('current_part', 1))
-            if current_part < 1 or current_part > 4:
-                return Response(
-                    {"code": 400, "msg": "部分参数无效，必须是1-4之间的整数"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            instance = self.get_object()
-            if instance.status != 'in_progress':
-                return Response(
-                    {'detail': '该会话已结束，无法提交答案。'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            serializer = SubmitPartSerializer(data=request.data)
-            
-            if not serializer.is_valid():
-                return Response(
-                    {"code": 400, "msg": serializer.errors},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            submitted_session_id = serializer.validated_data["session_id"]
-            answers = serializer.validated_data["answers"]
-            
-            # 验证会话ID是否匹配
-            if str(instance.session_id) != str(submitted_session_id):
-                return Response(
-                    {"code": 400, "msg": "会话ID不匹配"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # 更新会话的当前部分
-            instance.current_part = current_part + 1
-            instance.save()
-            
-            # 保存答案
-            for question_id, answer in answers.items():
-                try:
-                    question = QuizQuestion.objects.get(id=question_id)
-                    # 将答案转为JSON字符串存储
-                    if isinstance(answer, (list, dict)):
-                        answer = json.dumps(answer)
-                    
-                    UserAnswer.objects.update_or_create(
-                        session=instance,
-                        question=question,
-                        defaults={
-                            'value': answer
-                        }
-                    )
-                except QuizQuestion.DoesNotExist:
-                    continue  # 跳过不存在的题目
-            
-            # 如果当前是Part3，生成Part4的题目
-            if current_part == 3:
-                part4_questions = self._generate_part4_questions(instance)
-                # 序列化题目数据
-                serializer = QuizQuestionSerializer(part4_questions, many=True)
-                
-                # 为动态生成的选项添加特殊处理
-                for i, question_data in enumerate(serializer.data):
-                    question = part4_questions[i]
-                    if hasattr(question, '_dynamic_options'):
-                        # 序列化动态选项
-                        dynamic_options = []
-                        for option in question._dynamic_options:
-                            option_data = {
-                                'label': option.label,
-                                'value': option.value,
-                                'image': option.image
-                            }
-                            dynamic_options.append(option_data)
-                        question_data['options'] = dynamic_options
-                
-                return Response({
-                    "code": 200,
-                    "msg": "Part3提交成功，已生成Part4题目",
-                    "data": serializer.data
-                })
-            
-            # 如果是Part4，标记会话为已完成
-            if current_part == 4:
-                instance.status = 'completed'
-                instance.end_time = timezone.now()
-                if instance.start_time:
-                    duration = instance.end_time - instance.start_time
-                    instance.duration_ms = int(duration.total_seconds() * 1000)
-                instance.save()
-                return Response({"code": 200, "msg": "问卷提交成功"})
-            
-            # 返回下一部分的题目
-            next_part = current_part + 1
-            group_id = f"part{next_part}"
-            try:
-                group = QuizQuestionGroup.objects.get(id=group_id)
-                serializer = QuizQuestionGroupSerializer(group)
-                return Response({
-                    "code": 200,
-                    "msg": f"Part{current_part}提交成功",
-                    "data": serializer.data
-                })
-            except QuizQuestionGroup.DoesNotExist:
-                return Response(
-                    {"code": 404, "msg": f"第{next_part}部分题目组不存在"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-                
-        except ValueError:
-            return Response(
-                {"code": 400, "msg": "部分参数必须是整数"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-    
-    def _generate_part4_questions(self, session):
-        """
-        根据用户前三个部分的回答生成个性化的Part4题目
-        返回一个包含动态生成选项的题目列表
-        """
-        
-        # 从数据库中重新查询会话，确保获取最新的香调信息
-        from .models import UserQuizSession
-        db_session = UserQuizSession.objects.get(session_id=session.session_id)
-        
-        # 检查数据库中的主次香调是否为空
-        if db_session.main_fragrance and db_session.secondary_fragrance:
-            # 使用数据库中的香调信息
-            fragrance_result = {
-                'main_fragrance': db_session.main_fragrance,
-                'secondary_fragrance': db_session.secondary_fragrance,
-                'description': db_session.description,
-                'main_images': [],
-                'secondary_images': []
-            }
-        else:
-            # 调用AI接口获取主香调和次香调
-            fragrance_result = self._generate_fragrance_combinations()
-            
-            # 保存香调结果到数据库中，以便下次使用
-            db_session.main_fragrance = fragrance_result['main_fragrance']
-            db_session.secondary_fragrance = fragrance_result['secondary_fragrance']
-            db_session.description = fragrance_result['description']
-            db_session.save()
-            
-            # 同时更新当前会话对象的香调信息
-            session.main_fragrance = fragrance_result['main_fragrance']
-            session.secondary_fragrance = fragrance_result['secondary_fragrance']
-            session.description = fragrance_result['description']
-        
-        # 获取Part4题目组
-        try:
-            part4_group = QuizQuestionGroup.objects.get(id='part4')
-            questions = list(part4_group.questions.all())
-            
-            # 为每个题目动态生成选项
-            for question in questions:
-                if question.id == 'q4':  # 图片多选题
-                    # 创建动态选项类
-                    class DynamicOption:
-                        def __init__(self, label, value, image):
-                            self.label = label
-                            self.value = value
-                            self.image = image
-                    
-                    # 为q4添加动态生成的选项
-                    question._dynamic_options = []
-                    
-                    # 获取主香调图片
-                    main_images = _get_fragrance_images(fragrance_result['main_fragrance'])
-                    if main_images:
-                        # 使用第一张图片作为主香调选项
-                        main_image = main_images[0]
-                        main_option = DynamicOption(
-                            label=fragrance_result['main_fragrance'],
-                            value=fragrance_result['main_fragrance'],
-                            image=main_image['image']
-                        )
-                        question._dynamic_options.append(main_option)
-                        # 保存主香调图片列表到结果中，供前端使用
-                        fragrance_result['main_images'] = main_images
-                    else:
-                        # 如果没有找到图片，使用默认图片
-                        main_option = DynamicOption(
-                            label=fragrance_result['main_fragrance'],
-                            value=fragrance_result['main_fragrance'],
-                            image=f"/images/smell/default/1.jpg"
-                        )
-                        question._dynamic_options.append(main_option)
-                    
-                    # 获取次香调图片
-                    secondary_images = _get_fragrance_images(fragrance_result['secondary_fragrance'])
-                    if secondary_images:
-                        # 使用第一张图片作为次香调选项
-                        secondary_image = secondary_images[0]
-                        secondary_option = DynamicOption(
-                            label=fragrance_result['secondary_fragrance'],
-                            value=fragrance_result['secondary_fragrance'],
-                            image=secondary_image['image']
-                        )
-                        question._dynamic_options.append(secondary_option)
-                        # 保存次香调图片列表到结果中，供前端使用
-                        fragrance_result['secondary_images'] = secondary_images
-                    else:
-                        # 如果没有找到图片，使用默认图片
-                        secondary_option = DynamicOption(
-                            label=fragrance_result['secondary_fragrance'],
-                            value=fragrance_result['secondary_fragrance'],
-                            image=f"/images/smell/default/2.jpg"
-                        )
-                        question._dynamic_options.append(secondary_option)
-            
-            return questions
-        except QuizQuestionGroup.DoesNotExist:
-            return []
-
-    
-    def _generate_fragrance_combinations(self):
-        """
-        调用AI接口分析用户答题记录，返回主香调、次香调和描述
-        """
-        # 调用AI接口分析用户答题记录
-        try:
-            ai_result = self._call_fragrance_ai()
-            # print(ai_result)
-            # 解析AI返回的结果
-            main_fragrance = ai_result.get('主香调')  # 默认值
-            secondary_fragrance = ai_result.get('次香调')  # 默认值
-            description = ai_result.get('描述', '')  # 描述内容
-            
-            # 构建返回结果
-            result = {
-                'main_fragrance': main_fragrance,
-                'secondary_fragrance': secondary_fragrance,
-                'description': description,
-                'main_images': [],  # 由前端填充
-                'secondary_images': []  # 由前端填充
-            }
-            
-            return result
-            
-        except Exception as e:
-            # 如果AI接口调用失败，使用空值
-            print(f"AI接口调用失败: {e}")
-            return {
-                'main_fragrance': '',
-                'secondary_fragrance': '',  # 确保与数据库中的类别完全匹配
-                'description': '',
-                'main_images': [],
-                'secondary_images': []
-            }
+    @action(detail=True, methods=['get'], url_path='analysis')
+    def fragrance_analysis(self, request, session_id=None):
+        """获取Part4香调分析状态和结果（供客户端轮询）"""
+        session = self.get_object()
+        return Response({
+            "code": 200,
+            "msg": "获取成功",
+            "data": _analysis_data(session)
+        })
     
-    def _call_fragrance_ai(self):
-        """
-        调用AI接口分析用户答题记录，返回主香调和次香调
-        这里是一个模拟实现，实际应用中需要替换为真实的AI接口调用
-        """
-        # print("正在调用AI接口...")
-        
-        # 获取用户会话
-        session = UserQuizSession.objects.filter(
-            user=self.request.user,
-            status='in_progress'
-        ).first()
-        
-        if not session:
-            print("未找到有效的用户会话")
-            # 返回空值，等待分析后再设置
-            main_fragrance = ''  # 空值
-            secondary_fragrance = ''  # 空值
-            
-            return {
-                '主香调': main_fragrance,
-                '次香调': secondary_fragrance,
-                '描述': ''
-            }
-        
-        # 获取用户前三个部分的答案
-        user_answers = UserAnswer.objects.filter(
-            session=session
-        ).select_related('question').prefetch_related('question__options')
-        
-        # 构建问题和答案的字典对
-        question_answer_dict = {}
-        
-        for answer in user_answers:
-            question = answer.question
-            question_text = question.text
-            
-            # 根据题目类型处理答案
-            if question.type in ['single', 'image-single']:  # 单选题
-                try:
-                    value = json.loads(answer.value) if answer.value else None
-                    # 获取选项文本
-                    if value:
-                        option = question.options.filter(value=value).first()
-                        answer_text = option.label if option else value
-                    else:
-                        answer_text = None
-                except json.JSONDecodeError:
-                    answer_text = answer.value
-                    
-            elif question.type in ['multiple', 'image-multiple']:  # 多选题
-                try:
-                    values = json.loads(answer.value) if answer.value else []
-                    # 获取选项文本列表
-                    answer_texts = []
-                    if values:
-                        for value in values:
-                            option = question.options.filter(value=value).first()
-                            if option:
-                                answer_texts.append(option.label)
-                            else:
-                                answer_texts.append(value)
-                    answer_text = answer_texts
-                except json.JSONDecodeError:
-                    answer_text = answer.value
-                    
-            elif question.type in ['text', 'single-with-text']:  # 填空题或单选加填空
-                answer_text = answer.text if answer.text else answer.value
-                
-            else:  # 其他类型
-                answer_text = answer.value
-            
-            # 添加到字典
-            question_answer_dict[question_text] = answer_text
-        
-        # 限制为前20题
-        if len(question_answer_dict) > 20:
-            # 转换为列表，取前20个，再转回字典
-            items = list(question_answer_dict.items())[:20]
-            question_answer_dict = dict(items)
-        
-        # print("问题和答案字典对:", question_answer_dict)
-
-        from http import HTTPStatus
-        from dashscope import Application
-
-        dashscope_api_key = getattr(settings, 'DASHSCOPE_API_KEY', '')
-        if not dashscope_api_key:
-            print("阿里云百炼API密钥未配置")
-            # 返回默认值，而不是Response对象
-            return {
-                '主香调': '花香',
-                '次香调': '果香',
-                '描述': '您是一位热爱自然、追求内心平静的人。花香调的香气能够带给您宁静与舒适，而果香调则为您的生活增添活力与愉悦。这种香氛组合适合日常使用，既能展现您的温柔气质，又能体现您积极乐观的生活态度。'
-            }
-
-        response = Application.call(
-            # 若没有配置环境变量，可用百炼API Key将下行替换为：api_key="sk-xxx"。但不建议在生产环境中直接将API Key硬编码到代码中，以减少API Key泄露风险。
-            api_key=dashscope_api_key,
-            app_id='6e85e84a55ef4b5ea41b197077a159c6',  # 替换为实际的应用 ID
-            prompt=str(question_answer_dict))
-
-        if response.status_code != HTTPStatus.OK:
-            print(f'request_id={response.request_id}')
-            print(f'code={response.status_code}')
-            print(f'message={response.message}')
-            print(f'请参考文档：https://help.aliyun.com/zh/model-studio/developer-reference/error-code')
-            # 返回默认值
-            return {
-                '主香调': '花香',
-                '次香调': '果香',
-                '描述': '您是一位热爱自然、追求内心平静的人。花香调的香气能够带给您宁静与舒适，而果香调则为您的生活增添活力与愉悦。这种香氛组合适合日常使用，既能展现您的温柔气质，又能体现您积极乐观的生活态度。'
-            }
-        else:
-            # print(response.output.text)
-            pass
-
-        try:
-            result_dict = json.loads(response.output.text)
-            return result_dict
-        except json.JSONDecodeError as e:
-            print(f"解析AI返回结果失败: {e}")
-            # 返回默认值
-            return {
-                '主香调': '花香',
-                '次香调': '果香',
-                '描述': '您是一位热爱自然、追求内心平静的人。花香调的香气能够带给您宁静与舒适，而果香调则为您的生活增添活力与愉悦。这种香氛组合适合日常使用，既能展现您的温柔气质，又能体现您积极乐观的生活态度。'
-            }
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='analysis/stream',
+        renderer_classes=[EventStreamRenderer, JSONRenderer]
+    )
+    def fragrance_analysis_stream(self, request, session_id=None):
+        """以 server-sent events 推送Part4香调分析状态，分析结束后关闭连接"""
+        session = self.get_object()
+        # 推送期间不会触发 request_finished，先归还查询会话使用的数据库连接
+        release_connections()
+        response = StreamingHttpResponse(
+            _analysis_events(session.pk),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # 关闭 nginx 缓冲，保证事件及时送达
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 class UserAnswerViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     """用户答题记录视图集"""
     queryset = UserAnswer.objects.all()
     serializer_class = UserAnswerCreateSerializer
     
+    # 批量保存时单次请求允许的最大答案数
+    max_batch_size = 100
+    
     def create(self, request, *args, **kwargs):
-        """保存或更新用户答案"""
+        """
+        保存或更新用户答案
+        请求体为单个答案对象，或答案列表（也可写作 {"answers": [...]}）批量保存
+        """
         # 从URL中获取session_id
         session_id = kwargs.get('session_id')
         if not session_id:
@@ -801,14 +445,14 @@ class UserAnswerViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
+            # 批量答案
+            if isinstance(request.data, list) or 'answers' in request.data:
+                return self._create_batch(request, session)
+            
             # 处理单个答案
             serializer = self.get_serializer(data=request.data)
             serializer.is_valid(raise_exception=True)
-            
-            # 将session_id传入serializer的context
-            serializer.context['session_id'] = session_id
-            
-            instance = serializer.save()
+            _bulk_upsert_answers([serializer.build_answer(session)], ['value', 'text'])
             
             # 返回成功响应
             return Response(
@@ -820,221 +464,603 @@ class UserAnswerViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
                 {'detail': '会话不存在或不属于当前用户。'},
                 status=status.HTTP_404_NOT_FOUND
             )
+    
+    def _create_batch(self, request, session):
+        """批量保存答案：逐条校验，有效答案用一条语句写入，返回每条答案的处理结果"""
+        items = request.data if isinstance(request.data, list) else request.data.get('answers')
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'detail': '答案列表不能为空。'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > self.max_batch_size:
+            return Response(
+                {'detail': f'单次最多保存{self.max_batch_size}条答案。'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        user_answers = []
+        results = []
+        for item in items:
+            serializer = self.get_serializer(data=item)
+            question_id = item.get('question_id') if isinstance(item, dict) else None
+            if serializer.is_valid():
+                user_answers.append(serializer.build_answer(session))
+                results.append({'question_id': question_id, 'saved': True})
+            else:
+                results.append({'question_id': question_id, 'saved': False, 'errors': serializer.errors})
+        
+        _bulk_upsert_answers(user_answers, ['value', 'text'])
+        
+        saved_count = len(user_answers)
+        return Response(
+            {
+                'detail': '答案保存成功。' if saved_count == len(items) else '部分答案保存失败。',
+                'saved': saved_count,
+                'results': results
+            },
+            status=status.HTTP_201_CREATED if saved_count else status.HTTP_400_BAD_REQUEST
+        )
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_phased_questions(request):
+def _bulk_upsert_answers(user_answers, update_fields):
+    """
+    一条语句批量写入答案
+    同一会话同一题目的答案已存在时只更新 update_fields（依赖 (session, question) 唯一约束）
+    """
+    # 同一批次内重复的题目以最后一次为准
+    unique_answers = list({answer.question_id: answer for answer in user_answers}.values())
+    if not unique_answers:
+        return
+
+    conflict_options = {}
+    # MySQL 的 ON DUPLICATE KEY UPDATE 不需要也不支持指定冲突字段
+    if connection.features.supports_update_conflicts_with_target:
+        conflict_options['unique_fields'] = ['session', 'question']
+    UserAnswer.objects.bulk_create(
+        unique_answers,
+        update_conflicts=True,
+        update_fields=list(update_fields) + ['updated_at'],
+        **conflict_options
+    )
+
+
+def _user_sessions(user):
+    """用户可访问的会话：超级管理员可访问所有会话，其他用户只能访问自己的会话"""
+    sessions = UserQuizSession.objects.all()
+    if not user.is_superuser:
+        sessions = sessions.filter(user=user)
+    return sessions
+
+
+def _fragrance_ready(session):
+    """会话的主次香调是否已分析完成"""
+    return bool(session.main_fragrance and session.secondary_fragrance)
+
+
+def _analysis_data(session):
+    return {
+        'session_id': session.session_id,
+        'analysis_status': session.analysis_status,
+        'main_fragrance': session.main_fragrance,
+        'secondary_fragrance': session.secondary_fragrance,
+        'description': session.description
+    }
+
+
+def _analysis_pending_data(session, analysis_status):
+    return {
+        "code": 202,
+        "msg": "香调分析进行中，请稍后重试",
+        "data": {
+            'session_id': session.session_id,
+            'analysis_status': analysis_status
+        }
+    }
+
+
+def _analysis_pending_response(session):
+    """香调分析未完成：确保后台任务已创建，并返回202"""
+    analysis_status = analysis.enqueue_fragrance_analysis(session)
+    return Response(
+        _analysis_pending_data(session, analysis_status),
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+def _sse_event(event, data):
+    """格式化一条 server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _poll_analysis_session(session_pk):
+    """推送期间查询会话的分析状态，查询后立即归还数据库连接"""
+    try:
+        return UserQuizSession.objects.filter(pk=session_pk).first()
+    finally:
+        release_connections()
+
+
+async def _analysis_events(session_pk):
+    """轮询数据库中的分析状态，状态变化时推送事件，分析结束或超时后停止"""
+    interval = getattr(settings, 'QUIZ_ANALYSIS_STREAM_INTERVAL', 1)
+    timeout = getattr(settings, 'QUIZ_ANALYSIS_STREAM_TIMEOUT', 120)
+    last_status = None
+    elapsed = 0
+    while elapsed < timeout:
+        session = await sync_to_async(_poll_analysis_session)(session_pk)
+        if session is None:
+            return
+        if session.analysis_status != last_status:
+            last_status = session.analysis_status
+            yield _sse_event('status', _analysis_data(session))
+            if last_status in ('done', 'failed'):
+                return
+        else:
+            # 心跳，防止代理断开空闲连接
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(interval)
+        elapsed += interval
+    yield "event: timeout\ndata: {}\n\n"
+
+
+def _generate_part4_questions(session):
+    """
+    根据会话中已保存的香调分析结果生成个性化的Part4题目
+    返回一个包含动态生成选项的题目列表
+    """
+    
+    # 获取Part4题目
+    questions = list(QuizQuestion.objects.filter(
+        group_id='part4'
+    ).select_related('group').prefetch_related('options'))
+    _attach_part4_options(
+        questions,
+        session,
+        _get_fragrance_images(session.main_fragrance),
+        _get_fragrance_images(session.secondary_fragrance)
+    )
+    return questions
+
+
+async def _agenerate_part4_questions(session):
+    """_generate_part4_questions 的异步版本"""
+    questions = [
+        question async for question in QuizQuestion.objects.filter(
+            group_id='part4'
+        ).select_related('group').prefetch_related('options')
+    ]
+    _attach_part4_options(
+        questions,
+        session,
+        await _aget_fragrance_images(session.main_fragrance),
+        await _aget_fragrance_images(session.secondary_fragrance)
+    )
+    return questions
+
+
+def _attach_part4_options(questions, session, main_images, secondary_images):
+    """为每个题目动态生成选项"""
+    for question in questions:
+        if question.id == 'q4':  # 图片多选题
+            # 为q4添加动态生成的选项：主香调、次香调各一个，使用对应类别的第一张图片
+            question._dynamic_options = []
+            fallbacks = [
+                (session.main_fragrance, main_images, "/images/smell/default/1.jpg"),
+                (session.secondary_fragrance, secondary_images, "/images/smell/default/2.jpg")
+            ]
+            for fragrance, images, default_image in fallbacks:
+                question._dynamic_options.append(DynamicOption(
+                    label=fragrance,
+                    value=fragrance,
+                    image=images[0]['image'] if images else default_image
+                ))
+
+
+class DynamicOption:
+    """Part4动态生成的选项"""
+    def __init__(self, label, value, image):
+        self.label = label
+        self.value = value
+        self.image = image
+
+
+@async_api_view(['GET'])
+async def get_phased_questions(request):
     """
     分阶段获取问卷题目
     参数：
     - part: 题目部分 (1-4)
     - session_id: 会话ID (Part4必需)
+    Part4的香调分析尚未完成时返回202，客户端轮询分析状态后重新获取
     """
-    from .models import UserQuizSession
-    
     part = request.query_params.get('part')
     session_id = request.query_params.get('session_id')
     
     # 验证part参数
     if not part or not part.isdigit() or int(part) < 1 or int(part) > 4:
-        return Response(
+        return json_response(
             {"code": 400, "msg": "部分参数必须是1-4之间的整数"},
             status=status.HTTP_400_BAD_REQUEST
         )
     
     part = int(part)
     
+    # Part1-3为静态内容，直接返回缓存的题目组数据
+    if part != 4:
+        return await _apart_response(request, part)
+    
+    # 获取指定部分的题目组
+    group = await QuizQuestionGroup.objects.filter(id=f'part{part}').afirst()
+    if group is None:
+        return json_response(
+            {"code": 404, "msg": f"第{part}部分题目组不存在"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    # Part4需要根据用户会话动态生成选项
+    if not session_id:
+        return json_response(
+            {"code": 400, "msg": "Part4需要提供session_id参数"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # 只能获取自己的会话
+    session = await _user_sessions(request.user).filter(session_id=session_id).afirst()
+    if session is None:
+        return json_response(
+            {"code": 404, "msg": "会话不存在"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    # 香调分析未完成时不等待AI结果，交给后台任务
+    if not _fragrance_ready(session):
+        # 需要重新分析时才扣减AI调用额度，正常排队或分析中的会话只返回状态
+        if analysis.needs_analysis(session):
+            throttled = await athrottle_response(request, AI_THROTTLE_CLASSES)
+            if throttled is not None:
+                return throttled
+        analysis_status = await sync_to_async(analysis.enqueue_fragrance_analysis)(session)
+        return json_response(
+            _analysis_pending_data(session, analysis_status),
+            status=status.HTTP_202_ACCEPTED
+        )
+    
+    # 生成动态Part4题目（动态选项由序列化器处理）
+    questions = await _agenerate_part4_questions(session)
+    serializer = QuizQuestionSerializer(questions, many=True)
+    
+    # 获取主香调和次香调的图片列表
+    main_images = await _aget_fragrance_images(session.main_fragrance)
+    secondary_images = await _aget_fragrance_images(session.secondary_fragrance)
+    
+    # 构建返回数据，与其他部分格式保持一致
+    return_data = {
+        'id': group.id,
+        'title': group.title,
+        'description': group.description,
+        'questions': serializer.data,
+        'mainFragrance': session.main_fragrance,
+        'secondaryFragrance': session.secondary_fragrance,
+        'main_images': main_images,
+        'secondary_images': secondary_images
+    }
+    
+    return json_response({
+        "code": 200,
+        "msg": "获取成功",
+        "data": return_data
+    })
+
+
+@async_api_view(['POST'])
+async def submit_part(request, session_id):
+    """提交当前阶段，进入下一阶段"""
+    if not isinstance(request.data, dict):
+        return json_response(
+            {"code": 400, "msg": "请求体必须是JSON对象"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     try:
-        # 获取指定部分的题目组
-        group = QuizQuestionGroup.objects.get(id=f'part{part}')
-        
-        # 如果是Part4，需要根据用户会话动态生成选项
-        if part == 4:
-            if not session_id:
-                return Response(
-                    {"code": 400, "msg": "Part4需要提供session_id参数"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            try:
-                session = UserQuizSession.objects.get(session_id=session_id)
-            except UserQuizSession.DoesNotExist:
-                return Response(
-                    {"code": 404, "msg": "会话不存在"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # 获取UserQuizSessionViewSet实例来调用_generate_part4_questions方法
-            viewset = UserQuizSessionViewSet()
-            viewset.request = request
-            
-            # 生成动态Part4题目
-            questions = viewset._generate_part4_questions(session)
-            
-            # 序列化题目数据
-            serializer = QuizQuestionSerializer(questions, many=True)
-            
-            # 为动态生成的选项添加特殊处理
-            for i, question_data in enumerate(serializer.data):
-                question = questions[i]
-                if hasattr(question, '_dynamic_options'):
-                    # 序列化动态选项
-                    dynamic_options = []
-                    for option in question._dynamic_options:
-                        option_data = {
-                            'label': option.label,
-                            'value': option.value,
-                            'image': option.image
-                        }
-                        dynamic_options.append(option_data)
-                    question_data['options'] = dynamic_options
-            
-            # 构建返回数据，与其他部分格式保持一致
-            # 从数据库中重新查询会话，确保获取最新的香调信息
-            db_session = UserQuizSession.objects.get(session_id=session.session_id)
-            
-            # 获取主香调和次香调的图片列表
-            main_images = _get_fragrance_images(db_session.main_fragrance) if db_session.main_fragrance else []
-            secondary_images = _get_fragrance_images(db_session.secondary_fragrance) if db_session.secondary_fragrance else []
-            
-            return_data = {
-                'id': group.id,
-                'title': group.title,
-                'description': group.description,
-                'questions': serializer.data,
-                'mainFragrance': db_session.main_fragrance,
-                'secondaryFragrance': db_session.secondary_fragrance,
-                'main_images': main_images,
-                'secondary_images': secondary_images
+        current_part = int(request.data.get('current_part', 1))
+    except (TypeError, ValueError):
+        return json_response(
+            {"code": 400, "msg": "部分参数必须是整数"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if current_part < 1 or current_part > 4:
+        return json_response(
+            {"code": 400, "msg": "部分参数无效，必须是1-4之间的整数"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # 确保用户只能提交自己的会话
+    instance = await _user_sessions(request.user).filter(session_id=session_id).afirst()
+    if instance is None:
+        return json_response(
+            {'detail': exceptions.NotFound.default_detail},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if instance.status != 'in_progress':
+        return json_response(
+            {'detail': '该会话已结束，无法提交答案。'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Part3提交后会调用AI生成香调分析，先扣减AI调用额度，超出时不保存答案
+    if current_part == 3:
+        throttled = await athrottle_response(request, AI_THROTTLE_CLASSES)
+        if throttled is not None:
+            return throttled
+    
+    # 校验和写入在事务中完成，需在同步线程中执行
+    error, analysis_status = await sync_to_async(_save_submitted_part)(
+        instance, current_part, request.data
+    )
+    if error is not None:
+        return json_response(error, status=status.HTTP_400_BAD_REQUEST)
+    
+    # 如果当前是Part3，后台生成Part4所需的香调分析，立即返回
+    if current_part == 3:
+        return json_response({
+            "code": 202,
+            "msg": "Part3提交成功，正在生成Part4题目",
+            "data": {
+                'session_id': instance.session_id,
+                'analysis_status': analysis_status
             }
-            
-            return Response({
-                "code": 200,
-                "msg": "获取成功",
-                "data": return_data
-            })
-        else:
-            # 其他部分直接返回题目组数据
-            serializer = QuizQuestionGroupSerializer(group)
-            return Response({
-                "code": 200,
-                "msg": "获取成功",
-                "data": serializer.data
-            })
-            
-    except QuizQuestionGroup.DoesNotExist:
-        return Response(
-            {"code": 404, "msg": f"第{part}部分题目组不存在"},
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    # 如果是Part4，会话已标记为完成
+    if current_part == 4:
+        return json_response({"code": 200, "msg": "问卷提交成功"})
+    
+    # 返回下一部分的题目
+    next_part = current_part + 1
+    group_bytes = await catalog.aget_part_bytes(next_part)
+    if group_bytes is None:
+        return json_response(
+            {"code": 404, "msg": f"第{next_part}部分题目组不存在"},
             status=status.HTTP_404_NOT_FOUND
         )
+    return _json_bytes_response(
+        catalog.render_envelope(f"Part{current_part}提交成功", group_bytes)
+    )
+
+
+def _save_submitted_part(instance, current_part, data):
+    """
+    校验并保存提交的答案，返回 (错误信息, 香调分析状态)
+    Part3 提交后创建香调分析任务，Part4 提交后标记会话为已完成
+    """
+    serializer = SubmitPartSerializer(data=data)
+    if not serializer.is_valid():
+        return {"code": 400, "msg": serializer.errors}, None
+    
+    submitted_session_id = serializer.validated_data["session_id"]
+    answers = serializer.validated_data["answers"]
+    
+    # 验证会话ID是否匹配
+    if str(instance.session_id) != str(submitted_session_id):
+        return {"code": 400, "msg": "会话ID不匹配"}, None
+    
+    with transaction.atomic():
+        # 更新会话的当前部分
+        instance.current_part = current_part + 1
+        instance.save(update_fields=['current_part'])
+        
+        # 批量保存答案（序列化器已过滤不存在的题目）
+        user_answers = []
+        for question_id, answer in answers.items():
+            # 将答案转为JSON字符串存储
+            if isinstance(answer, (list, dict)):
+                answer = json.dumps(answer)
+            user_answers.append(UserAnswer(
+                session=instance,
+                question_id=question_id,
+                value=answer
+            ))
+        _bulk_upsert_answers(user_answers, ['value'])
+    
+    analysis_status = None
+    if current_part == 3:
+        analysis_status = analysis.enqueue_fragrance_analysis(instance)
+    elif current_part == 4:
+        instance.status = 'completed'
+        instance.end_time = timezone.now()
+        if instance.start_time:
+            duration = instance.end_time - instance.start_time
+            instance.duration_ms = int(duration.total_seconds() * 1000)
+        # 只保存完成相关的字段，不覆盖后台香调分析在会话加载后写入的结果
+        instance.save(update_fields=['status', 'end_time', 'duration_ms'])
+        reports.refresh_snapshot(instance)
+    return None, analysis_status
 
 @api_view(['GET'])
 def get_all_questions(request):
     """获取所有题目（不分组）"""
-    questions = QuizQuestion.objects.prefetch_related('options').order_by('id')
-    serializer = QuizQuestionSerializer(questions, many=True)
-    return Response(serializer.data)
+    return _catalog_response(
+        request, 'questions', lambda: _json_bytes_response(catalog.get_questions_bytes())
+    )
+
+EXTEND_TEXT_MODEL = "qwen-plus"
+
+
+def _extend_text_messages(text):
+    """扩写文本的提示词"""
+    return [
+        {"role": "system", "content": "你是一个专业的文案扩写助手，擅长将简洁的描述扩展为更丰富、生动的表达。请保持原文的核心意思，同时增加细节和表现力。尽可能详细的描述用户感觉最舒适的场景，字数控制在30字以内"},
+        {"role": "user", "content": f"请扩写以下文本：{text.strip()}"},
+    ]
+
+
+def _extend_text_cache_key(messages):
+    # 缓存键包含模型和完整提示词，提示词修改后旧结果自动失效
+    return {'model': EXTEND_TEXT_MODEL, 'messages': messages}
+
+
+async def _extend_text(text):
+    """
+    扩写文本：相同输入直接返回缓存结果；
+    未命中时合并并发的相同请求，只调用一次AI接口
+    """
+    messages = _extend_text_messages(text)
+    cache_key = _extend_text_cache_key(messages)
+    cached = await extend_text_cache.aget(cache_key)
+    if cached is not None:
+        return cached
+
+    async def call():
+        with metrics.observe_ai_call('extend_text_with_ai'):
+            extended_text = await ai_gateway.achat(messages, model=EXTEND_TEXT_MODEL)
+        if extended_text:
+            await extend_text_cache.aset(cache_key, extended_text)
+        return extended_text
+
+    return await extend_text_flight.do(
+        content_hash(cache_key), call, extend_text_cache.acount_coalesced
+    )
+
 
 # 用于AI扩写文本的视图
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def extend_text_with_ai(request):
+@async_api_view(['POST'], throttle_classes=AI_ENDPOINT_THROTTLE_CLASSES)
+async def extend_text_with_ai(request):
     """使用AI扩写用户输入的文本"""
     try:
         # 获取用户输入的文本
-        text = request.data.get('text', '')
-        if not text.strip():
-            return Response(
+        text = request.data.get('text', '') if isinstance(request.data, dict) else None
+        if not isinstance(text, str) or not text.strip():
+            return json_response(
                 {'detail': '文本不能为空。'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 导入必要的库
-        from openai import OpenAI
-        
         # 从settings中获取阿里云百炼API密钥
         dashscope_api_key = getattr(settings, 'DASHSCOPE_API_KEY', '')
-        if not dashscope_api_key:
-            return Response(
+        if not dashscope_api_key and getattr(settings, 'QUIZ_AI_PROVIDER', 'dashscope') == 'dashscope':
+            return json_response(
                 {'detail': '阿里云百炼API密钥未配置。'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
         
-        # 创建OpenAI客户端，连接到阿里云百炼API
-        client = OpenAI(
-            api_key=dashscope_api_key,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-        )
-        
-        # 调用AI模型扩写文本
-        completion = client.chat.completions.create(
-            model="qwen-plus",
-            messages=[
-                {"role": "system", "content": "你是一个专业的文案扩写助手，擅长将简洁的描述扩展为更丰富、生动的表达。请保持原文的核心意思，同时增加细节和表现力。尽可能详细的描述用户感觉最舒适的场景，字数控制在30字以内"},
-                {"role": "user", "content": f"请扩写以下文本：{text}"},
-            ],
-            # 对于qwen-plus模型，不需要设置enable_thinking
-        )
-        
-        # 提取扩写后的文本
-        extended_text = completion.choices[0].message.content
+        # 调用AI模型扩写文本（带缓存），等待期间不占用线程
+        try:
+            extended_text = await _extend_text(text)
+        except ai_gateway.AIUnavailable:
+            return json_response(
+                {'detail': 'AI服务暂时不可用，请稍后重试。'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
         
         # 返回扩写结果
-        return Response({
+        return json_response({
             'extended_text': extended_text
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
         # 记录错误日志
         print(f"AI扩写失败: {str(e)}")
-        return Response(
+        return json_response(
             {'detail': f'AI扩写失败，请稍后重试。错误信息：{str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+# 流式AI扩写文本的视图
+@async_api_view(['POST'], throttle_classes=AI_ENDPOINT_THROTTLE_CLASSES)
+async def extend_text_with_ai_stream(request):
+    """
+    使用AI扩写用户输入的文本，以 server-sent events 推送生成的内容
+    事件：delta（新生成的文本片段）、done（完整结果）、error（失败原因）
+    客户端断开时取消上游请求
+    """
+    text = request.data.get('text', '') if isinstance(request.data, dict) else None
+    if not isinstance(text, str) or not text.strip():
+        return json_response(
+            {'detail': '文本不能为空。'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    dashscope_api_key = getattr(settings, 'DASHSCOPE_API_KEY', '')
+    if not dashscope_api_key and getattr(settings, 'QUIZ_AI_PROVIDER', 'dashscope') == 'dashscope':
+        return json_response(
+            {'detail': '阿里云百炼API密钥未配置。'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    
+    # 认证未命中用户缓存时查询过数据库，推送期间不会触发 request_finished，先归还连接
+    await sync_to_async(release_connections)()
+    response = StreamingHttpResponse(
+        _extend_text_events(text),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # 关闭 nginx 缓冲，保证事件及时送达
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _extend_text_events(text):
+    messages = _extend_text_messages(text)
+    cache_key = _extend_text_cache_key(messages)
+    cached = await extend_text_cache.aget(cache_key)
+    if cached is not None:
+        # 命中缓存时一次性推送完整结果
+        yield _sse_event('delta', {'text': cached})
+        yield _sse_event('done', {'extended_text': cached})
+        return
+
+    parts = []
+    try:
+        with metrics.observe_ai_call('extend_text_with_ai_stream'):
+            async for delta in ai_gateway.astream_chat(messages, model=EXTEND_TEXT_MODEL):
+                parts.append(delta)
+                yield _sse_event('delta', {'text': delta})
+    except ai_gateway.AIUnavailable:
+        yield _sse_event('error', {'detail': 'AI服务暂时不可用，请稍后重试。'})
+        return
+    except Exception as e:
+        # 记录错误日志
+        print(f"AI扩写失败: {str(e)}")
+        yield _sse_event('error', {'detail': 'AI扩写失败，请稍后重试。'})
+        return
+    extended_text = ''.join(parts)
+    if extended_text:
+        await extend_text_cache.aset(cache_key, extended_text)
+    yield _sse_event('done', {'extended_text': extended_text})
+
 def _get_fragrance_images(category_type):
     """
-    根据香调类别获取图片列表
+    根据香调类别获取图片列表（进程内索引，不访问数据库）
     """
     try:
-        # 从数据库中获取指定类别的所有香调图片
-        fragrance_categories = FragranceCategory.objects.filter(category_type=category_type)
-        
-        # 提取图片URL列表
-        images = []
-        for category in fragrance_categories:
-            if category.image_url:
-                # 获取图片文件名作为标签
-                image_path = category.image_url
-                image_name = image_path.split('/')[-1].split('.')[0]  # 去掉扩展名
-                images.append({
-                    'label': image_name,
-                    'value': image_path,
-                    'image': image_path
-                })
-        
-        return images
+        return fragrances.get_images(category_type)
+    except Exception as e:
+        print(f"获取香调图片失败: {str(e)}")
+        return []
+
+async def _aget_fragrance_images(category_type):
+    """_get_fragrance_images 的异步版本"""
+    try:
+        return await fragrances.aget_images(category_type)
     except Exception as e:
         print(f"获取香调图片失败: {str(e)}")
         return []
 
 # 获取香调类别图片列表的API
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_fragrance_images(request):
+@async_api_view(['GET'])
+async def get_fragrance_images(request):
     """获取指定香调类别的图片列表"""
     try:
         category_type = request.query_params.get('category_type')
         if not category_type:
-            return Response(
+            return json_response(
                 {'detail': '香调类别不能为空。'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # 获取指定类别的图片列表
-        images = _get_fragrance_images(category_type)
+        images = await _aget_fragrance_images(category_type)
         
-        return Response({
+        return json_response({
             'category_type': category_type,
             'images': images
         }, status=status.HTTP_200_OK)
@@ -1042,7 +1068,19 @@ def get_fragrance_images(request):
     except Exception as e:
         # 记录错误日志
         print(f"获取香调图片失败: {str(e)}")
-        return Response(
+        return json_response(
             {'detail': f'获取香调图片失败，请稍后重试。错误信息：{str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+# AI结果缓存命中统计（管理员）
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsSuperuserOrStaff])
+def get_ai_cache_stats(request):
+    """获取当前进程AI结果缓存的命中/未命中次数、AI网关熔断状态和各缓存命名空间的命中统计"""
+    return Response({
+        'fragrance': fragrance_cache.get_stats(),
+        'extend_text': extend_text_cache.get_stats(),
+        'gateway': ai_gateway.get_stats(),
+        'namespaces': caching.get_stats()
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,60 @@
+# users/lookups.py
+"""
+用户查询缓存
+
+JWT 认证时每个请求都要按用户ID查询一次用户表。这里把认证和权限判断需要的字段（CACHED_FIELDS）
+缓存在 backend.caching 的 users:auth 命名空间中，不缓存密码哈希等其他字段，过期时间为
+settings.USERS_CACHE_TIMEOUT 秒。取出时构造只加载了这些字段的用户对象，其余字段在访问时才查询数据库，
+save() 时也不会写入未加载的字段。
+用户保存或删除（post_save/post_delete）以及对用户执行 QuerySet.update()（如批量停用）时清除对应缓存，
+保证停用用户和修改密码后令牌失效的检查及时生效；绕过 ORM 的修改在过期时间后生效。
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+
+from backend.caching import Namespace
+
+# 缓存的字段：认证（是否存在、是否停用）和权限判断（is_staff/is_superuser）需要的字段
+CACHED_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+_namespace = Namespace('users:auth', timeout=getattr(settings, 'USERS_CACHE_TIMEOUT', 60))
+
+
+def _build_user(data):
+    """由缓存的字段构造用户对象，其余字段延迟加载，不存在时返回 None"""
+    if data is None:
+        return None
+    user_model = get_user_model()
+    field_names = [field.attname for field in user_model._meta.concrete_fields if field.attname in data]
+    return user_model.from_db(
+        router.db_for_read(user_model), field_names, [data[name] for name in field_names]
+    )
+
+
+def get_user(pk):
+    """按主键获取用户，不存在时返回 None"""
+    data = _namespace.get_or_set(
+        str(pk), lambda: get_user_model().objects.filter(pk=pk).values(*CACHED_FIELDS).first()
+    )
+    return _build_user(data)
+
+
+async def aget_user(pk):
+    """get_user 的异步版本，未命中时使用异步 ORM 查询"""
+    async def build():
+        return await get_user_model().objects.filter(pk=pk).values(*CACHED_FIELDS).afirst()
+
+    return _build_user(await _namespace.aget_or_set(str(pk), build))
+
+
+def invalidate_user(pk):
+    """清除指定用户的缓存"""
+    _namespace.delete(str(pk))
+
+
+def invalidate_users(pks):
+    """清除多个用户的缓存"""
+    for pk in pks:
+        invalidate_user(pk)
@@ -1,7 +1,24 @@
 # users/models.py
 
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db import models, transaction
+from django.contrib.auth.models import AbstractUser, UserManager
+
+
+class UserQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        """批量更新不会触发 post_save，同样在事务提交后清除受影响用户的查询缓存（如批量停用用户）"""
+        from . import lookups
+
+        pks = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        transaction.on_commit(lambda: lookups.invalidate_users(pks))
+        return rows
+
+
+class USERManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
 
 class USER(AbstractUser):
     full_name = models.CharField(max_length=150, verbose_name="姓名")
@@ -15,6 +32,8 @@ class USER(AbstractUser):
         verbose_name="创建者"
     )
 
+    objects = USERManager()
+
     class Meta:
         db_table = 'USER'
         verbose_name = '用户'
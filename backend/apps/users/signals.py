@@ -0,0 +1,15 @@
+# users/signals.py
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import lookups
+from .models import USER
+
+
+@receiver([post_save, post_delete], sender=USER)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """用户变更时清除用户查询缓存（事务提交后执行，避免其他请求在提交前重新缓存旧数据）"""
+    pk = instance.pk
+    transaction.on_commit(lambda: lookups.invalidate_user(pk))
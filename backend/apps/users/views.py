@@ -17,8 +17,8 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        # 返回当前登录用户
-        return self.request.user
+        # 认证得到的用户对象只加载了认证相关的字段（用户查询缓存），这里读取完整的用户信息
+        return USER.objects.get(pk=self.request.user.pk)
 
 
 class UserListView(generics.ListCreateAPIView):
@@ -0,0 +1,183 @@
+"""
+全局缓存层
+
+缓存后端由 settings.CACHES 配置：设置 CACHE_REDIS_URL 时使用 redis，所有 daphne 进程、
+Celery worker 和节点共享；否则使用进程内存缓存（开发用）。
+
+Namespace 提供带命名空间和版本号的缓存键：
+- 键的格式为 "<命名空间>:<版本号>:<键>"，版本号保存在缓存中，bump() 生成新版本号后，
+  旧版本的键全部失效（由过期时间回收），不需要逐个删除；
+- get_or_set()/aget_or_set()：cache-aside，未命中时调用 builder 生成数据并写入共享缓存；
+- memoize()/amemoize()：数据保存在进程内，只在共享缓存中读取版本号，
+  适合题目目录等体积较大、很少变更的数据，命中时不需要反序列化。
+异步方法使用 Django 缓存的异步接口（aget/aset 等），redis 等同步后端的网络读写不会阻塞事件循环。
+命中/未命中次数按进程统计，可通过 get_stats() 查看。
+"""
+
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.utils.crypto import get_random_string
+
+from backend import metrics, profiling
+
+_MISSING = object()
+
+# {命名空间: Namespace}
+_namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+class Namespace:
+    """带版本号的缓存命名空间"""
+
+    def __init__(self, name, alias='default', timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        # 进程内数据：{键: (版本号, 数据)}
+        self._local = {}
+        self._lock = threading.Lock()
+        with _namespaces_lock:
+            _namespaces[name] = self
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self):
+        return f'{self.name}:version'
+
+    def get_version(self):
+        """获取当前版本号，不存在时初始化"""
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, get_random_string(12), None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    async def aget_version(self):
+        """get_version 的异步版本"""
+        version = await self.cache.aget(self.version_key)
+        if version is None:
+            await self.cache.aadd(self.version_key, get_random_string(12), None)
+            version = await self.cache.aget(self.version_key)
+        return version
+
+    def bump(self):
+        """生成新版本号，使该命名空间下的缓存在所有进程中失效"""
+        self.cache.set(self.version_key, get_random_string(12), None)
+        with self._lock:
+            self._local.clear()
+
+    def make_key(self, key):
+        return f'{self.name}:{self.get_version()}:{key}'
+
+    async def amake_key(self, key):
+        return f'{self.name}:{await self.aget_version()}:{key}'
+
+    def _count(self, hit):
+        profiling.record_cache(hit)
+        metrics.CACHE_REQUESTS.inc(cache=self.name, result='hit' if hit else 'miss')
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, default=None):
+        value = self.cache.get(self.make_key(key), _MISSING)
+        self._count(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        self.cache.set(self.make_key(key), value, timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def get_or_set(self, key, builder, timeout=DEFAULT_TIMEOUT):
+        """cache-aside：未命中时调用 builder() 并写入缓存，builder 返回 None 同样会被缓存"""
+        cache_key = self.make_key(key)
+        value = self.cache.get(cache_key, _MISSING)
+        self._count(value is not _MISSING)
+        if value is _MISSING:
+            value = builder()
+            self.cache.set(cache_key, value, self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+        return value
+
+    async def aget_or_set(self, key, builder, timeout=DEFAULT_TIMEOUT):
+        """
+        get_or_set 的异步版本，builder 可以是协程函数，普通函数在线程中执行
+        """
+        cache_key = await self.amake_key(key)
+        value = await self.cache.aget(cache_key, _MISSING)
+        self._count(value is not _MISSING)
+        if value is _MISSING:
+            value = await _acall(builder)
+            await self.cache.aset(cache_key, value, self.timeout if timeout is DEFAULT_TIMEOUT else timeout)
+        return value
+
+    def memoize(self, key, builder):
+        """进程内缓存 builder() 的结果，版本号变化后重建"""
+        version = self.get_version()
+        entry = self._local.get(key)
+        hit = entry is not None and entry[0] == version
+        self._count(hit)
+        if hit:
+            return entry[1]
+
+        data = builder()
+        with self._lock:
+            self._local[key] = (version, data)
+        return data
+
+    async def amemoize(self, key, builder):
+        """memoize 的异步版本，builder 可以是协程函数，普通函数在线程中执行"""
+        version = await self.aget_version()
+        entry = self._local.get(key)
+        hit = entry is not None and entry[0] == version
+        self._count(hit)
+        if hit:
+            return entry[1]
+
+        data = await _acall(builder)
+        with self._lock:
+            self._local[key] = (version, data)
+        return data
+
+    def get_stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else 0.0
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+async def _acall(builder):
+    if asyncio.iscoroutinefunction(builder):
+        return await builder()
+    return await sync_to_async(builder)()
+
+
+def get_stats():
+    """当前进程各命名空间的命中统计"""
+    with _namespaces_lock:
+        namespaces = list(_namespaces.values())
+    return {namespace.name: namespace.get_stats() for namespace in namespaces}
@@ -0,0 +1,16 @@
+"""
+数据库公共工具
+
+请求结束（request_finished）时 Django 才会关闭当前线程的数据库连接，使用连接池时即归还连接。
+流式响应（SSE）在推送结束后才触发 request_finished，返回响应前和推送期间每次查询后
+调用 release_connections() 归还连接，推送期间不占用连接池。
+"""
+
+from django.db import connections
+
+
+def release_connections():
+    """关闭（使用连接池时归还）当前线程已打开的数据库连接，事务中的连接不处理"""
+    for connection in connections.all(initialized_only=True):
+        if not connection.in_atomic_block:
+            connection.close()
@@ -0,0 +1,106 @@
+"""
+带连接池的 MySQL 数据库后端
+
+ENGINE 设为 'backend.db.mysql' 后，连接从当前进程的连接池（backend.db.pool）中借出，
+Django 关闭连接时（请求结束、close_old_connections）归还到连接池，而不是断开重连。
+连接池参数在 OPTIONS['pool'] 中配置（与 Django PostgreSQL 后端的连接池配置方式一致）：
+    'OPTIONS': {'pool': {'max_size': 10, 'timeout': 10, 'max_lifetime': 1800, 'max_idle': 300}}
+CONN_MAX_AGE 需为 0，连接的复用由连接池负责；CONN_HEALTH_CHECKS 为 True 时取出空闲连接前先 ping。
+进程 fork 后子进程使用新的连接池，继承自父进程的连接直接丢弃，不归还也不关闭
+（关闭时会通过共享的 socket 通知数据库断开，父进程中的同一连接也会失效）。
+"""
+
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.mysql import base as mysql_base
+from django.utils.asyncio import async_unsafe
+
+from backend.db.pool import ConnectionPool, PoolTimeout
+
+Database = mysql_base.Database
+
+# {(数据库别名, 主机, 端口, 库名, 用户): ConnectionPool}
+# 连接目标变化（如测试时切换到测试库）后使用新的连接池，不会复用指向原数据库的连接
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _ping(connection):
+    try:
+        # 不自动重连：重连后的会话参数（隔离级别等）会丢失，应丢弃该连接
+        connection.ping(False)
+    except Exception:
+        return False
+    return True
+
+
+def get_pool_stats():
+    """当前进程各数据库连接池的统计，键为 别名:库名"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {f'{key[0]}:{key[3]}': pool.get_stats() for key, pool in pools.items()}
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    @property
+    def pool(self):
+        settings_dict = self.settings_dict
+        key = (self.alias, settings_dict['HOST'], settings_dict['PORT'], settings_dict['NAME'], settings_dict['USER'])
+        with _pools_lock:
+            pool = _pools.get(key)
+            # fork 出的子进程不使用父进程的连接池（其中的空闲连接与父进程共用 socket）
+            if pool is None or pool.forked():
+                if self.settings_dict['CONN_MAX_AGE'] != 0:
+                    raise ImproperlyConfigured(
+                        "Pooled connections require CONN_MAX_AGE = 0 for database '%s'." % self.alias
+                    )
+                options = self.settings_dict['OPTIONS'].get('pool')
+                pool = ConnectionPool(_ping, **(options if isinstance(options, dict) else {}))
+                _pools[key] = pool
+            return pool
+
+    def _connect(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        # 记录创建连接的进程，fork 后的子进程不归还、不关闭继承的连接
+        connection._pool_pid = os.getpid()
+        return connection
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        try:
+            return self.pool.acquire(
+                lambda: self._connect(conn_params),
+                health_check=self.settings_dict['CONN_HEALTH_CHECKS']
+            )
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+    def init_connection_state(self):
+        # 从连接池取出的连接已设置过会话参数（隔离级别等），不再重复执行
+        if getattr(self.connection, '_session_initialized', False):
+            return
+        super().init_connection_state()
+        self.connection._session_initialized = True
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is None:
+            return
+        if getattr(self.connection, '_pool_pid', None) != os.getpid():
+            # fork 前在父进程中打开的连接，只丢弃引用，不执行任何网络操作
+            return
+        # 事务中途关闭、手动关闭了自动提交或出错后已不可用的连接不能复用
+        reusable = (
+            not self.in_atomic_block
+            and self.autocommit
+            and (not self.errors_occurred or _ping(self.connection))
+        )
+        self.pool.release(self.connection, reusable=reusable)
@@ -0,0 +1,125 @@
+"""
+数据库连接池
+
+Django 的持久连接（CONN_MAX_AGE > 0）保存在线程局部变量中。daphne/ASGI 下同步代码运行在
+sync_to_async 创建的线程中，每个请求的线程都不相同，持久连接既无法被后续请求复用，
+又会随线程结束而泄漏。这里的连接池按进程保存空闲连接，与线程无关：
+- 请求结束时连接归还到连接池而不是关闭，之后任意线程都可以取出复用；
+- 同时借出的连接数不超过 max_size，连接池耗尽时等待 timeout 秒，仍无空闲连接则抛出异常；
+- 使用超过 max_lifetime 秒或空闲超过 max_idle 秒的连接会被丢弃重建
+  （max_idle 应小于数据库的 wait_timeout）；
+- 开启健康检查时，取出空闲连接前先 ping 一次，不可用的连接直接丢弃；
+- 连接池记录创建时的进程号（pid）。进程 fork 后（Celery prefork、gunicorn --preload）
+  子进程继承的连接与父进程共用 socket，不能复用，数据库后端发现 pid 变化后在子进程中新建连接池。
+"""
+
+import collections
+import os
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+
+    def __init__(self, ping, max_size=10, timeout=10, max_lifetime=1800, max_idle=300):
+        self._ping = ping
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        # 空闲连接：(连接, 创建时间, 归还时间)，后进先出，优先复用最近使用过的连接
+        self._idle = collections.deque()
+        self._created_at = {}
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'timeouts': 0,
+        }
+
+    def forked(self):
+        """当前进程是否为创建连接池之后 fork 出的子进程"""
+        return self.pid != os.getpid()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _discard(self, connection):
+        self._count('discarded')
+        with self._lock:
+            self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime is not None and now - created_at >= self.max_lifetime
+
+    def acquire(self, connect, health_check=False):
+        """借出一个连接，优先复用空闲连接，没有可用的空闲连接时调用 connect() 新建"""
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('timeouts')
+            raise PoolTimeout(f'等待数据库连接超时（{self.timeout}秒），连接池已满（{self.max_size}）')
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    connection = connect()
+                    with self._lock:
+                        self._created_at[id(connection)] = time.monotonic()
+                        self._stats['created'] += 1
+                    return connection
+
+                connection, created_at, returned_at = entry
+                now = time.monotonic()
+                if (self._expired(created_at, now)
+                        or (self.max_idle is not None and now - returned_at >= self.max_idle)
+                        or (health_check and not self._ping(connection))):
+                    self._discard(connection)
+                    continue
+                self._count('reused')
+                return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reusable=True):
+        """归还连接；reusable 为 False 或连接已超过最长使用时间时关闭连接"""
+        try:
+            with self._lock:
+                created_at = self._created_at.get(id(connection))
+            now = time.monotonic()
+            if reusable and created_at is not None and not self._expired(created_at, now):
+                with self._lock:
+                    self._idle.append((connection, created_at, now))
+            else:
+                self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def close_idle(self):
+        """关闭全部空闲连接"""
+        with self._lock:
+            entries = list(self._idle)
+            self._idle.clear()
+        for connection, _, _ in entries:
+            self._discard(connection)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['open'] = len(self._created_at)
+        stats['in_use'] = stats['open'] - stats['idle']
+        stats['max_size'] = self.max_size
+        return stats
@@ -0,0 +1,205 @@
+import threading
+from unittest import mock
+
+from django.db import connections
+from django.test import SimpleTestCase
+
+from . import pool as pool_module, release_connections
+from .mysql import base as mysql_base
+from .pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """连接池：借出、归还、等待超时、过期丢弃和健康检查（不需要数据库）"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(pool_module.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.created = []
+
+    def connect(self):
+        connection = FakeConnection()
+        self.created.append(connection)
+        return connection
+
+    def make_pool(self, **options):
+        options.setdefault('timeout', 0.01)
+        return ConnectionPool(lambda connection: connection.alive, **options)
+
+    def test_release_and_reuse(self):
+        pool = self.make_pool()
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+
+        self.assertIs(pool.acquire(self.connect), connection)
+        self.assertEqual(len(self.created), 1)
+        stats = pool.get_stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 1))
+
+    def test_reuses_most_recent_connection(self):
+        pool = self.make_pool()
+        first, second = pool.acquire(self.connect), pool.acquire(self.connect)
+        pool.release(first)
+        pool.release(second)
+
+        self.assertIs(pool.acquire(self.connect), second)
+
+    def test_acquire_timeout(self):
+        pool = self.make_pool(max_size=2)
+        connection = pool.acquire(self.connect)
+        pool.acquire(self.connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+        self.assertEqual(pool.get_stats()['timeouts'], 1)
+
+        # 归还后可以再次借出
+        pool.release(connection)
+        self.assertIs(pool.acquire(self.connect), connection)
+
+    def test_waiting_acquire_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        connection = pool.acquire(self.connect)
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(pool.acquire(self.connect)))
+        waiter.start()
+        pool.release(connection)
+        waiter.join(5)
+
+        self.assertEqual(result, [connection])
+
+    def test_connect_error_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+
+        with self.assertRaises(RuntimeError):
+            pool.acquire(mock.Mock(side_effect=RuntimeError('connect failed')))
+        pool.acquire(self.connect)
+
+    def test_not_reusable_connection_closed(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.acquire(self.connect)
+        pool.release(connection, reusable=False)
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.acquire(self.connect), connection)
+
+    def test_max_lifetime(self):
+        pool = self.make_pool(max_lifetime=60, max_idle=None)
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+
+        # 空闲中到期：借出时丢弃
+        self.now += 60
+        self.assertIsNot(pool.acquire(self.connect), connection)
+        self.assertTrue(connection.closed)
+
+    def test_max_lifetime_on_release(self):
+        pool = self.make_pool(max_lifetime=60, max_idle=None)
+        connection = pool.acquire(self.connect)
+
+        # 借出期间到期：归还时关闭
+        self.now += 60
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()['open'], 0)
+
+    def test_max_idle(self):
+        pool = self.make_pool(max_lifetime=None, max_idle=30)
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+
+        self.now += 29
+        self.assertIs(pool.acquire(self.connect), connection)
+        pool.release(connection)
+
+        self.now += 30
+        self.assertIsNot(pool.acquire(self.connect), connection)
+        self.assertTrue(connection.closed)
+
+    def test_health_check(self):
+        pool = self.make_pool()
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+        connection.alive = False
+
+        # 不开启健康检查时不 ping
+        self.assertIs(pool.acquire(self.connect), connection)
+        pool.release(connection)
+        self.assertIsNot(pool.acquire(self.connect, health_check=True), connection)
+        self.assertTrue(connection.closed)
+
+    def test_close_idle(self):
+        pool = self.make_pool()
+        connection = pool.acquire(self.connect)
+        pool.release(connection)
+        pool.close_idle()
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()['open'], 0)
+
+    def test_forked(self):
+        pool = self.make_pool()
+        self.assertFalse(pool.forked())
+        with mock.patch.object(pool_module.os, 'getpid', return_value=pool.pid + 1):
+            self.assertTrue(pool.forked())
+
+
+class PooledDatabaseWrapperTests(SimpleTestCase):
+    """MySQL 后端：fork 后使用新的连接池，继承的连接不归还也不关闭"""
+
+    def setUp(self):
+        self.wrapper = mysql_base.DatabaseWrapper({
+            'ENGINE': 'backend.db.mysql', 'HOST': 'db', 'PORT': '3306', 'NAME': 'pool_test',
+            'USER': 'test', 'PASSWORD': '', 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+            'OPTIONS': {'pool': {'max_size': 1, 'timeout': 0.01}}, 'TIME_ZONE': None,
+            'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False, 'TEST': {},
+        }, alias='pool_test')
+        self.addCleanup(mysql_base._pools.clear)
+
+    def test_pool_options_and_reuse(self):
+        pool = self.wrapper.pool
+
+        self.assertEqual(pool.max_size, 1)
+        self.assertIs(self.wrapper.pool, pool)
+
+    def test_fork_creates_new_pool(self):
+        pool = self.wrapper.pool
+        connection = FakeConnection()
+        connection._pool_pid = pool.pid
+
+        with mock.patch.object(pool_module.os, 'getpid', return_value=pool.pid + 1), \
+                mock.patch.object(mysql_base.os, 'getpid', return_value=pool.pid + 1):
+            child_pool = self.wrapper.pool
+            # 继承自父进程的连接：只丢弃引用
+            self.wrapper.connection = connection
+            self.wrapper._close()
+
+        self.assertIsNot(child_pool, pool)
+        self.assertFalse(connection.closed)
+        self.assertEqual(pool.get_stats()['idle'], 0)
+
+
+class ReleaseConnectionsTests(SimpleTestCase):
+
+    def test_closes_connections_outside_transaction(self):
+        idle = mock.Mock(in_atomic_block=False)
+        in_transaction = mock.Mock(in_atomic_block=True)
+
+        with mock.patch.object(connections, 'all', return_value=[idle, in_transaction]) as all_connections:
+            release_connections()
+
+        all_connections.assert_called_once_with(initialized_only=True)
+        idle.close.assert_called_once_with()
+        in_transaction.close.assert_not_called()
@@ -0,0 +1,403 @@
+"""
+运行指标（Prometheus 文本格式）
+
+/metrics 接口输出以下指标：
+- algoscent_http_requests_total、algoscent_http_request_duration_seconds：按视图统计的请求数和耗时分布，
+  视图名为 "视图类.action"（如 UserQuizSessionViewSet.report）或函数视图名（如 submit_part）；
+- algoscent_db_queries_total：按视图统计的数据库查询次数，请求之外（后台任务）的查询记为 background；
+- algoscent_ai_call_duration_seconds、algoscent_ai_call_errors_total：各AI调用的耗时分布和失败次数；
+- algoscent_cache_requests_total、algoscent_cache_hit_ratio：各缓存的命中/未命中次数和命中率。
+
+daphne 和 Celery 有多个进程，每个进程只在内存中累加增量，由后台线程每隔 METRICS_FLUSH_INTERVAL 秒
+用 HINCRBYFLOAT 合并到 redis（METRICS_REDIS_URL）的同一个哈希中，/metrics 读取的是所有进程（和节点）的合计值。
+METRICS_REDIS_URL 为空时只统计当前进程（开发用）。
+"""
+
+import atexit
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 请求耗时分桶（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# AI调用耗时分桶（秒）
+AI_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+# {指标名: 指标}
+_registry = {}
+
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _sample(name, labels):
+    """样本的键，即文本格式中的 "名称{标签}"，同时作为 redis 哈希的字段"""
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def _labels(self, labels):
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """该指标可能出现的样本名（用于从合计值中分组）"""
+        return (self.name,)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        _buffer.add(_sample(self.name, self._labels(labels)), amount)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        # 累积分桶：值落入所有上限不小于它的桶；其余的桶加0，保证每个标签组合都输出全部分桶
+        # （缺少分桶时 histogram_quantile 的结果不正确）
+        for bound in self.buckets:
+            _buffer.add(_sample(f'{self.name}_bucket', labels + (('le', bound),)), 1 if value <= bound else 0)
+        _buffer.add(_sample(f'{self.name}_bucket', labels + (('le', '+Inf'),)), 1)
+        _buffer.add(_sample(f'{self.name}_sum', labels), value)
+        _buffer.add(_sample(f'{self.name}_count', labels), 1)
+
+    def samples(self):
+        return tuple(f'{self.name}{suffix}' for suffix in ('_bucket', '_sum', '_count'))
+
+
+HTTP_REQUESTS = Counter(
+    'algoscent_http_requests_total', 'HTTP requests by view, method and status code.',
+    ('view', 'method', 'status')
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'algoscent_http_request_duration_seconds', 'HTTP request latency by view and method.',
+    ('view', 'method')
+)
+DB_QUERIES = Counter(
+    'algoscent_db_queries_total', 'Database queries by view (background for queries outside requests).',
+    ('view',)
+)
+AI_CALL_DURATION = Histogram(
+    'algoscent_ai_call_duration_seconds', 'Outbound AI call latency by operation.',
+    ('operation',), buckets=AI_DURATION_BUCKETS
+)
+AI_CALL_ERRORS = Counter(
+    'algoscent_ai_call_errors_total', 'Failed outbound AI calls by operation and error type.',
+    ('operation', 'error')
+)
+CACHE_REQUESTS = Counter(
+    'algoscent_cache_requests_total', 'Cache lookups by cache and result (hit or miss).',
+    ('cache', 'result')
+)
+
+
+class LocalMetricStore:
+    """进程内存储（开发用），只包含当前进程的指标"""
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def merge(self, deltas):
+        with self._lock:
+            for sample, amount in deltas.items():
+                self._values[sample] += amount
+
+    def read(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class RedisMetricStore:
+    """redis 存储，所有进程和节点累加到同一个哈希中"""
+
+    def __init__(self, url, key):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._key = key
+
+    def merge(self, deltas):
+        pipeline = self._client.pipeline(transaction=False)
+        for sample, amount in deltas.items():
+            pipeline.hincrbyfloat(self._key, sample, amount)
+        pipeline.execute()
+
+    def read(self):
+        return {
+            sample.decode('utf-8'): float(value)
+            for sample, value in self._client.hgetall(self._key).items()
+        }
+
+
+class Buffer:
+    """
+    进程内的增量缓冲，后台线程定期合并到存储
+    进程 fork（Celery prefork）后子进程清空继承的增量并重新启动线程
+    """
+
+    def __init__(self):
+        self._deltas = defaultdict(float)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._store = None
+
+    def _ensure_started(self):
+        # 调用方已持有锁
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._deltas.clear()
+        url = getattr(settings, 'METRICS_REDIS_URL', '')
+        if url:
+            self._store = RedisMetricStore(url, getattr(settings, 'METRICS_REDIS_KEY', 'algoscent:metrics'))
+            threading.Thread(target=self._run, name='metrics-flush', daemon=True).start()
+        else:
+            self._store = LocalMetricStore()
+
+    @property
+    def store(self):
+        with self._lock:
+            self._ensure_started()
+            return self._store
+
+    def add(self, sample, amount):
+        # 指标关闭时不记录，也不启动写入 redis 的后台线程
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            return
+        with self._lock:
+            self._ensure_started()
+            self._deltas[sample] += amount
+        if isinstance(self._store, LocalMetricStore):
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._ensure_started()
+            deltas, self._deltas = self._deltas, defaultdict(float)
+            store = self._store
+        if not deltas:
+            return
+        try:
+            store.merge(deltas)
+        except Exception as e:
+            print(f"写入运行指标失败: {e}")
+            # 放回缓冲，下次重试
+            with self._lock:
+                for sample, amount in deltas.items():
+                    self._deltas[sample] += amount
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(getattr(settings, 'METRICS_FLUSH_INTERVAL', 5))
+            self.flush()
+
+
+_buffer = Buffer()
+# 进程退出前写入剩余的增量
+atexit.register(lambda: _buffer.flush())
+
+
+def reset():
+    """清空当前进程的缓冲和存储（切换配置或测试时使用）"""
+    global _buffer
+    _buffer = Buffer()
+
+
+@contextlib.contextmanager
+def observe_ai_call(operation):
+    """统计一次AI调用的耗时，抛出异常时按异常类型记录失败"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        AI_CALL_ERRORS.inc(operation=operation, error=type(e).__name__)
+        raise
+    finally:
+        AI_CALL_DURATION.observe(time.perf_counter() - started, operation=operation)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    queries = _current.get()
+    if queries is None:
+        DB_QUERIES.inc(view='background')
+    else:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    # 每个线程使用各自的数据库连接，在连接创建时挂上计数函数
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def view_name(request):
+    """请求对应的视图名：视图类.action、视图类名或函数视图名"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    cls = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    if cls is None:
+        return getattr(func, '__name__', 'unknown')
+    actions = getattr(func, 'actions', None)
+    action = actions.get(request.method.lower()) if actions else None
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+class MetricsMiddleware:
+    """按视图记录请求数、耗时和数据库查询次数，同时支持同步和异步调用"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(_install_wrapper, dispatch_uid='backend_metrics')
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries, token, started = self._start()
+        response = self.get_response(request)
+        self._finish(request, response, queries, token, started)
+        return response
+
+    async def __acall__(self, request):
+        queries, token, started = self._start()
+        response = await self.get_response(request)
+        self._finish(request, response, queries, token, started)
+        return response
+
+    def _start(self):
+        # 用列表保存计数，sync_to_async 线程中的查询修改的是同一个对象
+        queries = [0]
+        return queries, _current.set(queries), time.perf_counter()
+
+    def _finish(self, request, response, queries, token, started):
+        elapsed = time.perf_counter() - started
+        _current.reset(token)
+        view = view_name(request)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_REQUEST_DURATION.observe(elapsed, view=view, method=request.method)
+        if queries[0]:
+            DB_QUERIES.inc(queries[0], view=view)
+
+
+def _hit_ratios(values):
+    """由缓存命中/未命中次数计算命中率"""
+    totals = defaultdict(lambda: [0.0, 0.0])
+    prefix = f'{CACHE_REQUESTS.name}{{cache="'
+    for sample, value in values.items():
+        if sample.startswith(prefix):
+            cache_name, _, rest = sample[len(prefix):].partition('",result="')
+            totals[cache_name][0 if rest.startswith('hit') else 1] += value
+    return {
+        cache_name: hits / (hits + misses)
+        for cache_name, (hits, misses) in totals.items() if hits + misses
+    }
+
+
+def _sort_key(sample):
+    """
+    样本的输出顺序：按标签组合分组，每组内先输出分桶（按上限的数值排序，+Inf 在最后），
+    再输出 _sum、_count（按字符串排序时 le="10" 会排在 le="2.5" 前面）
+    """
+    name, _, labels = sample.partition('{')
+    labels = labels.rstrip('}')
+    if name.endswith('_bucket'):
+        # le 总是最后一个标签
+        labels, _, bound = labels.rpartition('le="')
+        bound = bound.rstrip('"')
+        return labels.rstrip(','), 0, float('inf') if bound == '+Inf' else float(bound)
+    return labels, 2 if name.endswith('_count') else 1, 0.0
+
+
+def render():
+    """以 Prometheus 文本格式输出所有进程合计的指标"""
+    _buffer.flush()
+    values = _buffer.store.read()
+    families = {sample: metric for metric in _registry.values() for sample in metric.samples()}
+    grouped = defaultdict(list)
+    for sample, value in values.items():
+        metric = families.get(sample.partition('{')[0])
+        if metric is not None:
+            grouped[metric.name].append((sample, value))
+
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for sample, value in sorted(grouped[name], key=lambda item: _sort_key(item[0])):
+            lines.append(f'{sample} {_format_value(value)}')
+
+    lines.append('# HELP algoscent_cache_hit_ratio Cache hit ratio by cache.')
+    lines.append('# TYPE algoscent_cache_hit_ratio gauge')
+    for cache_name, ratio in sorted(_hit_ratios(values).items()):
+        lines.append(f'algoscent_cache_hit_ratio{{cache="{cache_name}"}} {ratio:.4f}')
+    return '\n'.join(lines) + '\n'
+
+
+@require_GET
+def metrics_view(request):
+    """
+    指标接口，供 Prometheus 抓取
+    METRICS_ENABLED 为 False 时返回 404；配置了 METRICS_TOKEN 时需要请求头 Authorization: Bearer <METRICS_TOKEN>，
+    DEBUG 为 False 时必须配置 METRICS_TOKEN，未配置时返回 403（指标中包含视图名和访问量，不对外公开）
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        return HttpResponse(status=404)
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse(status=401)
+    try:
+        body = render()
+    except Exception as e:
+        print(f"读取运行指标失败: {e}")
+        return HttpResponse(status=503)
+    return HttpResponse(body, content_type=CONTENT_TYPE)
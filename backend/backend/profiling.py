@@ -0,0 +1,277 @@
+"""
+请求性能分析
+
+ProfilingMiddleware 为每个请求记录：总耗时、数据库查询次数和耗时、缓存命中/未命中次数、
+调用AI接口的次数和耗时，结果写入响应头 Server-Timing（浏览器开发者工具中可以直接查看）。
+耗时超过 PROFILING_SLOW_MS 的请求，把执行的 SQL 和采样得到的调用栈以一行 JSON
+写入滚动日志 PROFILING_LOG_FILE（docker-compose 中 /var/log 已挂载到宿主机）。
+
+- PROFILING_ENABLED 为 False 时中间件不加载，没有任何额外开销；
+- 只分析 PROFILING_PATHS 中前缀开头、且不在 PROFILING_EXCLUDE_PATHS 中的路径；
+- 调用栈采样：按 PROFILING_SAMPLE_RATE 的比例抽取请求，请求期间由后台线程每隔
+  PROFILING_SAMPLE_INTERVAL 秒采集一次调用栈，输出为火焰图使用的折叠格式（"函数;函数;函数 次数"）。
+  ASGI 下视图和中间件在不同线程中执行，cProfile 只能分析当前线程，所以采样进程内所有忙碌的线程，
+  并发请求较多时调用栈中会包含其他请求；
+- 流式响应（SSE）只统计到返回响应为止，不包括推送期间。
+
+数据库、缓存和AI调用通过 contextvars 归到当前请求，sync_to_async 会把上下文带到执行线程中；
+后台线程（香调分析等）中的调用不计入任何请求。
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+logger = logging.getLogger('backend.profiling')
+
+_current = contextvars.ContextVar('profiling_request', default=None)
+
+# 采样时忽略停在这些文件中的线程（等待任务、事件循环空闲等）
+_IDLE_FILES = ('threading.py', 'selectors.py', 'queue.py', 'thread.py')
+
+
+class RequestProfile:
+    """单个请求的统计数据"""
+
+    def __init__(self, max_sql):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.ai_calls = 0
+        self.ai_time = 0.0
+        self.sql = []
+        self.max_sql = max_sql
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, elapsed):
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            if len(self.sql) < self.max_sql:
+                self.sql.append((sql, elapsed))
+
+    def add_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def add_ai_call(self, elapsed):
+        with self._lock:
+            self.ai_calls += 1
+            self.ai_time += elapsed
+
+
+def record_cache(hit):
+    """缓存层调用：记录当前请求的一次缓存命中或未命中"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add_cache(hit)
+
+
+@contextlib.contextmanager
+def ai_call():
+    """AI网关调用：统计当前请求调用AI接口的耗时"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_ai_call(time.perf_counter() - started)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - started)
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    # 每个线程使用各自的数据库连接，在连接创建时挂上统计函数
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+class StackSampler(threading.Thread):
+    """后台线程：定时采集进程内忙碌线程的调用栈"""
+
+    def __init__(self, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.samples
+
+
+def _get_logger():
+    """慢请求日志：未配置 LOGGING 时写入 PROFILING_LOG_FILE，按大小滚动"""
+    if not logger.handlers:
+        path = settings.PROFILING_LOG_FILE
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=settings.PROFILING_LOG_MAX_BYTES,
+            backupCount=settings.PROFILING_LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class ProfilingMiddleware:
+    """请求性能分析中间件，同时支持同步和异步调用"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+        self.paths = tuple(settings.PROFILING_PATHS)
+        self.exclude_paths = tuple(settings.PROFILING_EXCLUDE_PATHS)
+        self.slow_ms = settings.PROFILING_SLOW_MS
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.sample_interval = settings.PROFILING_SAMPLE_INTERVAL
+        self.max_sql = settings.PROFILING_MAX_SQL
+        self.logger = _get_logger()
+        connection_created.connect(_install_wrapper, dispatch_uid='backend_profiling')
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not self._should_profile(request.path):
+            return self.get_response(request)
+        state = self._start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._finish(request, None, *state)
+            raise
+        self._finish(request, response, *state)
+        return response
+
+    async def __acall__(self, request):
+        if not self._should_profile(request.path):
+            return await self.get_response(request)
+        state = self._start()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await self._afinish(request, None, *state)
+            raise
+        await self._afinish(request, response, *state)
+        return response
+
+    def _should_profile(self, path):
+        return path.startswith(self.paths) and not (self.exclude_paths and path.startswith(self.exclude_paths))
+
+    def _start(self):
+        profile = RequestProfile(self.max_sql)
+        token = _current.set(profile)
+        sampler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            sampler = StackSampler(self.sample_interval)
+            sampler.start()
+        return profile, token, sampler, time.perf_counter()
+
+    def _finish(self, request, response, profile, token, sampler, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _current.reset(token)
+        self._report(request, response, profile, sampler, elapsed_ms)
+
+    async def _afinish(self, request, response, profile, token, sampler, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        # contextvar 要在设置它的上下文中重置，sync_to_async 在复制的上下文中执行
+        _current.reset(token)
+        if sampler is None and elapsed_ms < self.slow_ms:
+            # 只写响应头，不会阻塞
+            self._report(request, response, profile, sampler, elapsed_ms)
+            return
+        # 等待采样线程结束和写日志文件会阻塞，放到线程池中执行，不占用事件循环
+        await sync_to_async(self._report, thread_sensitive=False)(
+            request, response, profile, sampler, elapsed_ms
+        )
+
+    def _report(self, request, response, profile, sampler, elapsed_ms):
+        """停止采样，写 Server-Timing 响应头，慢请求写入日志"""
+        samples = sampler.stop() if sampler is not None else None
+
+        if response is not None:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={elapsed_ms:.1f}',
+                f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+                f'cache;desc="{profile.cache_hits} hits, {profile.cache_misses} misses"',
+                f'ai;dur={profile.ai_time * 1000:.1f};desc="{profile.ai_calls} calls"',
+            ])
+
+        if elapsed_ms < self.slow_ms:
+            return
+        record = {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code if response is not None else None,
+            'streaming': bool(response is not None and response.streaming),
+            'duration_ms': round(elapsed_ms, 2),
+            'queries': profile.queries,
+            'db_ms': round(profile.db_time * 1000, 2),
+            'cache_hits': profile.cache_hits,
+            'cache_misses': profile.cache_misses,
+            'ai_calls': profile.ai_calls,
+            'ai_ms': round(profile.ai_time * 1000, 2),
+            'sql': [{'sql': sql, 'ms': round(elapsed * 1000, 2)} for sql, elapsed in profile.sql],
+        }
+        if samples is not None:
+            record['stacks'] = [f'{stack} {count}' for stack, count in samples.most_common(50)]
+        try:
+            self.logger.info(json.dumps(record, ensure_ascii=False))
+        except Exception as e:
+            print(f"写入慢请求日志失败: {e}")
@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import os
 from datetime import timedelta
 from pathlib import Path
 
@@ -55,7 +56,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.account.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -84,13 +85,46 @@ SIMPLE_JWT = {
 # 自定义用户模型
 AUTH_USER_MODEL = 'users.USER'
 
+# 登录认证后端：密码校验在有界工作池中执行
+AUTHENTICATION_BACKENDS = [
+    'apps.account.authentication.PooledModelBackend',
+]
+
+# 密码哈希策略：第一个哈希器为目标算法，其余用于校验旧哈希，登录成功时自动迁移到目标算法
+# 安装 argon2-cffi 后可将 TieredArgon2PasswordHasher 放在第一位
+PASSWORD_HASHERS = [
+    'apps.account.hashers.TieredScryptPasswordHasher',
+    'apps.account.hashers.TieredPBKDF2PasswordHasher',
+    'apps.account.hashers.TieredArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# 哈希成本档位（'low'、'default'、'high'，见 apps/account/hashers.py，均不低于 Django 默认成本），
+# 可用 python manage.py benchmark_password_hashers 测量后选择
+ACCOUNT_PASSWORD_HASH_TIER = 'default'
+# 是否允许低于 Django 默认成本的 'reduced' 档位（会降低已存储哈希的强度，默认关闭）
+ACCOUNT_PASSWORD_HASH_ALLOW_REDUCED_COST = False
+
+# 密码校验工作池：执行方式（'process'、'thread' 或 'inline'）、工作进程数、
+# 最大排队数、单次等待超时（秒）和队列已满时返回的 Retry-After（秒）
+ACCOUNT_PASSWORD_HASH_EXECUTOR = 'process'
+ACCOUNT_PASSWORD_HASH_WORKERS = 2
+ACCOUNT_PASSWORD_HASH_MAX_PENDING = 16
+ACCOUNT_PASSWORD_HASH_TIMEOUT = 10
+ACCOUNT_PASSWORD_HASH_RETRY_AFTER = 2
+
 MIDDLEWARE = [
+    # 按视图统计请求数、耗时和查询次数（METRICS_ENABLED 为 False 时不加载）
+    'backend.metrics.MetricsMiddleware',
+    # 请求性能分析（PROFILING_ENABLED 为 False 时不加载）
+    'backend.profiling.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # 密码校验队列已满时，非 DRF 视图（admin 登录）返回 503
+    'apps.account.hashing.PasswordHashBusyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -118,14 +152,36 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# 数据库连接复用
+# daphne/ASGI 下同步代码运行在 sync_to_async 的线程中，每个请求的线程都不相同，
+# Django 按线程保存的持久连接（CONN_MAX_AGE > 0）无法复用，还会随线程结束而泄漏。
+# 默认使用进程内连接池（backend.db.mysql）：请求结束时连接归还到连接池，之后任意线程都可以复用，
+# 此时 CONN_MAX_AGE 必须为 0。
+# DATABASE_POOL=0 时关闭连接池，按 DATABASE_CONN_MAX_AGE（秒）使用 Django 的持久连接，
+# 只适用于 WSGI 等请求线程固定的部署。
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '1') == '1'
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": "backend.db.mysql" if DATABASE_POOL else "django.db.backends.mysql",
         'NAME': 'algoscent',             # 替换为你的数据库名称
         'USER': 'root',             # 替换为你的数据库用户名
         'PASSWORD': '123456',       # 替换为你的数据库密码
         'HOST': 'localhost',        # 数据库服务器地址，通常是 localhost
         'PORT': '3306',
+        'CONN_MAX_AGE': 0 if DATABASE_POOL else int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
+        # 复用连接前先检查是否可用（连接池模式下在取出空闲连接时 ping）
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # 每个进程的连接池：最多同时借出的连接数、连接池耗尽时的等待时间（秒）、
+            # 连接最长使用时间（秒）、空闲连接的保留时间（秒，应小于 MySQL 的 wait_timeout）
+            'pool': {
+                'max_size': int(os.environ.get('DATABASE_POOL_SIZE', 10)),
+                'timeout': 10,
+                'max_lifetime': 1800,
+                'max_idle': 300,
+            },
+        } if DATABASE_POOL else {},
     }
 }
 
@@ -190,5 +246,121 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# 缓存配置
+# 设置 CACHE_REDIS_URL 时使用 redis，所有 daphne 进程、Celery worker 和节点共享缓存、限流计数和版本号；
+# 未设置时使用进程内存缓存（开发用）。此时题目目录、香调索引等的版本号也只在各进程内有效：
+# 在 admin 中修改或单独运行 import_questions / import_fragrance_categories 命令后，
+# 其他已运行的进程不会失效，需要重启服务
+# ai_results 用于复用相同输入的AI分析结果，超过 MAX_ENTRIES 后按最近最少使用淘汰
+# （redis 需配置 maxmemory-policy allkeys-lru）
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'algoscent',
+        },
+        'ai_results': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'algoscent:ai',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'ai_results': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'ai-results',
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        },
+    }
+# 用户查询缓存过期时间（秒），用户保存/删除/QuerySet.update() 时会立即清除，
+# 绕过 ORM 的修改（如直接执行 SQL 停用用户）最多在该时间后生效
+USERS_CACHE_TIMEOUT = 60
+QUIZ_AI_CACHE_ALIAS = 'ai_results'
+QUIZ_AI_CACHE_TIMEOUT = 7 * 24 * 3600
+# AI扩写结果缓存过期时间（秒）
+QUIZ_EXTEND_TEXT_CACHE_TIMEOUT = 24 * 3600
+
+# 题目目录缓存策略：响应带 ETag，浏览器和 nginx 缓存后通过 If-None-Match 重新验证
+QUIZ_CATALOG_CACHE_CONTROL = {
+    'public': True,
+    'max_age': 60,
+    'must_revalidate': True,
+}
+
+# 登录RSA密钥对所在目录（generate_keys 写入，登录接口读取）
+ACCOUNT_KEYS_DIR = os.environ.get('ACCOUNT_KEYS_DIR', str(BASE_DIR / 'apps' / 'account' / 'keys'))
+
+# 登录公钥响应的缓存头：每次使用前都通过 ETag 重新验证（未变化时返回304），
+# 密钥轮换（generate_keys）后浏览器和代理不会继续使用旧公钥，避免登录解密失败
+ACCOUNT_PUBLIC_KEY_CACHE_CONTROL = {
+    'public': True,
+    'no_cache': True,
+}
+
+# 运行指标：各进程的增量定期合并到 redis，/metrics 输出所有进程的合计值（Prometheus 文本格式）
+# 默认关闭；DEBUG 为 False 时 /metrics 必须配置 METRICS_TOKEN，否则返回 403
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+METRICS_REDIS_URL = os.environ.get('METRICS_REDIS_URL', CACHE_REDIS_URL)
+METRICS_REDIS_KEY = 'algoscent:metrics'
+METRICS_FLUSH_INTERVAL = 5
+# 设置后抓取时需要请求头 Authorization: Bearer <METRICS_TOKEN>
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# 请求性能分析：响应头 Server-Timing 中给出耗时、查询、缓存和AI调用统计，
+# 超过 PROFILING_SLOW_MS 毫秒的请求把 SQL 和调用栈写入滚动日志
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+# 只分析这些前缀开头的路径，逗号分隔
+PROFILING_PATHS = [path for path in os.environ.get('PROFILING_PATHS', '/v1/').split(',') if path]
+PROFILING_EXCLUDE_PATHS = [path for path in os.environ.get('PROFILING_EXCLUDE_PATHS', '').split(',') if path]
+PROFILING_SLOW_MS = int(os.environ.get('PROFILING_SLOW_MS', 500))
+# 采集调用栈的请求比例和采样间隔（秒）
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.1))
+PROFILING_SAMPLE_INTERVAL = 0.005
+# 每个请求最多记录的 SQL 条数
+PROFILING_MAX_SQL = 200
+PROFILING_LOG_FILE = os.environ.get('PROFILING_LOG_FILE', '/var/log/algoscent/slow_requests.log')
+PROFILING_LOG_MAX_BYTES = 10 * 1024 * 1024
+PROFILING_LOG_BACKUP_COUNT = 5
+
+# Celery 配置（Part4香调分析在后台执行）
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+CELERY_TASK_IGNORE_RESULT = True
+
+# Part4香调分析执行方式：'celery'、'thread'（进程内线程池）或 'inline'（同步执行，测试用）
+QUIZ_ANALYSIS_EXECUTOR = 'celery'
+QUIZ_ANALYSIS_THREAD_WORKERS = 4
+# 排队或分析中超过该时间（秒）仍未结束的会话视为任务已丢失（消息丢失、进程重启等），允许重新分析
+QUIZ_ANALYSIS_STALE_AFTER = 300
+# 分析状态 SSE 推送的轮询间隔和最长等待时间（秒）
+QUIZ_ANALYSIS_STREAM_INTERVAL = 1
+QUIZ_ANALYSIS_STREAM_TIMEOUT = 120
+
+# AI网关：服务实现（'dashscope' 或本地假实现 'fake'）、单次调用超时（秒）、最大重试次数、
+# 重试退避基数（秒），以及熔断阈值（连续失败次数）和熔断时长（秒）
+QUIZ_AI_PROVIDER = 'dashscope'
+QUIZ_AI_TIMEOUT = 30
+QUIZ_AI_MAX_RETRIES = 2
+QUIZ_AI_RETRY_BACKOFF = 0.5
+QUIZ_AI_BREAKER_THRESHOLD = 5
+QUIZ_AI_BREAKER_RESET = 30
+
+# AI接口令牌桶限流：桶状态保存在 redis 中，所有进程和节点共享；为空时使用进程内存储（开发和测试用）
+QUIZ_THROTTLE_REDIS_URL = os.environ.get('QUIZ_THROTTLE_REDIS_URL', CACHE_REDIS_URL)
+# 各桶的容量（允许的突发次数）和每秒补充的令牌数
+QUIZ_AI_THROTTLE_BUCKETS = {
+    # 每个用户最多连续调用10次，之后每分钟恢复6次
+    'ai_user': {'capacity': 10, 'refill_rate': 6 / 60},
+    # 全站最多连续调用60次，之后每秒恢复2次
+    'ai_global': {'capacity': 60, 'refill_rate': 2},
+}
+
 # 阿里云百炼API配置
 DASHSCOPE_API_KEY = 'sk-##############'  # 请在此处设置你的阿里云百炼API密钥
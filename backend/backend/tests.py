@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase, override_settings
+
+from backend import metrics
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_REDIS_URL='')
+class HistogramRenderTests(SimpleTestCase):
+    """直方图输出：每个标签组合输出全部分桶，按上限的数值排序，+Inf 在最后"""
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def histogram_lines(self, labels):
+        prefix = f'{metrics.AI_CALL_DURATION.name}_'
+        return [
+            line for line in metrics.render().splitlines()
+            if line.startswith(prefix) and labels in line
+        ]
+
+    def test_all_buckets_in_numeric_order(self):
+        metrics.AI_CALL_DURATION.observe(0.3, operation='fast')
+        metrics.AI_CALL_DURATION.observe(3, operation='slow')
+
+        lines = self.histogram_lines('operation="fast"')
+
+        bounds = [str(bound) for bound in metrics.AI_DURATION_BUCKETS] + ['+Inf']
+        expected_counts = [0, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1]
+        self.assertEqual(lines[:len(bounds)], [
+            f'{metrics.AI_CALL_DURATION.name}_bucket{{operation="fast",le="{bound}"}} {count}'
+            for bound, count in zip(bounds, expected_counts)
+        ])
+        self.assertEqual(lines[len(bounds)], f'{metrics.AI_CALL_DURATION.name}_sum{{operation="fast"}} 0.3')
+        self.assertEqual(lines[len(bounds) + 1], f'{metrics.AI_CALL_DURATION.name}_count{{operation="fast"}} 1')
+
+    def test_label_sets_not_interleaved(self):
+        metrics.AI_CALL_DURATION.observe(0.3, operation='fast')
+        metrics.AI_CALL_DURATION.observe(3, operation='slow')
+
+        lines = [line for line in metrics.render().splitlines()
+                 if line.startswith(metrics.AI_CALL_DURATION.name)]
+        operations = [line.partition('operation="')[2].partition('"')[0] for line in lines]
+
+        self.assertEqual(operations, sorted(operations))
+        self.assertEqual(len(lines), 2 * (len(metrics.AI_DURATION_BUCKETS) + 3))
@@ -17,9 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from backend import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('v1/account/', include('apps.account.urls')),
     path('v1/users/', include('apps.users.urls')),
     path('v1/quiz/', include('apps.quiz.urls')),
+    path('metrics', metrics.metrics_view, name='metrics'),
 ]
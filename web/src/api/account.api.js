@@ -11,6 +11,15 @@ class AccountService {
     return response.data
   }
 
+  // 用户登录（用户名和密码整体加密）
+  async loginWithCredentials(credentials, remember_me = false) {
+    const response = await api.post('/account/login/', {
+      credentials,
+      remember_me
+    })
+    return response.data
+  }
+
   // 获取公钥
   async getPublicKey() {
     const response = await api.get('/account/public-key/')
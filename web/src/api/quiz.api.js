@@ -158,6 +158,65 @@ export const extendTextWithAI = async (text) => {
   }
 }
 
+// 使用AI扩写文本（流式），每收到一段内容调用 onDelta(已生成的完整文本)，返回最终结果
+export const extendTextWithAIStream = async (text, onDelta, signal) => {
+  const token = localStorage.getItem('access_token')
+  const response = await fetch(`${api.defaults.baseURL}/quiz/extend-text/stream/`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(token ? { Authorization: `Bearer ${token}` } : {})
+    },
+    body: JSON.stringify({ text }),
+    signal
+  })
+  if (!response.ok || !response.body) {
+    throw new Error(`AI扩写失败: ${response.status}`)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  let extendedText = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    // 事件之间以空行分隔
+    const events = buffer.split('\n\n')
+    buffer = events.pop()
+    for (const raw of events) {
+      const event = raw.match(/^event: (.*)$/m)?.[1]
+      const data = raw.match(/^data: (.*)$/m)?.[1]
+      if (!event || !data) continue
+      const payload = JSON.parse(data)
+      if (event === 'delta') {
+        extendedText += payload.text
+        onDelta?.(extendedText)
+      } else if (event === 'done') {
+        return payload.extended_text
+      } else if (event === 'error') {
+        throw new Error(payload.detail)
+      }
+    }
+  }
+  return extendedText
+}
+
+// 等待Part4香调分析完成（分析在后台执行），轮询分析状态
+export const waitForFragranceAnalysis = async (sessionId, interval = 1500, timeout = 120000) => {
+  const deadline = Date.now() + timeout
+  while (Date.now() < deadline) {
+    const response = await api.get(`/quiz/sessions/${sessionId}/analysis/`)
+    const analysis = response.data.data
+    if (analysis.analysis_status === 'done' || analysis.analysis_status === 'failed') {
+      return analysis
+    }
+    await new Promise(resolve => setTimeout(resolve, interval))
+  }
+  throw new Error('香调分析超时')
+}
+
 // 分阶段获取题目数据
 export const getPhasedQuestions = async (part, sessionId = null) => {
   try {
@@ -165,7 +224,12 @@ export const getPhasedQuestions = async (part, sessionId = null) => {
     if (sessionId) {
       url += `&session_id=${sessionId}`
     }
-    const response = await api.get(url)
+    let response = await api.get(url)
+    // Part4香调分析未完成时后端返回202，等待分析结束后重新获取（分析失败会自动重试）
+    for (let attempt = 0; response.status === 202 && sessionId && attempt < 3; attempt++) {
+      await waitForFragranceAnalysis(sessionId)
+      response = await api.get(url)
+    }
     return response.data
   } catch (error) {
     console.error('分阶段获取题目失败:', error)